@@ -0,0 +1,1081 @@
+/*
+ * Copyright (c) 2002-2016 "Neo Technology,"
+ * Network Engine for Objects in Lund AB [http://neotechnology.com]
+ *
+ * This file is part of Neo4j.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+
+/*
+ * Optional C accelerator for the `packstream` module.
+ *
+ * Three functions are exported, all of which are used by the pure Python
+ * `Packer` and `Unpacker` classes when this extension is available:
+ *
+ *   encode(value)                                   -> bytes or NotImplemented
+ *   decode(data, structure, hydration_functions, string_cache, limits)
+ *                                                   -> list of values
+ *   decode_one(data, offset, structure, hydration_functions, string_cache, limits)
+ *                                                   -> (value, offset) or None
+ *
+ * `encode` only handles the exact built-in types (None, bool, int, float,
+ * str, bytes, bytearray, list, dict and 2-tuple structures). If any other
+ * type, or a byte array too large to be worth copying, is found anywhere
+ * within the value, NotImplemented is returned and the caller falls back
+ * to the pure Python implementation for that value.
+ *
+ * `decode` reads every value from the supplied buffer. Each structure whose
+ * signature is a key in the `hydration_functions` dictionary is replaced by
+ * the result of calling the corresponding function with its fields as
+ * arguments. Any other structure is passed to the `structure(signature,
+ * fields)` callable and the return value used in its place. If a
+ * `StringCache` is given, short strings are looked up in (and added to) its
+ * `strings` dictionary, and its `hits` and `misses` counters are updated
+ * once decoding has finished.
+ *
+ * If given, `limits` is a tuple of (max_value_size, max_collection_size,
+ * lazy_bytes_size), any of which may be None. A string or bytes value larger
+ * than `max_value_size` bytes, or a collection holding more than
+ * `max_collection_size` items, raises a `SizeLimitError` as soon as its
+ * header has been read.
+ *
+ * `decode_one` reads a single value starting at `offset`, returning it along
+ * with the offset immediately after it, or None if the data ends before the
+ * value is complete. Bytes values of at least `lazy_bytes_size` bytes are
+ * always treated as incomplete, leaving them to be collected by the caller.
+ */
+
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <string.h>
+
+#if PY_MAJOR_VERSION >= 3
+#define IS_PY3 1
+#else
+#define IS_PY3 0
+#endif
+
+#define NULL_MARKER         0xC0
+#define FLOAT_64            0xC1
+#define FALSE_MARKER        0xC2
+#define TRUE_MARKER         0xC3
+#define INT_8               0xC8
+#define INT_16              0xC9
+#define INT_32              0xCA
+#define INT_64              0xCB
+#define BYTES_8             0xCC
+#define BYTES_16            0xCD
+#define BYTES_32            0xCE
+#define STRING_8            0xD0
+#define STRING_16           0xD1
+#define STRING_32           0xD2
+#define LIST_8              0xD4
+#define LIST_16             0xD5
+#define LIST_32             0xD6
+#define LIST_STREAM         0xD7
+#define MAP_8               0xD8
+#define MAP_16              0xD9
+#define MAP_32              0xDA
+#define MAP_STREAM          0xDB
+#define STRUCT_8            0xDC
+#define STRUCT_16           0xDD
+#define END_OF_STREAM       0xDF
+
+/* Returned internally by the encoder when an unsupported type is found. */
+#define ENCODE_UNSUPPORTED  1
+
+/* Byte arrays of at least this size are not encoded here, as in Python
+ * they are written by reference instead (see `packstream.LARGE_BYTES_SIZE`). */
+#define LARGE_BYTES_SIZE    16384
+
+static PyObject *single_bytes[256];
+
+/* `neo4j.v1.exceptions.SizeLimitError`, imported when first raised */
+static PyObject *size_limit_error = NULL;
+
+
+/* Encoder
+ * ======= */
+
+typedef struct {
+    char *data;
+    Py_ssize_t size;
+    Py_ssize_t capacity;
+} Buffer;
+
+static int
+buffer_reserve(Buffer *buffer, Py_ssize_t extra)
+{
+    Py_ssize_t required = buffer->size + extra;
+    if (required > buffer->capacity) {
+        Py_ssize_t capacity = buffer->capacity * 2;
+        char *data;
+        if (capacity < required)
+            capacity = required;
+        data = (char *) PyMem_Realloc(buffer->data, (size_t) capacity);
+        if (data == NULL) {
+            PyErr_NoMemory();
+            return -1;
+        }
+        buffer->data = data;
+        buffer->capacity = capacity;
+    }
+    return 0;
+}
+
+static int
+buffer_write(Buffer *buffer, const char *data, Py_ssize_t size)
+{
+    if (buffer_reserve(buffer, size) < 0)
+        return -1;
+    memcpy(buffer->data + buffer->size, data, (size_t) size);
+    buffer->size += size;
+    return 0;
+}
+
+static int
+buffer_write_marker(Buffer *buffer, unsigned char marker)
+{
+    if (buffer_reserve(buffer, 1) < 0)
+        return -1;
+    buffer->data[buffer->size++] = (char) marker;
+    return 0;
+}
+
+static int
+buffer_write_uint(Buffer *buffer, unsigned char marker, unsigned long long value, int width)
+{
+    int i;
+    if (buffer_reserve(buffer, 1 + width) < 0)
+        return -1;
+    buffer->data[buffer->size++] = (char) marker;
+    for (i = width - 1; i >= 0; i--)
+        buffer->data[buffer->size++] = (char) ((value >> (8 * i)) & 0xFF);
+    return 0;
+}
+
+static int
+encode_header(Buffer *buffer, Py_ssize_t size, unsigned char tiny,
+              unsigned char marker_8, const char *name)
+{
+    /* The 8, 16 and 32 bit markers are always consecutive */
+    if (tiny != 0 && size < 0x10)
+        return buffer_write_marker(buffer, (unsigned char) (tiny + size));
+    else if (size < 0x100)
+        return buffer_write_uint(buffer, marker_8, (unsigned long long) size, 1);
+    else if (size < 0x10000)
+        return buffer_write_uint(buffer, marker_8 + 1, (unsigned long long) size, 2);
+    else if ((unsigned long long) size < 0x100000000ULL)
+        return buffer_write_uint(buffer, marker_8 + 2, (unsigned long long) size, 4);
+    PyErr_Format(PyExc_OverflowError, "%s header size out of range", name);
+    return -1;
+}
+
+static int
+encode_integer(Buffer *buffer, PyObject *value)
+{
+    int overflow = 0;
+    long long x = PyLong_AsLongLongAndOverflow(value, &overflow);
+    if (x == -1 && PyErr_Occurred())
+        return -1;
+    if (overflow != 0) {
+        /* Formatted here, as Python 2 does not support %S in PyErr_Format */
+        PyObject *text = PyObject_Str(value);
+        if (text != NULL) {
+#if IS_PY3
+            const char *chars = PyUnicode_AsUTF8(text);
+#else
+            const char *chars = PyString_AsString(text);
+#endif
+            if (chars != NULL)
+                PyErr_Format(PyExc_OverflowError, "Integer %s out of range", chars);
+            Py_DECREF(text);
+        }
+        return -1;
+    }
+    if (-0x10 <= x && x < 0x80)
+        return buffer_write_marker(buffer, (unsigned char) (x & 0xFF));
+    else if (-0x80 <= x && x < 0x80)
+        return buffer_write_uint(buffer, INT_8, (unsigned long long) x & 0xFFULL, 1);
+    else if (-0x8000 <= x && x < 0x8000)
+        return buffer_write_uint(buffer, INT_16, (unsigned long long) x & 0xFFFFULL, 2);
+    else if (-0x80000000LL <= x && x < 0x80000000LL)
+        return buffer_write_uint(buffer, INT_32, (unsigned long long) x & 0xFFFFFFFFULL, 4);
+    else
+        return buffer_write_uint(buffer, INT_64, (unsigned long long) x, 8);
+}
+
+static int
+encode_float(Buffer *buffer, PyObject *value)
+{
+    union { double d; unsigned long long u; } x;
+    x.d = PyFloat_AS_DOUBLE(value);
+    return buffer_write_uint(buffer, FLOAT_64, x.u, 8);
+}
+
+static int
+encode_string(Buffer *buffer, const char *data, Py_ssize_t size)
+{
+    if (encode_header(buffer, size, 0x80, STRING_8, "String") < 0)
+        return -1;
+    return buffer_write(buffer, data, size);
+}
+
+static int
+encode_bytes(Buffer *buffer, const char *data, Py_ssize_t size)
+{
+    /* Leave large byte arrays to be written by reference rather than copied */
+    if (size >= LARGE_BYTES_SIZE)
+        return ENCODE_UNSUPPORTED;
+    if (encode_header(buffer, size, 0, BYTES_8, "Bytes") < 0)
+        return -1;
+    return buffer_write(buffer, data, size);
+}
+
+static int encode_value(Buffer *buffer, PyObject *value);
+
+static int
+encode_items(Buffer *buffer, PyObject **items, Py_ssize_t size)
+{
+    Py_ssize_t i;
+    int status;
+    for (i = 0; i < size; i++) {
+        status = encode_value(buffer, items[i]);
+        if (status != 0)
+            return status;
+    }
+    return 0;
+}
+
+static int
+encode_structure(Buffer *buffer, PyObject *value)
+{
+    PyObject *signature, *fields;
+    Py_ssize_t size;
+    if (PyTuple_GET_SIZE(value) != 2) {
+        PyErr_SetString(PyExc_ValueError, "Structures require a 2-tuple of (signature, fields)");
+        return -1;
+    }
+    signature = PyTuple_GET_ITEM(value, 0);
+    fields = PyTuple_GET_ITEM(value, 1);
+    if (!PyTuple_CheckExact(fields) && !PyList_CheckExact(fields))
+        return ENCODE_UNSUPPORTED;
+    if (!PyBytes_Check(signature) || PyBytes_GET_SIZE(signature) != 1) {
+        PyErr_SetString(PyExc_ValueError, "Structure signature must be a single byte value");
+        return -1;
+    }
+    size = PySequence_Fast_GET_SIZE(fields);
+    if (size < 0x10) {
+        if (buffer_write_marker(buffer, (unsigned char) (0xB0 + size)) < 0)
+            return -1;
+    }
+    else if (size < 0x100) {
+        if (buffer_write_uint(buffer, STRUCT_8, (unsigned long long) size, 1) < 0)
+            return -1;
+    }
+    else if (size < 0x10000) {
+        if (buffer_write_uint(buffer, STRUCT_16, (unsigned long long) size, 2) < 0)
+            return -1;
+    }
+    else {
+        PyErr_SetString(PyExc_OverflowError, "Structure header size out of range");
+        return -1;
+    }
+    if (buffer_write(buffer, PyBytes_AS_STRING(signature), 1) < 0)
+        return -1;
+    return encode_items(buffer, PySequence_Fast_ITEMS(fields), size);
+}
+
+static int
+encode_value(Buffer *buffer, PyObject *value)
+{
+    int status;
+
+    if (value == Py_None)
+        return buffer_write_marker(buffer, NULL_MARKER);
+    if (value == Py_True)
+        return buffer_write_marker(buffer, TRUE_MARKER);
+    if (value == Py_False)
+        return buffer_write_marker(buffer, FALSE_MARKER);
+    if (PyFloat_CheckExact(value))
+        return encode_float(buffer, value);
+    if (PyLong_CheckExact(value))
+        return encode_integer(buffer, value);
+#if !IS_PY3
+    if (PyInt_CheckExact(value)) {
+        long x = PyInt_AS_LONG(value);
+        PyObject *as_long = PyLong_FromLong(x);
+        if (as_long == NULL)
+            return -1;
+        status = encode_integer(buffer, as_long);
+        Py_DECREF(as_long);
+        return status;
+    }
+#endif
+    if (PyUnicode_CheckExact(value)) {
+#if IS_PY3
+        Py_ssize_t size;
+        const char *data = PyUnicode_AsUTF8AndSize(value, &size);
+        if (data == NULL)
+            return -1;
+        return encode_string(buffer, data, size);
+#else
+        PyObject *encoded = PyUnicode_AsUTF8String(value);
+        if (encoded == NULL)
+            return -1;
+        status = encode_string(buffer, PyBytes_AS_STRING(encoded), PyBytes_GET_SIZE(encoded));
+        Py_DECREF(encoded);
+        return status;
+#endif
+    }
+    if (PyBytes_CheckExact(value)) {
+#if IS_PY3
+        return encode_bytes(buffer, PyBytes_AS_STRING(value), PyBytes_GET_SIZE(value));
+#else
+        /* In Python 2, byte strings are treated as strings */
+        return encode_string(buffer, PyBytes_AS_STRING(value), PyBytes_GET_SIZE(value));
+#endif
+    }
+    if (PyByteArray_CheckExact(value))
+        return encode_bytes(buffer, PyByteArray_AS_STRING(value), PyByteArray_GET_SIZE(value));
+    if (PyList_CheckExact(value)) {
+        if (encode_header(buffer, PyList_GET_SIZE(value), 0x90, LIST_8, "List") < 0)
+            return -1;
+        if (Py_EnterRecursiveCall(" while encoding a PackStream value"))
+            return -1;
+        status = encode_items(buffer, PySequence_Fast_ITEMS(value), PyList_GET_SIZE(value));
+        Py_LeaveRecursiveCall();
+        return status;
+    }
+    if (PyDict_CheckExact(value)) {
+        Py_ssize_t position = 0;
+        PyObject *key, *item;
+        if (encode_header(buffer, PyDict_Size(value), 0xA0, MAP_8, "Map") < 0)
+            return -1;
+        if (Py_EnterRecursiveCall(" while encoding a PackStream value"))
+            return -1;
+        status = 0;
+        while (status == 0 && PyDict_Next(value, &position, &key, &item)) {
+            status = encode_value(buffer, key);
+            if (status == 0)
+                status = encode_value(buffer, item);
+        }
+        Py_LeaveRecursiveCall();
+        return status;
+    }
+    if (PyTuple_CheckExact(value)) {
+        if (Py_EnterRecursiveCall(" while encoding a PackStream value"))
+            return -1;
+        status = encode_structure(buffer, value);
+        Py_LeaveRecursiveCall();
+        return status;
+    }
+    return ENCODE_UNSUPPORTED;
+}
+
+static PyObject *
+encode(PyObject *self, PyObject *value)
+{
+    Buffer buffer = {NULL, 0, 0};
+    PyObject *result;
+    int status;
+
+    if (buffer_reserve(&buffer, 64) < 0)
+        return NULL;
+    status = encode_value(&buffer, value);
+    if (status == 0)
+        result = PyBytes_FromStringAndSize(buffer.data, buffer.size);
+    else if (status == ENCODE_UNSUPPORTED) {
+        Py_INCREF(Py_NotImplemented);
+        result = Py_NotImplemented;
+    }
+    else
+        result = NULL;
+    PyMem_Free(buffer.data);
+    return result;
+}
+
+
+/* Decoder
+ * ======= */
+
+typedef struct {
+    const unsigned char *data;
+    Py_ssize_t size;
+    Py_ssize_t offset;
+    PyObject *structure;
+    PyObject *hydration_functions;
+    PyObject *strings;
+    Py_ssize_t max_strings;
+    Py_ssize_t max_string_length;
+    Py_ssize_t hits;
+    Py_ssize_t misses;
+    Py_ssize_t max_value_size;
+    Py_ssize_t max_collection_size;
+    Py_ssize_t lazy_bytes_size;
+    int truncated;
+} Reader;
+
+/* Sentinel object returned internally for an END_OF_STREAM marker */
+static PyObject end_of_stream_sentinel;
+#define END_OF_STREAM_VALUE (&end_of_stream_sentinel)
+
+static void
+reader_set_truncated(Reader *reader)
+{
+    reader->truncated = 1;
+    PyErr_SetString(PyExc_ValueError, "Unexpected end of PackStream data");
+}
+
+static const unsigned char *
+reader_take(Reader *reader, Py_ssize_t size)
+{
+    const unsigned char *p;
+    if (size < 0 || reader->size - reader->offset < size) {
+        reader_set_truncated(reader);
+        return NULL;
+    }
+    p = reader->data + reader->offset;
+    reader->offset += size;
+    return p;
+}
+
+static int
+raise_size_limit_error(const char *format, Py_ssize_t size, Py_ssize_t limit)
+{
+    PyObject *exceptions;
+    if (size_limit_error == NULL) {
+        exceptions = PyImport_ImportModule("neo4j.v1.exceptions");
+        if (exceptions == NULL)
+            return -1;
+        size_limit_error = PyObject_GetAttrString(exceptions, "SizeLimitError");
+        Py_DECREF(exceptions);
+        if (size_limit_error == NULL)
+            return -1;
+    }
+    PyErr_Format(size_limit_error, format, size, limit);
+    return -1;
+}
+
+static int
+reader_check_value_size(Reader *reader, Py_ssize_t size)
+{
+    if (reader->max_value_size >= 0 && size > reader->max_value_size)
+        return raise_size_limit_error("PackStream value of %zd bytes exceeds the limit of %zd bytes",
+                                      size, reader->max_value_size);
+    return 0;
+}
+
+static int
+reader_check_collection_size(Reader *reader, Py_ssize_t size)
+{
+    if (reader->max_collection_size >= 0 && size > reader->max_collection_size)
+        return raise_size_limit_error("PackStream collection of %zd items exceeds the limit of %zd items",
+                                      size, reader->max_collection_size);
+    return 0;
+}
+
+static int
+reader_size(Reader *reader, int width, Py_ssize_t *size)
+{
+    const unsigned char *p = reader_take(reader, width);
+    unsigned long long x = 0;
+    int i;
+    if (p == NULL)
+        return -1;
+    for (i = 0; i < width; i++)
+        x = (x << 8) | p[i];
+    if (x > (unsigned long long) PY_SSIZE_T_MAX) {
+        PyErr_SetString(PyExc_OverflowError, "PackStream size out of range");
+        return -1;
+    }
+    *size = (Py_ssize_t) x;
+    return 0;
+}
+
+static PyObject *decode_value(Reader *reader);
+
+static PyObject *
+decode_integer(Reader *reader, int width)
+{
+    const unsigned char *p = reader_take(reader, width);
+    unsigned long long x = 0;
+    long long signed_x;
+    int i;
+    if (p == NULL)
+        return NULL;
+    for (i = 0; i < width; i++)
+        x = (x << 8) | p[i];
+    if (width < 8 && (p[0] & 0x80))
+        x |= ~0ULL << (8 * width);
+    signed_x = (long long) x;
+    return PyLong_FromLongLong(signed_x);
+}
+
+static PyObject *
+decode_float(Reader *reader)
+{
+    const unsigned char *p = reader_take(reader, 8);
+    union { double d; unsigned long long u; } x;
+    int i;
+    if (p == NULL)
+        return NULL;
+    x.u = 0;
+    for (i = 0; i < 8; i++)
+        x.u = (x.u << 8) | p[i];
+    return PyFloat_FromDouble(x.d);
+}
+
+static PyObject *
+decode_string(Reader *reader, Py_ssize_t size)
+{
+    const unsigned char *p;
+    PyObject *key, *value;
+    if (reader_check_value_size(reader, size) < 0)
+        return NULL;
+    p = reader_take(reader, size);
+    if (p == NULL)
+        return NULL;
+    if (reader->strings == NULL || size > reader->max_string_length)
+        return PyUnicode_DecodeUTF8((const char *) p, size, NULL);
+
+    key = PyBytes_FromStringAndSize((const char *) p, size);
+    if (key == NULL)
+        return NULL;
+    value = PyDict_GetItem(reader->strings, key);
+    if (value != NULL) {
+        reader->hits += 1;
+        Py_INCREF(value);
+        Py_DECREF(key);
+        return value;
+    }
+    reader->misses += 1;
+    value = PyUnicode_DecodeUTF8((const char *) p, size, NULL);
+    if (value != NULL) {
+        if (PyDict_Size(reader->strings) >= reader->max_strings)
+            PyDict_Clear(reader->strings);
+        if (PyDict_SetItem(reader->strings, key, value) < 0)
+            Py_CLEAR(value);
+    }
+    Py_DECREF(key);
+    return value;
+}
+
+static PyObject *
+decode_bytes(Reader *reader, Py_ssize_t size)
+{
+    const unsigned char *p;
+    if (reader_check_value_size(reader, size) < 0)
+        return NULL;
+    if (reader->lazy_bytes_size >= 0 && size >= reader->lazy_bytes_size) {
+        reader_set_truncated(reader);
+        return NULL;
+    }
+    p = reader_take(reader, size);
+    if (p == NULL)
+        return NULL;
+    return PyBytes_FromStringAndSize((const char *) p, size);
+}
+
+static PyObject *
+decode_list(Reader *reader, Py_ssize_t size)
+{
+    PyObject *list, *item;
+    Py_ssize_t i;
+
+    if (size < 0) {
+        /* List stream */
+        list = PyList_New(0);
+        if (list == NULL)
+            return NULL;
+        for (;;) {
+            item = decode_value(reader);
+            if (item == NULL) {
+                Py_DECREF(list);
+                return NULL;
+            }
+            if (item == END_OF_STREAM_VALUE)
+                return list;
+            if (reader_check_collection_size(reader, PyList_GET_SIZE(list) + 1) < 0 ||
+                    PyList_Append(list, item) < 0) {
+                Py_DECREF(item);
+                Py_DECREF(list);
+                return NULL;
+            }
+            Py_DECREF(item);
+        }
+    }
+
+    if (reader_check_collection_size(reader, size) < 0)
+        return NULL;
+    /* Guard against allocating for a size far beyond the data available */
+    if (size > reader->size - reader->offset) {
+        reader_set_truncated(reader);
+        return NULL;
+    }
+    list = PyList_New(size);
+    if (list == NULL)
+        return NULL;
+    for (i = 0; i < size; i++) {
+        item = decode_value(reader);
+        if (item == END_OF_STREAM_VALUE) {
+            PyErr_SetString(PyExc_ValueError, "Unexpected END_OF_STREAM marker");
+            item = NULL;
+        }
+        if (item == NULL) {
+            Py_DECREF(list);
+            return NULL;
+        }
+        PyList_SET_ITEM(list, i, item);
+    }
+    return list;
+}
+
+static PyObject *
+decode_map(Reader *reader, Py_ssize_t size)
+{
+    PyObject *map, *key, *item;
+    Py_ssize_t i;
+    int status;
+
+    if (size >= 0 && reader_check_collection_size(reader, size) < 0)
+        return NULL;
+    map = PyDict_New();
+    if (map == NULL)
+        return NULL;
+    for (i = 0; size < 0 || i < size; i++) {
+        key = decode_value(reader);
+        if (key == NULL) {
+            Py_DECREF(map);
+            return NULL;
+        }
+        if (key == END_OF_STREAM_VALUE) {
+            if (size < 0)
+                return map;
+            PyErr_SetString(PyExc_ValueError, "Unexpected END_OF_STREAM marker");
+            Py_DECREF(map);
+            return NULL;
+        }
+        if (size < 0 && reader_check_collection_size(reader, i + 1) < 0) {
+            Py_DECREF(key);
+            Py_DECREF(map);
+            return NULL;
+        }
+        item = decode_value(reader);
+        if (item == END_OF_STREAM_VALUE) {
+            PyErr_SetString(PyExc_ValueError, "Unexpected END_OF_STREAM marker");
+            item = NULL;
+        }
+        if (item == NULL) {
+            Py_DECREF(key);
+            Py_DECREF(map);
+            return NULL;
+        }
+        status = PyDict_SetItem(map, key, item);
+        Py_DECREF(key);
+        Py_DECREF(item);
+        if (status < 0) {
+            Py_DECREF(map);
+            return NULL;
+        }
+    }
+    return map;
+}
+
+static PyObject *
+decode_structure(Reader *reader, Py_ssize_t size)
+{
+    const unsigned char *p;
+    PyObject *signature, *fields, *function, *args, *value;
+    if (reader_check_collection_size(reader, size) < 0)
+        return NULL;
+    p = reader_take(reader, 1);
+    if (p == NULL)
+        return NULL;
+    signature = single_bytes[p[0]];
+    fields = decode_list(reader, size);
+    if (fields == NULL)
+        return NULL;
+    function = NULL;
+    if (reader->hydration_functions != NULL)
+        function = PyDict_GetItem(reader->hydration_functions, signature);
+    if (function == NULL)
+        value = PyObject_CallFunctionObjArgs(reader->structure, signature, fields, NULL);
+    else {
+        args = PyList_AsTuple(fields);
+        value = args == NULL ? NULL : PyObject_Call(function, args, NULL);
+        Py_XDECREF(args);
+    }
+    Py_DECREF(fields);
+    return value;
+}
+
+static PyObject *
+decode_collection(Reader *reader, unsigned char marker)
+{
+    unsigned char marker_high = marker & 0xF0;
+    Py_ssize_t size;
+    char hex[3];
+
+    if (marker_high == 0x90)
+        return decode_list(reader, marker & 0x0F);
+    if (marker_high == 0xA0)
+        return decode_map(reader, marker & 0x0F);
+    if (marker_high == 0xB0)
+        return decode_structure(reader, marker & 0x0F);
+    switch (marker) {
+        case LIST_8:
+        case LIST_16:
+        case LIST_32:
+            if (reader_size(reader, 1 << (marker - LIST_8), &size) < 0)
+                return NULL;
+            return decode_list(reader, size);
+        case LIST_STREAM:
+            return decode_list(reader, -1);
+        case MAP_8:
+        case MAP_16:
+        case MAP_32:
+            if (reader_size(reader, 1 << (marker - MAP_8), &size) < 0)
+                return NULL;
+            return decode_map(reader, size);
+        case MAP_STREAM:
+            return decode_map(reader, -1);
+        case STRUCT_8:
+        case STRUCT_16:
+            if (reader_size(reader, 1 << (marker - STRUCT_8), &size) < 0)
+                return NULL;
+            return decode_structure(reader, size);
+    }
+    /* PyErr_Format does not support zero padding, so format the marker here */
+    PyOS_snprintf(hex, sizeof(hex), "%02X", marker);
+    PyErr_Format(PyExc_ValueError, "Unknown PackStream marker 0x%s", hex);
+    return NULL;
+}
+
+static PyObject *
+decode_value(Reader *reader)
+{
+    const unsigned char *p = reader_take(reader, 1);
+    unsigned char marker;
+    Py_ssize_t size;
+    PyObject *value;
+
+    if (p == NULL)
+        return NULL;
+    marker = p[0];
+
+    /* TINY_INT */
+    if (marker < 0x80)
+        return PyLong_FromLong((long) marker);
+    if (marker >= 0xF0)
+        return PyLong_FromLong((long) marker - 0x100);
+
+    /* TINY_STRING */
+    if (marker < 0x90)
+        return decode_string(reader, marker & 0x0F);
+
+    switch (marker) {
+        case NULL_MARKER:
+            Py_RETURN_NONE;
+        case TRUE_MARKER:
+            Py_RETURN_TRUE;
+        case FALSE_MARKER:
+            Py_RETURN_FALSE;
+        case FLOAT_64:
+            return decode_float(reader);
+        case INT_8:
+            return decode_integer(reader, 1);
+        case INT_16:
+            return decode_integer(reader, 2);
+        case INT_32:
+            return decode_integer(reader, 4);
+        case INT_64:
+            return decode_integer(reader, 8);
+        case BYTES_8:
+        case BYTES_16:
+        case BYTES_32:
+            if (reader_size(reader, 1 << (marker - BYTES_8), &size) < 0)
+                return NULL;
+            return decode_bytes(reader, size);
+        case STRING_8:
+        case STRING_16:
+        case STRING_32:
+            if (reader_size(reader, 1 << (marker - STRING_8), &size) < 0)
+                return NULL;
+            return decode_string(reader, size);
+        case END_OF_STREAM:
+            return END_OF_STREAM_VALUE;
+    }
+
+    if (Py_EnterRecursiveCall(" while decoding a PackStream value"))
+        return NULL;
+    value = decode_collection(reader, marker);
+    Py_LeaveRecursiveCall();
+    return value;
+}
+
+static Py_ssize_t
+get_size_attribute(PyObject *object, const char *name)
+{
+    PyObject *attribute = PyObject_GetAttrString(object, name);
+    Py_ssize_t size;
+    if (attribute == NULL)
+        return -1;
+    size = PyNumber_AsSsize_t(attribute, PyExc_OverflowError);
+    Py_DECREF(attribute);
+    return size;
+}
+
+static int
+add_to_size_attribute(PyObject *object, const char *name, Py_ssize_t n)
+{
+    PyObject *total;
+    int status;
+    Py_ssize_t size = get_size_attribute(object, name);
+    if (size == -1 && PyErr_Occurred())
+        return -1;
+    total = PyLong_FromSsize_t(size + n);
+    if (total == NULL)
+        return -1;
+    status = PyObject_SetAttrString(object, name, total);
+    Py_DECREF(total);
+    return status;
+}
+
+static int
+reader_use_string_cache(Reader *reader, PyObject *string_cache)
+{
+    reader->strings = PyObject_GetAttrString(string_cache, "strings");
+    if (reader->strings == NULL)
+        return -1;
+    if (!PyDict_Check(reader->strings)) {
+        PyErr_SetString(PyExc_TypeError, "String cache must hold a dictionary of strings");
+        return -1;
+    }
+    reader->max_strings = get_size_attribute(string_cache, "max_size");
+    if (reader->max_strings == -1 && PyErr_Occurred())
+        return -1;
+    reader->max_string_length = get_size_attribute(string_cache, "max_length");
+    if (reader->max_string_length == -1 && PyErr_Occurred())
+        return -1;
+    return 0;
+}
+
+/* Convert an optional size limit, where None is stored as -1 */
+static int
+get_limit(PyObject *object, const char *name, Py_ssize_t *limit)
+{
+    if (object == Py_None) {
+        *limit = -1;
+        return 0;
+    }
+    *limit = PyNumber_AsSsize_t(object, PyExc_OverflowError);
+    if (*limit == -1 && PyErr_Occurred())
+        return -1;
+    if (*limit < 0) {
+        PyErr_Format(PyExc_ValueError, "%s must not be negative", name);
+        return -1;
+    }
+    return 0;
+}
+
+static int
+reader_use_limits(Reader *reader, PyObject *limits)
+{
+    reader->max_value_size = reader->max_collection_size = reader->lazy_bytes_size = -1;
+    if (limits == Py_None)
+        return 0;
+    if (!PyTuple_Check(limits) || PyTuple_GET_SIZE(limits) != 3) {
+        PyErr_SetString(PyExc_TypeError, "limits must be a 3-tuple or None");
+        return -1;
+    }
+    if (get_limit(PyTuple_GET_ITEM(limits, 0), "max_value_size", &reader->max_value_size) < 0 ||
+            get_limit(PyTuple_GET_ITEM(limits, 1), "max_collection_size", &reader->max_collection_size) < 0 ||
+            get_limit(PyTuple_GET_ITEM(limits, 2), "lazy_bytes_size", &reader->lazy_bytes_size) < 0)
+        return -1;
+    return 0;
+}
+
+static int
+reader_init(Reader *reader, Py_buffer *view, PyObject *structure, PyObject *hydration_functions,
+            PyObject *string_cache, PyObject *limits)
+{
+    reader->strings = NULL;
+    if (reader_use_limits(reader, limits) < 0)
+        return -1;
+    if (hydration_functions != Py_None && !PyDict_Check(hydration_functions)) {
+        PyErr_SetString(PyExc_TypeError, "hydration_functions must be a dictionary or None");
+        return -1;
+    }
+    reader->data = (const unsigned char *) view->buf;
+    reader->size = view->len;
+    reader->offset = 0;
+    reader->structure = structure;
+    reader->hydration_functions = hydration_functions == Py_None ? NULL : hydration_functions;
+    reader->hits = 0;
+    reader->misses = 0;
+    reader->truncated = 0;
+    if (string_cache != Py_None)
+        return reader_use_string_cache(reader, string_cache);
+    return 0;
+}
+
+/* Release the reader, updating the string cache counters if `result` has
+ * been successfully decoded. Returns `result`, or NULL on failure. */
+static PyObject *
+reader_finish(Reader *reader, PyObject *string_cache, PyObject *result)
+{
+    if (reader->strings != NULL) {
+        if (result != NULL && (add_to_size_attribute(string_cache, "hits", reader->hits) < 0 ||
+                               add_to_size_attribute(string_cache, "misses", reader->misses) < 0))
+            Py_CLEAR(result);
+        Py_CLEAR(reader->strings);
+    }
+    return result;
+}
+
+static PyObject *
+decode(PyObject *self, PyObject *args)
+{
+    Py_buffer view;
+    Reader reader;
+    PyObject *structure, *hydration_functions = Py_None, *string_cache = Py_None, *limits = Py_None;
+    PyObject *values = NULL, *value;
+
+    if (!PyArg_ParseTuple(args, "s*O|OOO:decode", &view, &structure, &hydration_functions,
+                          &string_cache, &limits))
+        return NULL;
+    if (reader_init(&reader, &view, structure, hydration_functions, string_cache, limits) < 0)
+        goto done;
+
+    values = PyList_New(0);
+    if (values == NULL)
+        goto done;
+    while (reader.offset < reader.size) {
+        value = decode_value(&reader);
+        if (value == END_OF_STREAM_VALUE) {
+            PyErr_SetString(PyExc_ValueError, "Unexpected END_OF_STREAM marker");
+            value = NULL;
+        }
+        if (value == NULL || PyList_Append(values, value) < 0) {
+            Py_XDECREF(value);
+            Py_CLEAR(values);
+            goto done;
+        }
+        Py_DECREF(value);
+    }
+
+done:
+    values = reader_finish(&reader, string_cache, values);
+    PyBuffer_Release(&view);
+    return values;
+}
+
+static PyObject *
+decode_one(PyObject *self, PyObject *args)
+{
+    Py_buffer view;
+    Reader reader;
+    Py_ssize_t offset;
+    PyObject *structure, *hydration_functions = Py_None, *string_cache = Py_None, *limits = Py_None;
+    PyObject *result = NULL, *value;
+
+    if (!PyArg_ParseTuple(args, "s*nO|OOO:decode_one", &view, &offset, &structure,
+                          &hydration_functions, &string_cache, &limits))
+        return NULL;
+    if (reader_init(&reader, &view, structure, hydration_functions, string_cache, limits) < 0)
+        goto done;
+    if (offset < 0 || offset > reader.size) {
+        PyErr_SetString(PyExc_IndexError, "Offset out of range");
+        goto done;
+    }
+    reader.offset = offset;
+
+    value = decode_value(&reader);
+    if (value == END_OF_STREAM_VALUE) {
+        PyErr_SetString(PyExc_ValueError, "Unexpected END_OF_STREAM marker");
+        value = NULL;
+    }
+    if (value != NULL) {
+        result = Py_BuildValue("(Nn)", value, reader.offset);
+    }
+    else if (reader.truncated && PyErr_ExceptionMatches(PyExc_ValueError)) {
+        PyErr_Clear();
+        Py_INCREF(Py_None);
+        result = Py_None;
+    }
+
+done:
+    result = reader_finish(&reader, string_cache, result);
+    PyBuffer_Release(&view);
+    return result;
+}
+
+
+/* Module
+ * ====== */
+
+static PyMethodDef methods[] = {
+    {"encode", (PyCFunction) encode, METH_O,
+     "encode(value) -> bytes or NotImplemented\n\n"
+     "Encode a value consisting only of built-in types as PackStream."},
+    {"decode", (PyCFunction) decode, METH_VARARGS,
+     "decode(data, structure, hydration_functions=None, string_cache=None, limits=None) -> list\n\n"
+     "Decode all PackStream values held in a buffer."},
+    {"decode_one", (PyCFunction) decode_one, METH_VARARGS,
+     "decode_one(data, offset, structure, hydration_functions=None, string_cache=None, limits=None)"
+     " -> (value, offset) or None\n\n"
+     "Decode a single PackStream value, or return None if the data is incomplete."},
+    {NULL, NULL, 0, NULL}
+};
+
+static int
+init_single_bytes(void)
+{
+    int i;
+    char c;
+    for (i = 0; i < 256; i++) {
+        c = (char) i;
+        single_bytes[i] = PyBytes_FromStringAndSize(&c, 1);
+        if (single_bytes[i] == NULL)
+            return -1;
+    }
+    return 0;
+}
+
+#if IS_PY3
+
+static struct PyModuleDef module_definition = {
+    PyModuleDef_HEAD_INIT, "_packstream", NULL, -1, methods
+};
+
+PyMODINIT_FUNC
+PyInit__packstream(void)
+{
+    if (init_single_bytes() < 0)
+        return NULL;
+    return PyModule_Create(&module_definition);
+}
+
+#else
+
+PyMODINIT_FUNC
+init_packstream(void)
+{
+    if (init_single_bytes() < 0)
+        return;
+    Py_InitModule("_packstream", methods);
+}
+
+#endif
@@ -30,19 +30,24 @@ from __future__ import division
 
 from base64 import b64encode
 from collections import deque
-from io import BytesIO
+from itertools import chain
 import logging
 from os import makedirs, open as os_open, write as os_write, close as os_close, O_CREAT, O_APPEND, O_WRONLY
 from os.path import dirname, isfile
-from select import select
-from socket import create_connection, SHUT_RDWR, error as SocketError
-from struct import pack as struct_pack, unpack as struct_unpack, unpack_from as struct_unpack_from
-
-from .constants import DEFAULT_USER_AGENT, KNOWN_HOSTS, MAGIC_PREAMBLE, TRUST_DEFAULT, TRUST_ON_FIRST_USE
+import socket as socket_module
+from socket import (getaddrinfo, socket, error as SocketError, timeout as SocketTimeout, IPPROTO_TCP, SHUT_RDWR,
+                    SOCK_STREAM, SOL_SOCKET, SO_KEEPALIVE, SO_RCVBUF, SO_SNDBUF, TCP_NODELAY)
+from struct import pack as struct_pack, pack_into as struct_pack_into, unpack as struct_unpack, \
+    unpack_from as struct_unpack_from
+
+from .constants import DEFAULT_MAX_READ_SIZE, DEFAULT_PACKED_STRING_CACHE_SIZE, DEFAULT_READ_SIZE, \
+    DEFAULT_STRING_CACHE_SIZE, DEFAULT_USER_AGENT, KNOWN_HOSTS, MAGIC_PREAMBLE, TRUST_DEFAULT, TRUST_ON_FIRST_USE
 from .compat import hex2
-from .exceptions import ProtocolError, Unauthorized
-from .packstream import Packer, Unpacker
-from .ssl_compat import SSL_AVAILABLE, HAS_SNI, SSLError
+from .exceptions import ProtocolError, ServiceTimeout, SizeLimitError, Unauthorized
+from . import packstream
+from .packstream import LARGE_BYTES_SIZE, Packer, Unpacker, PackedStringCache, StringCache
+from .ssl_compat import SSL_AVAILABLE, HAS_SNI, SSLError, SSLSocket
+from .types import hydration_functions
 
 
 # Signature bytes for each message type
@@ -57,6 +62,15 @@ RECORD = b"\x71"           # 0111 0001 // RECORD <value>
 IGNORED = b"\x7E"          # 0111 1110 // IGNORED <metadata>
 FAILURE = b"\x7F"          # 0111 1111 // FAILURE <metadata>
 
+#: A whole PULL_ALL message, which has no fields.
+PULL_ALL_MESSAGE = b"\xB0" + PULL_ALL
+
+#: A whole DISCARD_ALL message, which has no fields.
+DISCARD_ALL_MESSAGE = b"\xB0" + DISCARD_ALL
+
+#: The start of every RECORD message, which has a single field.
+RECORD_HEADER = b"\xB1" + RECORD
+
 DETAIL = {RECORD}
 SUMMARY = {SUCCESS, IGNORED, FAILURE}
 
@@ -75,116 +89,330 @@ message_names = {
 
 # Set up logger
 log = logging.getLogger("neo4j.bolt")
+log_enabled = log.isEnabledFor
 log_debug = log.debug
 log_info = log.info
 log_warning = log.warning
 log_error = log.error
 
+#: Driver settings for keep-alive probes, and the TCP options that apply
+#: them, where supported by the platform.
+KEEP_ALIVE_OPTIONS = [(key, getattr(socket_module, option)) for key, option in [
+    ("keep_alive_idle", "TCP_KEEPIDLE" if hasattr(socket_module, "TCP_KEEPIDLE") else "TCP_KEEPALIVE"),
+    ("keep_alive_interval", "TCP_KEEPINTVL"),
+    ("keep_alive_count", "TCP_KEEPCNT"),
+] if hasattr(socket_module, option)]
+
 
 class ChunkChannel(object):
     """ Reader/writer for chunked data.
 
+    Written data is appended to a single output buffer per connection,
+    with space for each chunk header reserved ahead of the chunk and
+    filled in once the chunk is closed. Large byte arrays are instead
+    held by reference, split into chunks by slicing views of them, until
+    sent. Everything queued is then sent by a single scatter-gather call
+    where the socket supports it, so that large byte arrays are never
+    copied.
+
+    Received data is read directly into a receive buffer that is reused
+    for the lifetime of the connection, and each chunk is returned as a
+    view of that buffer rather than copied out of it. Each read requests
+    all the space remaining in the buffer, which starts at `read_size`
+    bytes and doubles, up to `max_read_size`, whenever a read fills it,
+    so that large results are streamed with fewer, larger reads.
+
     .. note:: logs at DEBUG level
     """
 
     max_chunk_size = 65535
 
-    def __init__(self, sock):
+    def __init__(self, sock, read_size=DEFAULT_READ_SIZE, max_read_size=DEFAULT_MAX_READ_SIZE):
         self.socket = sock
-        self.raw = BytesIO()
-        self.output_buffer = []
-        self.output_size = 0
-        self._recv_buffer = b""
+        # Scatter-gather output is not available on all platforms, nor for SSL sockets
+        if SSLSocket is not None and isinstance(sock, SSLSocket):
+            self.sendmsg = None
+        else:
+            self.sendmsg = getattr(sock, "sendmsg", None)
+        self.output = bytearray(2)      # begins with the header of the first chunk
+        self.chunk_start = 0            # position of the header of the open chunk
+        self.chunk_size = 0             # size of the data in the open chunk
+        self.references = []            # (position, data) for data held by reference
+        self.sends = 0                  # number of sends attempted
+        self.input = bytearray(read_size)
+        self.input_view = memoryview(self.input)
+        self.input_start = 0            # position of the first unread byte received
+        self.input_end = 0              # position after the last byte received
+        self.input_filled = False       # whether the last read filled the buffer
+        self.max_read_size = max(read_size, max_read_size)
 
     def write(self, b):
         """ Write some bytes, splitting into chunks if necessary.
         """
+        size = len(b)
+        chunk_size = self.chunk_size + size
+        if chunk_size < self.max_chunk_size and size < LARGE_BYTES_SIZE:
+            self.output += b
+            self.chunk_size = chunk_size
+            return
         max_chunk_size = self.max_chunk_size
-        output_buffer = self.output_buffer
-        while b:
-            size = len(b)
-            future_size = self.output_size + size
-            if future_size >= max_chunk_size:
-                end = max_chunk_size - self.output_size
-                output_buffer.append(b[:end])
-                self.output_size = max_chunk_size
-                b = b[end:]
-                self.flush()
-            else:
-                output_buffer.append(b)
-                self.output_size = future_size
-                b = b""
+        view = memoryview(b)
+        while view:
+            space = max_chunk_size - self.chunk_size
+            if len(view) < space:
+                self.write_view(view)
+                break
+            self.write_view(view[:space])
+            view = view[space:]
+            self.flush()
+            # Send full chunks immediately rather than holding
+            # large or streamed messages in memory in their entirety
+            self.send()
+
+    def write_view(self, view):
+        """ Add data that fits within the open chunk, holding it by
+        reference if large.
+        """
+        if len(view) >= LARGE_BYTES_SIZE:
+            self.references.append((len(self.output), view))
+        else:
+            self.output += view
+        self.chunk_size += len(view)
 
     def flush(self, end_of_message=False):
-        """ Flush everything written since the last chunk to the
-        stream, followed by a zero-chunk if required.
+        """ Close the open chunk, if it holds any data, followed by a
+        zero-chunk if required, ready to be sent.
         """
-        output_buffer = self.output_buffer
-        if output_buffer:
-            lines = [struct_pack(">H", self.output_size)] + output_buffer
-        else:
-            lines = []
-        if end_of_message:
-            lines.append(b"\x00\x00")
-        if lines:
-            self.raw.writelines(lines)
-            self.raw.flush()
-            del output_buffer[:]
-            self.output_size = 0
+        output = self.output
+        if self.chunk_size:
+            struct_pack_into(">H", output, self.chunk_start, self.chunk_size)
+            self.chunk_size = 0
+            if end_of_message:
+                output += b"\x00\x00"
+        elif not end_of_message:
+            # Keep the space reserved for the header of the empty chunk
+            return
+        # Reserve space for the header of the next chunk
+        self.chunk_start = len(output)
+        output += b"\x00\x00"
+
+    def rewind(self, end):
+        """ Discard everything written after position `end` of the output
+        buffer, which must be the end of a message, provided that nothing
+        has been sent since.
+        """
+        del self.output[end:]
+        self.chunk_start = end - 2
+        self.chunk_size = 0
+        if self.references:
+            self.references = [(position, reference)
+                               for position, reference in self.references if position < end]
 
     def send(self):
         """ Send all queued messages to the server.
         """
-        data = self.raw.getvalue()
-        if __debug__:
-            log_debug("C: %s", ":".join(map(hex2, data)))
-        self.socket.sendall(data)
-
-        self.raw.seek(self.raw.truncate(0))
-
-    def _recv(self, size):
-        # If data is needed, keep reading until all bytes have been received
-        remaining = size - len(self._recv_buffer)
-        ready_to_read = None
-        while remaining > 0:
-            # Read up to the required amount remaining
-            b = self.socket.recv(8192)
-            if b:
-                if __debug__: log_debug("S: %s", ":".join(map(hex2, b)))
+        self.sends += 1
+        output = self.output
+        end = self.chunk_start
+        references = self.references
+        view = memoryview(output)
+        segments = []
+        start = 0
+        sent_references = 0
+        for position, reference in references:
+            if position > end:
+                break
+            if position > start:
+                segments.append(view[start:position])
+                start = position
+            segments.append(reference)
+            sent_references += 1
+        if end > start:
+            segments.append(view[start:end])
+        if __debug__ and log_enabled(logging.DEBUG):
+            log_debug("C: %s", ":".join(map(hex2, chain.from_iterable(map(memoryview, segments)))))
+        try:
+            if self.sendmsg is None:
+                # Python 2 cannot join memoryviews, so they are converted to bytes first
+                self.socket.sendall(b"".join(segment if isinstance(segment, bytes) else segment.tobytes()
+                                             for segment in segments))
             else:
-                if ready_to_read is not None:
+                send_segments(self.sendmsg, segments)
+        except SocketTimeout:
+            raise ServiceTimeout("Server did not accept data within %s seconds" % self.socket.gettimeout())
+        segments = view = None
+        # Discard everything sent, leaving the open chunk at the start of the output buffer
+        try:
+            del output[:end]
+        except BufferError:
+            # Views of the data sent are still held elsewhere, so leave them to it
+            self.output = output[end:]
+        self.chunk_start = 0
+        if references:
+            self.references = [(position - end, reference)
+                               for position, reference in references[sent_references:]]
+
+    def _fill(self, size):
+        """ Receive data until at least `size` unread bytes are held in
+        the receive buffer, returning the position of the first.
+        """
+        start = self.input_start
+        end = self.input_end
+        if end - start >= size:
+            return start
+        view = self.input_view
+        capacity = len(view)
+        if size > capacity or self.input_filled and capacity < self.max_read_size:
+            # Grow the buffer to fit the data required, or because reads are filling it,
+            # moving any unread data to the start of the new buffer
+            self.input = bytearray(max(size, min(2 * capacity, self.max_read_size)))
+            grown = memoryview(self.input)
+            end -= start
+            grown[:end] = view[start:start + end]
+            self.input_view = view = grown
+            capacity = len(view)
+            start = 0
+        elif start == end:
+            start = end = 0
+        elif start + size > capacity:
+            # Move the unread data to the start of the buffer to make room
+            end -= start
+            view[:end] = view[start:start + end]
+            start = 0
+        try:
+            while end - start < size:
+                # Block until data arrives, then read as much as is available, up to the space remaining
+                try:
+                    received = self.socket.recv_into(view[end:])
+                except SocketTimeout:
+                    raise ServiceTimeout("Server did not respond within %s seconds" % self.socket.gettimeout())
+                if not received:
                     raise ProtocolError("Server closed connection")
-            remaining -= len(b)
-            self._recv_buffer += b
-
-            # If more is required, wait for available network data
-            if remaining > 0:
-                ready_to_read, _, _ = select((self.socket,), (), (), 0)
-                while not ready_to_read:
-                    ready_to_read, _, _ = select((self.socket,), (), (), 0)
+                if __debug__ and log_enabled(logging.DEBUG):
+                    log_debug("S: %s", ":".join(map(hex2, view[end:end + received])))
+                end += received
+                self.input_filled = end == capacity
+        finally:
+            self.input_start = start
+            self.input_end = end
+        return start
 
-        # Split off the amount of data required and keep the rest in the buffer
-        data, self._recv_buffer = self._recv_buffer[:size], self._recv_buffer[size:]
-        return data
+    def _recv(self, size):
+        """ Return a view of the next `size` bytes received, which is
+        only valid until data is next received.
+        """
+        start = self._fill(size)
+        self.input_start = start + size
+        return self.input_view[start:start + size]
+
+    def buffered_message(self):
+        """ Return the data of the next message if the receive buffer
+        holds all of it in a single chunk, as a view of that buffer that
+        is only valid until data is next received, or ``None`` if not.
+        """
+        received = self.input
+        start = self.input_start
+        if self.input_end - start < 4:
+            return None
+        chunk_size, = struct_unpack_from(">H", received, start)
+        end = start + 2 + chunk_size
+        if end + 2 > self.input_end or received[end] or received[end + 1] or not chunk_size:
+            return None
+        self.input_start = end + 2
+        return self.input_view[start + 2:end]
+
+    def message_buffered(self):
+        """ Return ``True`` if the receive buffer holds every chunk of the
+        next message, so that it can be read without waiting.
+        """
+        received = self.input
+        position = self.input_start
+        end = self.input_end
+        while position + 2 <= end:
+            chunk_size, = struct_unpack_from(">H", received, position)
+            position += 2 + chunk_size
+            if chunk_size == 0:
+                return True
+        return False
 
     def chunk_reader(self):
-        chunk_size = -1
-        while chunk_size != 0:
-            chunk_header = self._recv(2)
-            chunk_size, = struct_unpack_from(">H", chunk_header)
-            if chunk_size > 0:
-                data = self._recv(chunk_size)
-                yield data
+        """ Yield the data of each chunk of the next message, as views of
+        the receive buffer that are only valid until the next is yielded.
+        """
+        while True:
+            start = self._fill(2)
+            chunk_size, = struct_unpack_from(">H", self.input, start)
+            self.input_start = start + 2
+            if chunk_size == 0:
+                break
+            yield self._recv(chunk_size)
+
+
+#: Maximum number of segments passed to each scatter-gather call, within
+#: the IOV_MAX limit of all common platforms.
+MAX_SEGMENTS = 1024
+
+
+def send_segments(sendmsg, segments):
+    """ Send a list of byte segments in full through `sendmsg`, without
+    joining them, resuming after any partial send.
+    """
+    index = 0
+    count = len(segments)
+    while index < count:
+        sent = sendmsg(segments[index:index + MAX_SEGMENTS])
+        while index < count and sent >= len(segments[index]):
+            sent -= len(segments[index])
+            index += 1
+        if sent:
+            segments[index] = memoryview(segments[index])[sent:]
 
 
 class Response(object):
     """ Subscriber object for a full response (zero or
     more detail messages followed by one summary message).
+
+    The `numeric_lists` setting is applied to the connection's
+    :class:`.Unpacker` while the messages of this response are decoded.
+
+    Handlers are looked up through the :attr:`handlers` table, which is
+    built when the first message of the response is received, so any
+    handlers replaced on an instance must be set before then.
+
+    While :attr:`discard_records` is true, any RECORD messages received
+    for the response are skipped without being decoded, and never reach
+    its handlers.
     """
 
-    def __init__(self, connection):
+    #: Whether records received for this response are to be skipped.
+    discard_records = False
+
+    def __init__(self, connection, numeric_lists=None):
         self.connection = connection
         self.complete = False
+        self.numeric_lists = numeric_lists
+        self._handlers = None
+
+    @property
+    def handlers(self):
+        """ Table of handlers by message signature. Each is called with
+        the fields of a message, except that the handler for RECORD is
+        called with a list of the values of consecutive records.
+        """
+        handlers = self._handlers
+        if handlers is None:
+            handlers = self._handlers = {
+                RECORD: self.on_records,
+                SUCCESS: self.on_success,
+                IGNORED: self.on_ignored,
+                FAILURE: self.on_failure,
+            }
+        return handlers
+
+    def on_records(self, records):
+        on_record = self.on_record
+        for values in records:
+            on_record(values)
 
     def on_record(self, values):
         pass
@@ -209,8 +437,26 @@ class Connection(object):
 
     def __init__(self, sock, **config):
         self.defunct = False
-        self.channel = ChunkChannel(sock)
-        self.packer = Packer(self.channel)
+        self.channel = ChunkChannel(sock, read_size=config.get("read_size", DEFAULT_READ_SIZE),
+                                    max_read_size=config.get("max_read_size", DEFAULT_MAX_READ_SIZE))
+
+        # Strings are cached in packed form for sending and in decoded form on receipt
+        # The C accelerator packs strings directly, so has no use for a cache of packed strings
+        packed_string_cache_size = config.get("packed_string_cache_size", DEFAULT_PACKED_STRING_CACHE_SIZE)
+        if packed_string_cache_size and packstream._packstream is None:
+            packed_string_cache = PackedStringCache(packed_string_cache_size)
+        else:
+            packed_string_cache = None
+        string_cache_size = config.get("string_cache_size", DEFAULT_STRING_CACHE_SIZE)
+        string_cache = StringCache(string_cache_size) if string_cache_size else None
+
+        self.packer = Packer(self.channel, list_streams=config.get("list_streams", True),
+                             string_cache=packed_string_cache)
+        self.unpacker = Unpacker(hydration_functions=hydration_functions, string_cache=string_cache,
+                                 max_value_size=config.get("max_value_size"),
+                                 max_collection_size=config.get("max_collection_size"),
+                                 lazy_bytes_size=config.get("lazy_bytes_size"))
+        self.max_message_size = config.get("max_message_size")
         self.responses = deque()
         self.closed = False
 
@@ -259,13 +505,20 @@ class Connection(object):
         :arg fields: the fields of the message as a tuple
         :arg response: a response object to handle callbacks
         """
-        if __debug__:
+        if __debug__ and log_enabled(logging.INFO):
             log_info("C: %s %s", message_names[signature], " ".join(map(repr, fields)))
 
-        self.packer.pack_struct_header(len(fields), signature)
-        for field in fields:
-            self.packer.pack(field)
-        self.channel.flush(end_of_message=True)
+        channel = self.channel
+        end = len(channel.output)
+        sends = channel.sends
+        try:
+            self.packer.pack_struct_header(len(fields), signature)
+            for field in fields:
+                self.packer.pack(field)
+            channel.flush(end_of_message=True)
+        except Exception:
+            self._abandon(end, sends)
+            raise
         self.responses.append(response)
 
     def acknowledge_failure(self):
@@ -302,6 +555,55 @@ class Connection(object):
         while not response.complete:
             fetch()
 
+    def append_run(self, statement, parameters, run_response, pull_all_response, discard=False):
+        """ Add a RUN message and a PULL_ALL message to the outgoing
+        queue, encoding each in a single step.
+
+        :arg statement: the statement text
+        :arg parameters: the statement parameters as a dictionary
+        :arg run_response: a response object to handle callbacks for RUN
+        :arg pull_all_response: a response object to handle callbacks
+                                for PULL_ALL
+        :arg discard: if true, send DISCARD_ALL instead of PULL_ALL, so
+                      that the server sends no records
+        """
+        if __debug__ and log_enabled(logging.INFO):
+            log_info("C: RUN %r %r", statement, parameters)
+            log_info("C: DISCARD_ALL " if discard else "C: PULL_ALL ")
+
+        channel = self.channel
+        packer = self.packer
+        end = len(channel.output)
+        sends = channel.sends
+        try:
+            if packer.string_cache is None:
+                packer.pack((RUN, (statement, parameters)))
+            else:
+                packer.pack_struct_header(2, RUN)
+                packer.pack_cached_string(statement)
+                packer.pack(parameters)
+            channel.flush(end_of_message=True)
+            channel.write(DISCARD_ALL_MESSAGE if discard else PULL_ALL_MESSAGE)
+            channel.flush(end_of_message=True)
+        except Exception:
+            self._abandon(end, sends)
+            raise
+        self.responses.extend((run_response, pull_all_response))
+
+    def _abandon(self, end, sends):
+        """ Discard messages that could not be written in full, which
+        began at position `end` of the output buffer after `sends` sends.
+        Full chunks are sent as they are written, so if any part of them
+        may have gone, the server is left out of step and the connection
+        is marked defunct instead.
+        """
+        channel = self.channel
+        if channel.sends == sends:
+            channel.rewind(end)
+        else:
+            self.defunct = True
+            self.close()
+
     def send(self):
         """ Send all queued messages to the server.
         """
@@ -309,42 +611,125 @@ class Connection(object):
             raise ProtocolError("Cannot write to a closed connection")
         if self.defunct:
             raise ProtocolError("Cannot write to a defunct connection")
-        self.channel.send()
+        try:
+            self.channel.send()
+        except ProtocolError:
+            self.defunct = True
+            self.close()
+            raise
 
     def fetch(self):
-        """ Receive exactly one message from the server.
+        """ Receive at least one message from the server, followed by
+        any others already received in full, passing each to the
+        response to which it belongs.
         """
         if self.closed:
             raise ProtocolError("Cannot read from a closed connection")
         if self.defunct:
             raise ProtocolError("Cannot read from a defunct connection")
-        raw = BytesIO()
-        unpack = Unpacker(raw).unpack
+        channel = self.channel
+        if channel.chunk_start:
+            # Messages are still queued, so must be sent before any response can arrive
+            self.send()
+        responses = self.responses
+        handle = self._handle
+        # Values of consecutive records, to be passed on together
+        records = []
+        messages = self._receive()
+        while True:
+            for signature, fields in messages:
+                if __debug__ and log_enabled(logging.INFO):
+                    log_info("S: %s %s", message_names[signature], " ".join(map(repr, fields)))
+                if signature == RECORD:
+                    records.append(fields[0])
+                else:
+                    if records:
+                        responses[0].handlers[RECORD](records)
+                        records = []
+                    handle(signature, fields)
+            # Carry on without waiting while further messages have already been received in full
+            if not responses:
+                break
+            data = channel.buffered_message()
+            if data is not None:
+                messages = self._decode(data)
+            elif channel.message_buffered():
+                messages = self._receive()
+            else:
+                break
+        if records:
+            responses[0].handlers[RECORD](records)
+
+    def _receive(self):
+        """ Receive the next message, decoding each chunk as it arrives
+        so that data is released as soon as it has been decoded.
+        """
+        response = self.responses[0]
+        unpacker = self.unpacker
+        numeric_lists = response.numeric_lists
+        if unpacker.numeric_lists != numeric_lists:
+            unpacker.numeric_lists = numeric_lists
+        max_message_size = self.max_message_size
+        messages = []
+        size = 0
+        chunks = self.channel.chunk_reader()
         try:
-            raw.writelines(self.channel.chunk_reader())
-        except ProtocolError:
+            for data in chunks:
+                if size == 0 and response.discard_records and data[:2] == RECORD_HEADER:
+                    # Skip the whole record, as it would only be thrown away
+                    for _ in chunks:
+                        pass
+                    return messages
+                size += len(data)
+                if max_message_size is not None and size > max_message_size:
+                    raise SizeLimitError("Message of at least %d bytes exceeds the limit of %d bytes" %
+                                         (size, max_message_size))
+                messages.extend(unpacker.feed(data))
+            unpacker.end()
+        except Exception:
+            # The rest of the message may still be unread, so the connection can no longer be relied upon
+            unpacker.reset()
             self.defunct = True
             self.close()
             raise
-        # Unpack from the raw byte stream and call the relevant message handler(s)
-        raw.seek(0)
+        return messages
+
+    def _decode(self, data):
+        """ Decode a message already received in full.
+        """
         response = self.responses[0]
-        for signature, fields in unpack():
-            if __debug__:
-                log_info("S: %s %s", message_names[signature], " ".join(map(repr, fields)))
-            if signature in SUMMARY:
-                response.complete = True
-                self.responses.popleft()
-            if signature == FAILURE:
-                self.acknowledge_failure()
-            handler_name = "on_%s" % message_names[signature].lower()
-            try:
-                handler = getattr(response, handler_name)
-            except AttributeError:
-                pass
-            else:
-                handler(*fields)
-        raw.close()
+        if response.discard_records and data[:2] == RECORD_HEADER:
+            # Skip the record, as it would only be thrown away
+            return ()
+        unpacker = self.unpacker
+        numeric_lists = response.numeric_lists
+        if unpacker.numeric_lists != numeric_lists:
+            unpacker.numeric_lists = numeric_lists
+        max_message_size = self.max_message_size
+        try:
+            if max_message_size is not None and len(data) > max_message_size:
+                raise SizeLimitError("Message of at least %d bytes exceeds the limit of %d bytes" %
+                                     (len(data), max_message_size))
+            messages = unpacker.feed(data)
+            unpacker.end()
+        except Exception:
+            unpacker.reset()
+            self.defunct = True
+            self.close()
+            raise
+        return messages
+
+    def _handle(self, signature, fields):
+        """ Call the relevant handler of the current response for a
+        summary message.
+        """
+        response = self.responses[0]
+        if signature in SUMMARY:
+            response.complete = True
+            self.responses.popleft()
+        if signature == FAILURE:
+            self.acknowledge_failure()
+        response.handlers[signature](*fields)
 
     def fetch_all(self):
         while self.responses:
@@ -408,6 +793,54 @@ class PersonalCertificateStore(CertificateStore):
         return True
 
 
+def set_socket_options(s, config):
+    """ Apply the socket options given in the driver configuration to
+    socket `s`.
+    """
+    s.setsockopt(IPPROTO_TCP, TCP_NODELAY, 1 if config.get("tcp_nodelay", True) else 0)
+    keep_alive = config.get("keep_alive")
+    keep_alive_settings = [(option, config[key]) for key, option in KEEP_ALIVE_OPTIONS
+                           if config.get(key) is not None]
+    if keep_alive is None and keep_alive_settings:
+        keep_alive = True
+    if keep_alive is not None:
+        s.setsockopt(SOL_SOCKET, SO_KEEPALIVE, 1 if keep_alive else 0)
+    if keep_alive:
+        for option, value in keep_alive_settings:
+            s.setsockopt(IPPROTO_TCP, option, value)
+    for key, option in [("receive_buffer_size", SO_RCVBUF), ("send_buffer_size", SO_SNDBUF)]:
+        value = config.get(key)
+        if value is not None:
+            s.setsockopt(SOL_SOCKET, option, value)
+
+
+def create_connection(host_port, config):
+    """ Return a socket connected to the address given, with socket
+    options applied before connecting so that buffer sizes are taken
+    into account when the connection is negotiated.
+    """
+    host, port = host_port
+    error = None
+    for family, socket_type, protocol, _, address in getaddrinfo(host, port, 0, SOCK_STREAM):
+        s = socket(family, socket_type, protocol)
+        try:
+            set_socket_options(s, config)
+            s.settimeout(config.get("connection_timeout"))
+            s.connect(address)
+        except SocketTimeout:
+            # Try any other addresses before giving up
+            error = ServiceTimeout("Timed out connecting to %s on port %d" % host_port)
+            s.close()
+        except SocketError as e:
+            error = e
+            s.close()
+        else:
+            return s
+    if error is None:
+        raise SocketError("No address found for %s:%d" % host_port)
+    raise error
+
+
 def connect(host_port, ssl_context=None, **config):
     """ Connect and perform a handshake and return a valid Connection object, assuming
     a protocol version can be agreed.
@@ -418,19 +851,26 @@ def connect(host_port, ssl_context=None, **config):
     # https://docs.python.org/2/library/errno.html
     if __debug__: log_info("~~ [CONNECT] %s", host_port)
     try:
-        s = create_connection(host_port)
+        s = create_connection(host_port, config)
     except SocketError as error:
         if error.errno == 111 or error.errno == 61 or error.errno == 10061:
             raise ProtocolError("Unable to connect to %s on port %d - is the server running?" % host_port)
         else:
             raise
 
+    # Both the TLS and the Bolt handshakes must complete within the handshake timeout
+    s.settimeout(config.get("handshake_timeout"))
+
     # Secure the connection if an SSL context has been provided
     if ssl_context and SSL_AVAILABLE:
         host, port = host_port
         if __debug__: log_info("~~ [SECURE] %s", host)
         try:
             s = ssl_context.wrap_socket(s, server_hostname=host if HAS_SNI else None)
+        except SocketTimeout:
+            s.close()
+            raise ServiceTimeout("Server did not complete the TLS handshake within %s seconds" %
+                                 config.get("handshake_timeout"))
         except SSLError as cause:
             error = ProtocolError("Cannot establish secure connection; %s" % cause.args[1])
             error.__cause__ = cause
@@ -454,22 +894,27 @@ def connect(host_port, ssl_context=None, **config):
     handshake = [MAGIC_PREAMBLE] + supported_versions
     if __debug__: log_info("C: [HANDSHAKE] 0x%X %r", MAGIC_PREAMBLE, supported_versions)
     data = b"".join(struct_pack(">I", num) for num in handshake)
-    if __debug__: log_debug("C: %s", ":".join(map(hex2, data)))
-    s.sendall(data)
-
-    # Handle the handshake response
-    ready_to_read, _, _ = select((s,), (), (), 0)
-    while not ready_to_read:
-        ready_to_read, _, _ = select((s,), (), (), 0)
-    data = s.recv(4)
+    if __debug__ and log_enabled(logging.DEBUG): log_debug("C: %s", ":".join(map(hex2, data)))
+    # Handle the handshake response, blocking until it arrives
+    try:
+        s.sendall(data)
+        data = b""
+        while len(data) < 4:
+            received = s.recv(4 - len(data))
+            if not received:
+                break
+            data += received
+    except SocketTimeout:
+        s.close()
+        raise ServiceTimeout("Server did not respond to the handshake within %s seconds" %
+                             config.get("handshake_timeout"))
     data_size = len(data)
     if data_size == 0:
-        # If no data is returned after a successful select
-        # response, the server has closed the connection
+        # If no data is returned, the server has closed the connection
         log_error("S: [CLOSE]")
         raise ProtocolError("Server closed connection without responding to handshake")
     if data_size == 4:
-        if __debug__: log_debug("S: %s", ":".join(map(hex2, data)))
+        if __debug__ and log_enabled(logging.DEBUG): log_debug("S: %s", ":".join(map(hex2, data)))
     else:
         # Some other garbled data has been received
         log_error("S: @*#!")
@@ -481,6 +926,7 @@ def connect(host_port, ssl_context=None, **config):
         s.shutdown(SHUT_RDWR)
         s.close()
     elif agreed_version == 1:
+        s.settimeout(config.get("read_timeout"))
         return Connection(s, der_encoded_server_certificate=der_encoded_server_certificate, **config)
     elif agreed_version == 1213486160:
         log_error("S: [CLOSE]")
@@ -27,6 +27,10 @@ from .ssl_compat import SSL_AVAILABLE
 
 DEFAULT_PORT = 7687
 DEFAULT_USER_AGENT = "neo4j-python/%s" % version
+DEFAULT_STRING_CACHE_SIZE = 1024
+DEFAULT_PACKED_STRING_CACHE_SIZE = 256
+DEFAULT_READ_SIZE = 8192
+DEFAULT_MAX_READ_SIZE = 262144
 
 KNOWN_HOSTS = join(expanduser("~"), ".neo4j", "known_hosts")
 
@@ -24,6 +24,18 @@ class ProtocolError(Exception):
     """
 
 
+class SizeLimitError(ProtocolError):
+    """ Raised when a received message or value exceeds a configured
+    size limit.
+    """
+
+
+class ServiceTimeout(ProtocolError):
+    """ Raised when the server does not respond within a configured
+    timeout.
+    """
+
+
 class Unauthorized(Exception):
     """ Raised when an action is not permitted.
     """
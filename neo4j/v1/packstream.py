@@ -309,20 +309,47 @@ byte and the actual fields, serialised in order. Examples follow below:
 """
 
 
-from io import BytesIO
-from struct import pack as struct_pack, unpack as struct_unpack
+try:
+    from collections.abc import Iterable, Mapping, Sequence, Set
+except ImportError:
+    from collections import Iterable, Mapping, Sequence, Set
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from io import BytesIO, RawIOBase
+from struct import Struct, error as StructError, pack as struct_pack
 import sys
 
+from .exceptions import SizeLimitError
+
 if sys.version_info >= (3,):
-    INTEGER_TYPE = int
-    STRING_TYPE = str
+    INTEGER_TYPES = (int,)
+    STRING_TYPES = (str,)
+    UNICODE = str
+    BYTE_VIEW = memoryview
+    ARRAY_INT_64 = "q"
+    move_to_end = OrderedDict.move_to_end
 else:
-    INTEGER_TYPE = (int, long)
-    STRING_TYPE = (str, unicode)
+    INTEGER_TYPES = (int, long)
+    STRING_TYPES = (str, unicode)
+    BYTE_VIEW = bytearray  # indexes to int, unlike a Python 2 memoryview
+
+    def UNICODE(data, encoding):
+        # unicode() does not accept a bytearray, which is what BYTE_VIEW slices are
+        return data.decode(encoding)
+    ARRAY_INT_64 = "l"  # "q" is not available until Python 3.3
 
-__all__ = ["Packer", "pack", "packb", "Unpacker", "unpack", "unpackb"]
+    def move_to_end(ordered_dict, key):
+        ordered_dict[key] = ordered_dict.pop(key)
 
-INFINITY = 1e309
+# Use the C accelerator for encoding and decoding, if it has been built
+try:
+    from . import _packstream
+except ImportError:
+    _packstream = None
+
+__all__ = ["Packer", "pack", "packb", "Unpacker", "unpack", "unpackb", "BytesView", "PackedStringCache",
+           "StringCache", "register_encoder", "unregister_encoder"]
 
 PLUS_2_TO_THE_63 = 2 ** 63
 PLUS_2_TO_THE_32 = 4294967296
@@ -387,154 +414,320 @@ PACKED_INT_8 = {value: struct_pack(INT_8_STRUCT, value)
 PACKED_INT_16 = {value: struct_pack(INT_16_STRUCT, value)
                  for value in range(MINUS_2_TO_THE_15, PLUS_2_TO_THE_15)}
 
-UNPACKED_UINT_8 = {bytes(bytearray([x])): x for x in range(PLUS_2_TO_THE_8)}
-UNPACKED_UINT_16 = {struct_pack(UINT_16_STRUCT, x): x for x in range(PLUS_2_TO_THE_16)}
-UNPACKED_INT_8 = {value: key for key, value in PACKED_INT_8.items()}
-UNPACKED_INT_16 = {value: key for key, value in PACKED_INT_16.items()}
+SINGLE_BYTES = [bytes(bytearray([x])) for x in range(PLUS_2_TO_THE_8)]
 
-UNPACKED_MARKERS = {NULL: None, TRUE: True, FALSE: False}
-UNPACKED_MARKERS.update({bytes(bytearray([z])): z for z in range(0, PLUS_2_TO_THE_7)})
-UNPACKED_MARKERS.update({bytes(bytearray([z + 256])): z for z in range(MINUS_2_TO_THE_4, 0)})
+#: Lists of at least this many items are checked for homogeneous numeric
+#: content, which can then be converted in bulk.
+NUMERIC_LIST_SIZE = 16
 
+#: Byte arrays of at least this size are written to the stream by
+#: reference, and are never copied by the C accelerator.
+LARGE_BYTES_SIZE = 16384
 
-class List(list):
+#: Fixed-width integer encodings as (minimum, maximum, marker, struct
+#: format code, width), from narrowest to widest.
+INTEGER_ENCODINGS = [
+    (MINUS_2_TO_THE_7, PLUS_2_TO_THE_7, INT_8, "b", 1),
+    (MINUS_2_TO_THE_15, PLUS_2_TO_THE_15, INT_16, "h", 2),
+    (MINUS_2_TO_THE_31, PLUS_2_TO_THE_31, INT_32, "i", 4),
+    (MINUS_2_TO_THE_63, PLUS_2_TO_THE_63, INT_64, "q", 8),
+]
 
-    def __init__(self, capacity):
-        self.capacity = capacity
+#: Markers of values that may be decoded in bulk, mapped to the width of
+#: the data that follows each marker. TINY_INT markers hold the value.
+NUMERIC_WIDTHS = dict.fromkeys(range(0x00, 0x80), 0)
+NUMERIC_WIDTHS.update(dict.fromkeys(range(0xF0, 0x100), 0))
+NUMERIC_WIDTHS.update({0xC1: 8, 0xC8: 1, 0xC9: 2, 0xCA: 4, 0xCB: 8})
 
-    def append(self, item):
-        if item is END_OF_STREAM:
-            self.capacity = len(self)
-        else:
-            list.append(self, item)
+TINY_INT_MARKERS = bytes(bytearray(sorted(m for m, w in NUMERIC_WIDTHS.items() if w == 0)))
+ARRAY_TYPECODES = {1: "b", 2: "h", 4: "i", 8: ARRAY_INT_64}
 
 
-class Map(dict):
+class Structure(tuple):
+    """ A structure for which no hydration function is available, held
+    as a 2-tuple of (signature, fields) and packed as such.
+    """
 
-    def __init__(self, capacity):
-        self.capacity = capacity
-        self.__key = NotImplemented
+    __slots__ = ()
 
-    def append(self, item):
-        key = self.__key
-        if key is NotImplemented:
-            if item is END_OF_STREAM:
-                self.capacity = len(self)
-            else:
-                self.__key = item
-        else:
-            self[key] = item
-            self.__key = NotImplemented
-        return key
+    def __new__(cls, signature, fields):
+        return tuple.__new__(cls, (signature, tuple(fields)))
+
+    @property
+    def signature(self):
+        return self[0]
+
+    @property
+    def fields(self):
+        return self[1]
 
 
-class Structure(list):
+class PackedStringCache(object):
+    """ Least recently used cache of packed strings (marker, size and
+    UTF-8 data), holding up to `max_size` strings of no more than
+    `max_length` characters each.
 
-    def __init__(self, capacity, signature):
-        self.capacity = capacity
-        self.signature = signature
+    The number of lookups that found (`hits`) or did not find (`misses`)
+    a cached string are counted, for tuning purposes.
+    """
 
-    def __repr__(self):
-        return repr(tuple(iter(self)))
+    def __init__(self, max_size=256, max_length=4096):
+        self.max_size = max_size
+        self.max_length = max_length
+        self.packed_strings = OrderedDict()
+        self.hits = 0
+        self.misses = 0
 
-    def __eq__(self, other):
-        return list(self) == list(other)
+    @property
+    def hit_rate(self):
+        """ Fraction of lookups that found a cached string.
+        """
+        lookups = self.hits + self.misses
+        return float(self.hits) / lookups if lookups else 0.0
 
-    def __ne__(self, other):
-        return not self.__eq__(other)
+    def pack(self, value):
+        """ Return the packed form of string `value`, from the cache if
+        possible.
+        """
+        packed_strings = self.packed_strings
+        try:
+            packed = packed_strings[value]
+        except KeyError:
+            self.misses += 1
+            stream = BytesIO()
+            Packer(stream).pack_string(value)
+            packed = packed_strings[value] = stream.getvalue()
+            if len(packed_strings) > self.max_size:
+                packed_strings.popitem(last=False)
+        else:
+            self.hits += 1
+            move_to_end(packed_strings, value)
+        return packed
 
-    def __iter__(self):
-        yield self.signature
-        yield tuple(super(Structure, self).__iter__())
+    def clear(self):
+        """ Remove all cached strings and reset the counters.
+        """
+        self.packed_strings.clear()
+        self.hits = 0
+        self.misses = 0
 
 
 class Packer(object):
-
-    def __init__(self, stream):
+    """ Writer for PackStream data.
+
+    Iterables of unknown length, such as generators, are packed as list
+    streams if `list_streams` is true. Otherwise, their items are packed
+    into a temporary buffer in order to count them ahead of the list
+    header.
+
+    Map keys packed by the pure Python encoder, and strings passed to
+    :meth:`.pack_cached_string`, are taken from `string_cache`, if a
+    :class:`.PackedStringCache` is given. Other strings, such as
+    parameter values, are rarely repeated and are always packed afresh.
+    The C accelerator copies string data directly and gains nothing from
+    the cache.
+
+    Byte arrays (``bytes``, ``bytearray`` or ``memoryview``) are written
+    to the stream as they are, rather than copied, so a stream that holds
+    on to what is written must not outlive changes to them.
+    """
+
+    def __init__(self, stream, list_streams=True, string_cache=None):
         self.stream = stream
+        self.list_streams = list_streams
+        self.string_cache = string_cache
 
     def pack_raw(self, data):
         self.stream.write(data)
 
     def pack(self, value):
+        if _packstream is not None and not built_ins_registered:
+            data = _packstream.encode(value)
+            if data is not NotImplemented:
+                self.stream.write(data)
+                return
+        value_type = type(value)
+        try:
+            encoder = encoder_cache[value_type]
+        except KeyError:
+            encoder = encoder_cache[value_type] = resolve_encoder(value_type)
+        encoder(self, value)
+
+    def pack_null(self, value):
+        self.stream.write(NULL)
+
+    def pack_boolean(self, value):
+        self.stream.write(TRUE if value else FALSE)
+
+    def pack_float(self, value):
+        # Only double precision is supported
         stream = self.stream
+        stream.write(FLOAT_64)
+        stream.write(struct_pack(DOUBLE_STRUCT, value))
 
-        # None
-        if value is None:
-            stream.write(NULL)
-
-        # Boolean
-        elif value is True:
-            stream.write(TRUE)
-        elif value is False:
-            stream.write(FALSE)
-
-        # Float (only double precision is supported)
-        elif isinstance(value, float):
-            stream.write(FLOAT_64)
-            stream.write(struct_pack(DOUBLE_STRUCT, value))
-
-        # Integer
-        elif isinstance(value, INTEGER_TYPE):
-            if MINUS_2_TO_THE_4 <= value < PLUS_2_TO_THE_7:
-                stream.write(PACKED_INT_8[value])
-            elif MINUS_2_TO_THE_7 <= value < MINUS_2_TO_THE_4:
-                stream.write(INT_8)
-                stream.write(PACKED_INT_8[value])
-            elif MINUS_2_TO_THE_15 <= value < PLUS_2_TO_THE_15:
-                stream.write(INT_16)
-                stream.write(PACKED_INT_16[value])
-            elif MINUS_2_TO_THE_31 <= value < PLUS_2_TO_THE_31:
-                stream.write(INT_32)
-                stream.write(struct_pack(INT_32_STRUCT, value))
-            elif MINUS_2_TO_THE_63 <= value < PLUS_2_TO_THE_63:
-                stream.write(INT_64)
-                stream.write(struct_pack(INT_64_STRUCT, value))
-            else:
-                raise OverflowError("Integer %s out of range" % value)
+    def pack_integer(self, value):
+        stream = self.stream
+        if MINUS_2_TO_THE_4 <= value < PLUS_2_TO_THE_7:
+            stream.write(PACKED_INT_8[value])
+        elif MINUS_2_TO_THE_7 <= value < MINUS_2_TO_THE_4:
+            stream.write(INT_8)
+            stream.write(PACKED_INT_8[value])
+        elif MINUS_2_TO_THE_15 <= value < PLUS_2_TO_THE_15:
+            stream.write(INT_16)
+            stream.write(PACKED_INT_16[value])
+        elif MINUS_2_TO_THE_31 <= value < PLUS_2_TO_THE_31:
+            stream.write(INT_32)
+            stream.write(struct_pack(INT_32_STRUCT, value))
+        elif MINUS_2_TO_THE_63 <= value < PLUS_2_TO_THE_63:
+            stream.write(INT_64)
+            stream.write(struct_pack(INT_64_STRUCT, value))
+        else:
+            raise OverflowError("Integer %s out of range" % value)
+
+    def pack_cached_string(self, value):
+        """ Pack a value that is likely to be repeated, such as statement
+        text or a map key, taking it from the string cache if it is a
+        string short enough to be cached.
+        """
+        string_cache = self.string_cache
+        if (string_cache is not None and type(value) in STRING_TYPES and not built_ins_registered and
+                len(value) <= string_cache.max_length):
+            self.stream.write(string_cache.pack(value))
+        else:
+            self.pack(value)
 
-        # String
-        elif isinstance(value, STRING_TYPE):
-            if isinstance(value, bytes):
-                value_bytes = value
-            else:
-                value_bytes = value.encode(ENCODING)
-            self.pack_string_header(len(value_bytes))
-            self.pack_raw(value_bytes)
-
-        # Bytes (deliberately listed after String since in
-        # Python 2, bytes should be treated as a String)
-        elif isinstance(value, (bytes, bytearray)):
-            self.pack_bytes_header(len(value))
-            self.pack_raw(value)
-
-        # List
-        elif isinstance(value, list):
-            self.pack_list_header(len(value))
-            for item in value:
-                self.pack(item)
+    def pack_string(self, value):
+        # In Python 2, byte strings are packed as strings
+        if isinstance(value, bytes):
+            value_bytes = value
+        else:
+            value_bytes = value.encode(ENCODING)
+        self.pack_string_header(len(value_bytes))
+        self.pack_raw(value_bytes)
 
-        # Map
-        elif isinstance(value, dict):
-            self.pack_map_header(len(value))
-            for key, item in value.items():
-                self.pack(key)
-                self.pack(item)
+    def pack_bytes(self, value):
+        self.pack_bytes_header(len(value))
+        self.pack_raw(value)
 
-        # Structure
-        elif isinstance(value, (Structure, tuple)):
+    def pack_memoryview(self, value):
+        if value.ndim != 1 or value.itemsize != 1:
+            # Write as bytes, copying only if the memory is not contiguous
             try:
-                signature, fields = value
-            except ValueError:
-                raise ValueError("Structures require a 2-tuple of (signature, fields)")
-            else:
-                self.pack_struct_header(len(fields), signature)
-                for field in fields:
-                    self.pack(field)
-
-        # Other
+                value = value.cast("B")
+            except (AttributeError, TypeError):
+                value = value.tobytes()
+        self.pack_bytes(value)
+
+    def pack_list(self, value):
+        size = len(value)
+        if size >= NUMERIC_LIST_SIZE:
+            item_types = set(map(type, value))
+            if len(item_types) == 1:
+                item_type = item_types.pop()
+                if item_type is float:
+                    self.pack_floats(value)
+                    return
+                if item_type in INTEGER_TYPES:
+                    self.pack_integers(value)
+                    return
+        self.pack_list_header(size)
+        for item in value:
+            self.pack(item)
+
+    def pack_floats(self, value):
+        """ Pack a sequence of floats as a list, converting all items
+        with a single call.
+        """
+        size = len(value)
+        self.pack_list_header(size)
+        self.pack_raw(interleave(FLOAT_64, struct_pack(">%dd" % size, *value), 8))
+
+    def pack_integers(self, value):
+        """ Pack a sequence of integers as a list, converting all items
+        with a single call if the narrowest encoding of every item is the
+        same. Otherwise, each item is packed in its own narrowest encoding.
+        """
+        size = len(value)
+        self.pack_list_header(size)
+        if size:
+            marker, code, width, narrower = integer_encoding(min(value), max(value))
+            if narrower is not None:
+                low, high = narrower
+                if any(low <= item < high for item in value):
+                    self.pack_each_integer(value)
+                    return
+            self.pack_raw(interleave(marker, struct_pack(">%d%s" % (size, code), *value), width))
+
+    def pack_each_integer(self, value):
+        pack_integer = self.pack_integer
+        for item in value:
+            pack_integer(item)
+
+    def pack_array(self, value):
+        typecode = value.typecode
+        if typecode in "fd":
+            self.pack_floats(value)
+        elif typecode == "u":
+            self.pack_list(value)
+        else:
+            self.pack_integers(value)
+
+    def pack_ndarray(self, value):
+        kind = value.dtype.kind
+        if value.ndim != 1 or kind not in "fiu":
+            self.pack(value.tolist())
+            return
+        size = len(value)
+        self.pack_list_header(size)
+        if kind == "f":
+            self.pack_raw(interleave(FLOAT_64, value.astype(">f8").tobytes(), 8))
+        elif size:
+            marker, code, width, narrower = integer_encoding(int(value.min()), int(value.max()))
+            if narrower is not None:
+                low, high = narrower
+                if ((value >= low) & (value < high)).any():
+                    self.pack_each_integer(value.tolist())
+                    return
+            self.pack_raw(interleave(marker, value.astype(">i%d" % width).tobytes(), width))
+
+    def pack_numpy_scalar(self, value):
+        self.pack(value.item())
+
+    def pack_iterable(self, value):
+        if self.list_streams:
+            self.pack_list_stream_header()
+            for item in value:
+                self.pack(item)
+            self.pack_end_of_stream()
+        else:
+            buffer = BytesIO()
+            packer = Packer(buffer, list_streams=False)
+            size = 0
+            for item in value:
+                packer.pack(item)
+                size += 1
+            self.pack_list_header(size)
+            self.pack_raw(buffer.getvalue())
+
+    def pack_map(self, value):
+        self.pack_map_header(len(value))
+        pack_key = self.pack if self.string_cache is None else self.pack_cached_string
+        for key, item in value.items():
+            pack_key(key)
+            self.pack(item)
+
+    def pack_structure(self, value):
+        try:
+            signature, fields = value
+        except ValueError:
+            raise ValueError("Structures require a 2-tuple of (signature, fields)")
         else:
-            raise ValueError("Values of type %s are not supported" % type(value))
+            self.pack_struct_header(len(fields), signature)
+            for field in fields:
+                self.pack(field)
+
+    def pack_unsupported(self, value):
+        raise ValueError("Values of type %s are not supported" % type(value))
 
     def pack_bytes_header(self, size):
         stream = self.stream
@@ -627,6 +820,148 @@ class Packer(object):
         self.stream.write(END_OF_STREAM)
 
 
+#: Encoders for the types that PackStream supports natively.
+BUILT_IN_ENCODERS = {
+    type(None): Packer.pack_null,
+    bool: Packer.pack_boolean,
+    float: Packer.pack_float,
+    list: Packer.pack_list,
+    dict: Packer.pack_map,
+    tuple: Packer.pack_structure,
+    bytearray: Packer.pack_bytes,
+    memoryview: Packer.pack_memoryview,
+    array: Packer.pack_array,
+}
+BUILT_IN_ENCODERS.update((t, Packer.pack_integer) for t in INTEGER_TYPES)
+BUILT_IN_ENCODERS.update((t, Packer.pack_string) for t in STRING_TYPES)
+if bytes not in BUILT_IN_ENCODERS:
+    # Python 3 only; in Python 2, bytes is str and is packed as a string
+    BUILT_IN_ENCODERS[bytes] = Packer.pack_bytes
+
+#: Abstract types packed by content once no concrete encoder matches.
+#: Iterables without a known length are packed as list streams.
+ABSTRACT_ENCODERS = [
+    (Mapping, Packer.pack_map),
+    (Sequence, Packer.pack_list),
+    (Set, Packer.pack_list),
+    (Iterable, Packer.pack_iterable),
+]
+
+#: Conversion functions added through :func:`.register_encoder`.
+registered_encoders = {}
+
+#: Encoders resolved for each exact type encountered so far.
+encoder_cache = {}
+
+#: Whether any built-in type has a registered encoder, in which case the
+#: C accelerator, which handles built-in types itself, is bypassed.
+built_ins_registered = False
+
+
+def register_encoder(cls, encoder):
+    """ Register a function to convert values of type `cls` (including
+    subclasses) into values that can be packed. This can be used to pass
+    other types directly as parameters, for example::
+
+        >>> from decimal import Decimal
+        >>> from neo4j.v1.packstream import register_encoder
+        >>> register_encoder(Decimal, str)
+
+    Registered types take precedence over built-in types and over the
+    general handling of mappings, sequences and sets. While a built-in
+    type is registered, all values are packed without the C accelerator.
+
+    :param cls: the type of value to convert
+    :param encoder: function accepting a value of type `cls` and
+                    returning a value that can be packed
+    """
+    registered_encoders[cls] = encoder
+    update_registry()
+
+
+def unregister_encoder(cls):
+    """ Remove any conversion function registered for type `cls`.
+    """
+    registered_encoders.pop(cls, None)
+    update_registry()
+
+
+def update_registry():
+    """ Discard encoders resolved before the registry last changed.
+    """
+    global built_ins_registered
+    built_ins_registered = any(cls in BUILT_IN_ENCODERS for cls in registered_encoders)
+    encoder_cache.clear()
+
+
+def resolve_encoder(value_type):
+    """ Find the encoder to use for values of a given type. The result
+    is cached by :meth:`.Packer.pack` so that this lookup only takes
+    place once per type.
+    """
+    for cls in value_type.__mro__:
+        if cls in registered_encoders:
+            return converter(registered_encoders[cls])
+        if cls in BUILT_IN_ENCODERS:
+            return BUILT_IN_ENCODERS[cls]
+    for cls, encoder in registered_encoders.items():
+        if issubclass(value_type, cls):
+            return converter(encoder)
+    # NumPy types can only exist if NumPy has already been imported
+    numpy = sys.modules.get("numpy")
+    if numpy is not None:
+        if issubclass(value_type, numpy.ndarray):
+            return Packer.pack_ndarray
+        if issubclass(value_type, numpy.generic):
+            return Packer.pack_numpy_scalar
+    for cls, encoder in ABSTRACT_ENCODERS:
+        if issubclass(value_type, cls):
+            return encoder
+    return Packer.pack_unsupported
+
+
+def integer_encoding(minimum, maximum):
+    """ Return the (marker, struct format code, width, narrower range) of
+    the narrowest encoding that can hold every integer from `minimum` to
+    `maximum`. An empty marker denotes TINY_INT, for which the value is
+    the marker. Integers within the narrower range, given as (low, high),
+    have a narrower encoding of their own; it is None for TINY_INT.
+    """
+    if MINUS_2_TO_THE_4 <= minimum and maximum < PLUS_2_TO_THE_7:
+        return b"", "b", 1, None
+    narrower = (MINUS_2_TO_THE_4, PLUS_2_TO_THE_7)
+    for low, high, marker, code, width in INTEGER_ENCODINGS:
+        if low <= minimum and maximum < high:
+            return marker, code, width, narrower
+        narrower = (low, high)
+    raise OverflowError("Integer %s out of range" % (
+        minimum if minimum < MINUS_2_TO_THE_63 else maximum))
+
+
+def interleave(marker, data, width):
+    """ Place a marker ahead of each `width` byte item in `data`.
+    """
+    if not marker:
+        return data
+    size = len(data) // width
+    step = width + 1
+    result = bytearray(step * size)
+    result[0::step] = marker * size
+    for i in range(width):
+        result[i + 1::step] = data[i::width]
+    return result
+
+
+def converter(encoder):
+    """ Wrap a conversion function as a packer method.
+    """
+
+    def pack_converted(packer, value):
+        packer.pack(encoder(value))
+
+    return pack_converted
+
+
 def pack(stream, *values):
     for value in values:
         Packer(stream).pack(value)
@@ -638,156 +973,910 @@ def packb(*values):
     return stream.getvalue()
 
 
-class Unpacker(object):
+unpack_double = Struct(DOUBLE_STRUCT).unpack_from
+unpack_int_8 = Struct(INT_8_STRUCT).unpack_from
+unpack_int_16 = Struct(INT_16_STRUCT).unpack_from
+unpack_int_32 = Struct(INT_32_STRUCT).unpack_from
+unpack_int_64 = Struct(INT_64_STRUCT).unpack_from
+unpack_uint_16 = Struct(UINT_16_STRUCT).unpack_from
+unpack_uint_32 = Struct(UINT_32_STRUCT).unpack_from
+
+
+class StringCache(object):
+    """ Bounded cache of decoded strings, keyed on their UTF-8 encoded
+    bytes. Only strings of up to `max_length` bytes are cached and the
+    cache is emptied whenever it holds `max_size` strings.
+
+    The number of lookups that found (`hits`) or did not find (`misses`)
+    a cached string are counted, for tuning purposes.
+    """
+
+    def __init__(self, max_size=1024, max_length=64):
+        self.max_size = max_size
+        self.max_length = max_length
+        self.strings = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self):
+        """ Fraction of lookups that found a cached string.
+        """
+        lookups = self.hits + self.misses
+        return float(self.hits) / lookups if lookups else 0.0
+
+    def decode(self, data):
+        """ Return the string encoded by `data`, from the cache if
+        possible.
+        """
+        if len(data) > self.max_length:
+            # Decoded straight from the data given, as it is not cached
+            return UNICODE(data, ENCODING)
+        data = bytes(data)
+        strings = self.strings
+        try:
+            value = strings[data]
+        except KeyError:
+            self.misses += 1
+            value = UNICODE(data, ENCODING)
+            if len(strings) >= self.max_size:
+                strings.clear()
+            strings[data] = value
+        else:
+            self.hits += 1
+        return value
 
-    def __init__(self, stream):
+    def clear(self):
+        """ Remove all cached strings and reset the counters.
+        """
+        self.strings.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+class Unpacker(object):
+    """ Reader for PackStream data.
+
+    Values are decoded from a single in-memory buffer (``bytes``,
+    ``bytearray`` or ``memoryview``) by walking an integer offset, so no
+    read call is made per value. The `stream` is only used by
+    :meth:`.unpack`, which reads it fully and decodes the result.
+
+    Decoding is driven by the :attr:`.decoders` table, which holds one
+    decoder for each of the 256 possible marker bytes. Each decoder
+    accepts the data buffer, the offset immediately after the marker byte
+    and the marker byte itself, and returns the decoded value along with
+    the offset immediately after that value.
+
+    Structures are hydrated as soon as their fields have been decoded, by
+    calling the function held in `hydration_functions` for their
+    signature with those fields as arguments. A structure with any other
+    signature is returned as a :class:`.Structure`.
+
+    Lists of 16 or more items that are all floats, or all integers of a
+    single encoding, can be decoded in bulk into compact arrays instead
+    of lists by setting `numeric_lists` to ``"array"`` (for
+    :class:`array.array`) or ``"numpy"`` (for NumPy arrays). This
+    setting may be changed between calls to :meth:`.unpack_from`.
+
+    Short strings are shared through `string_cache`, if a
+    :class:`.StringCache` is given, instead of being decoded afresh each
+    time they occur.
+
+    Data can also be decoded incrementally, as it arrives, by passing
+    each piece to :meth:`.feed` and calling :meth:`.end` once all pieces
+    have been fed. Each value is decoded in a single step if all of its
+    data is available. Otherwise, if it is a collection, it is held open
+    while its items are decoded from this and later pieces of data.
+
+    A string or bytes value larger than `max_value_size` bytes, or a
+    collection holding more than `max_collection_size` items, raises a
+    :class:`.SizeLimitError` as soon as its size is known. Bytes values
+    of at least `lazy_bytes_size` bytes are returned as a
+    :class:`.BytesView` instead of as ``bytes``, referring to the data
+    from which they were decoded wherever it cannot change. Pieces of
+    such a value passed to :meth:`.feed` are collected without being
+    buffered.
+    """
+
+    def __init__(self, stream=None, hydration_functions=None, numeric_lists=None,
+                 string_cache=None, max_value_size=None, max_collection_size=None,
+                 lazy_bytes_size=None):
         self.stream = stream
+        self.hydration_functions = hydration_functions or {}
+        self._string_cache = string_cache
+        self._max_value_size = max_value_size
+        self._max_collection_size = max_collection_size
+        self._lazy_bytes_size = lazy_bytes_size
+        self.numeric_lists = numeric_lists
+        self.reset()
+
+    @property
+    def numeric_lists(self):
+        return self._numeric_lists
+
+    @numeric_lists.setter
+    def numeric_lists(self, value):
+        if value is not None:
+            try:
+                self.build_numeric_list = NUMERIC_LIST_BUILDERS[value]
+            except KeyError:
+                raise ValueError("Unknown numeric list type %r" % (value,))
+            if value == "numpy":
+                import numpy  # fail early if NumPy is not installed
+        self._numeric_lists = value
+        self.update_decoders()
+
+    @property
+    def string_cache(self):
+        return self._string_cache
+
+    @string_cache.setter
+    def string_cache(self, value):
+        self._string_cache = value
+        self.update_decoders()
+
+    @property
+    def max_value_size(self):
+        return self._max_value_size
+
+    @max_value_size.setter
+    def max_value_size(self, value):
+        self._max_value_size = value
+        self.update_decoders()
+
+    @property
+    def max_collection_size(self):
+        return self._max_collection_size
+
+    @max_collection_size.setter
+    def max_collection_size(self, value):
+        self._max_collection_size = value
+        self.update_decoders()
+
+    @property
+    def lazy_bytes_size(self):
+        return self._lazy_bytes_size
+
+    @lazy_bytes_size.setter
+    def lazy_bytes_size(self, value):
+        self._lazy_bytes_size = value
+        self.update_decoders()
+
+    def update_decoders(self):
+        """ Select the decoder for each marker byte according to the
+        current settings, leaving the class-level table in place if no
+        setting is active.
+        """
+        limited = self._max_value_size is not None or self._max_collection_size is not None
+        if limited or self._lazy_bytes_size is not None:
+            self.limits = (self._max_value_size, self._max_collection_size, self._lazy_bytes_size)
+        else:
+            self.limits = None
+        if (self._numeric_lists is None and self._string_cache is None and
+                self._lazy_bytes_size is None and not limited):
+            self.__dict__.pop("decoders", None)
+            return
+        decoders = list(Unpacker.decoders)
+        if self._numeric_lists is not None:
+            decoders[0xD4:0xD7] = self.numeric_list_decoders
+        if self._string_cache is not None:
+            decoders[0x80:0x90] = [Unpacker.decode_cached_tiny_string] * 0x10
+            decoders[0xD0:0xD3] = self.cached_string_decoders
+        if self._lazy_bytes_size is not None:
+            decoders[0xCC:0xCF] = [Unpacker.decode_lazy_bytes] * 3
+        if limited:
+            # Check sizes before passing on to the decoders selected above
+            self.unlimited_decoders = list(decoders)
+            if self._max_value_size is not None:
+                for marker in VALUE_MARKERS:
+                    decoders[marker] = Unpacker.decode_limited_value
+            if self._max_collection_size is not None:
+                for marker in COLLECTION_MARKERS:
+                    decoders[marker] = Unpacker.decode_limited_collection
+                decoders[0xD7] = decoders[0xDB] = Unpacker.decode_limited_stream
+        self.decoders = decoders
 
     def unpack(self):
-        current_collection = List(INFINITY)
-        current_capacity = current_collection.capacity
-        current_size = len(current_collection)
-        push_item = current_collection.append
+        """ Read all remaining data from the stream and return an
+        iterator over the values it contains.
+        """
+        return iter(self.unpack_from(self.stream.read()))
+
+    def unpack_from(self, data, offset=0):
+        """ Decode and return a list of all values held in `data`,
+        starting at `offset`.
+        """
+        if _packstream is not None and self._numeric_lists is None and self._lazy_bytes_size is None:
+            return _packstream.decode(memoryview(data)[offset:], Structure, self.hydration_functions,
+                                      self._string_cache, self.limits)
+
+        data = BYTE_VIEW(data)
+        end = len(data)
+        decoders = self.decoders
+        values = []
+        while offset < end:
+            marker = data[offset]
+            try:
+                value, offset = decoders[marker](self, data, offset + 1, marker)
+            except (IndexError, StructError):
+                raise ValueError("Unexpected end of PackStream data")
+            if offset > end:
+                raise ValueError("Unexpected end of PackStream data")
+            if value is END_OF_STREAM:
+                raise ValueError("Unexpected END_OF_STREAM marker")
+            values.append(value)
+        return values
+
+    def feed(self, data):
+        """ Add `data` to any fed previously and decode as much as
+        possible, returning a list of the top-level values completed.
+        Data is released as soon as it has been decoded.
+        """
+        buffer = self.buffer
+        if self.offset:
+            del buffer[:self.offset]
+            self.offset = 0
+        frames = self.frames
+        values = []
+        if frames and frames[-1][0] == BYTES_FRAME:
+            # Collect the rest of a large bytes value directly from the data, without buffering it
+            data = memoryview(data)
+            data = data[self.fill_bytes_frame(data, 0, values):]
+        if data and not buffer and not frames:
+            # Most messages arrive whole, in which case they can be decoded in a single step
+            decoded = self.decode_one(BYTE_VIEW(data), 0)
+            if decoded is not None and decoded[1] == len(data):
+                values.append(decoded[0])
+                return values
+        buffer += data
+        end = len(buffer)
+        offset = 0
+        try:
+            while offset < end:
+                if buffer[offset] == 0xDF:
+                    if not frames or frames[-1][2] >= 0 or frames[-1][3] is not NO_KEY:
+                        raise ValueError("Unexpected END_OF_STREAM marker")
+                    offset += 1
+                    self.complete(self.close_frame(frames.pop()), values)
+                    continue
+                if frames and frames[-1][0] == NUMERIC_LIST_FRAME:
+                    check_numeric_item(frames[-1], buffer[offset])
+                if self.value_pending(buffer, offset):
+                    # Not all here yet, so skip decoding it again until it is
+                    decoded = None
+                else:
+                    decoded = self.decode_one(buffer, offset)
+                if decoded is None:
+                    # Incomplete, so hold the value open (if it can be) or wait for more data
+                    opened = self.open_frame(buffer, offset)
+                    if opened is None:
+                        break
+                    frame, offset = opened
+                    frames.append(frame)
+                    if frame[0] == BYTES_FRAME:
+                        offset = self.fill_bytes_frame(buffer, offset, values)
+                    continue
+                value, offset = decoded
+                # Add the value to the innermost open collection, closing each that is then complete
+                while frames:
+                    if not add_to_frame(frames[-1], value):
+                        break
+                    value = self.close_frame(frames.pop())
+                else:
+                    values.append(value)
+        except Exception:
+            self.reset()
+            raise
+        self.offset = offset
+        return values
+
+    def end(self):
+        """ Mark the end of the data fed, raising a ValueError if it
+        finished part way through a value.
+        """
+        buffer, offset, frames = self.buffer, self.offset, self.frames
+        if offset == len(buffer) and not frames:
+            return
+        self.reset()
+        if offset < len(buffer):
+            # Raise the specific error for this data, if any
+            self.unpack_from(buffer, offset)
+        if offset < len(buffer) or frames:
+            raise ValueError("Unexpected end of PackStream data")
+
+    def reset(self):
+        """ Discard all data fed and not yet decoded.
+        """
+        self.buffer = bytearray()
+        self.offset = 0
+        self.frames = []
+
+    def decode_one(self, data, offset):
+        """ Decode the value at `offset`, returning it along with the
+        offset immediately after, or None if the data is incomplete.
+        """
+        if _packstream is not None and self._numeric_lists is None:
+            return _packstream.decode_one(data, offset, Structure, self.hydration_functions,
+                                          self._string_cache, self.limits)
+        marker = data[offset]
+        try:
+            value, end = self.decoders[marker](self, data, offset + 1, marker)
+        except (IndexError, StructError, UnicodeDecodeError):
+            # Strings cut short may be cut part way through a character
+            return None
+        if end > len(data):
+            return None
+        if value is END_OF_STREAM:
+            raise ValueError("Unexpected END_OF_STREAM marker")
+        return value, end
+
+    def value_pending(self, data, offset):
+        """ Return True if the string or bytes value at `offset` has a
+        complete header but not all of its data, and its size is within
+        any limit (so that decoding it would only raise once complete).
+        """
+        marker = data[offset]
+        size_struct = SIZE_STRUCTS.get(marker)
+        if size_struct is None or marker > 0xD2:
+            return False
+        offset += 1 + size_struct.size
+        if offset > len(data):
+            return False
+        size, = size_struct.unpack_from(data, offset - size_struct.size)
+        if self._max_value_size is not None and size > self._max_value_size:
+            return False
+        return offset + size > len(data)
+
+    def open_frame(self, data, offset):
+        """ Begin decoding the collection or large bytes value at
+        `offset`, returning a frame to hold its items or data along with
+        the offset immediately after its header, or None if the header is
+        incomplete or not that of such a value.
+        """
+        marker = data[offset]
+        offset += 1
+        if 0x90 <= marker < 0xC0:
+            kind, size = FRAME_KINDS[marker >> 4], marker & 0x0F
+        elif 0xCC <= marker <= 0xCE:
+            size_struct = SIZE_STRUCTS[marker]
+            if self._lazy_bytes_size is None or offset + size_struct.size > len(data):
+                return None
+            size, = size_struct.unpack_from(data, offset)
+            if size < self._lazy_bytes_size:
+                return None
+            return [BYTES_FRAME, [], size, None], offset + size_struct.size
+        elif marker in COLLECTION_HEADERS:
+            kind, size_struct = COLLECTION_HEADERS[marker]
+            if size_struct is None:
+                size = -1
+            elif offset + size_struct.size > len(data):
+                return None
+            else:
+                size, = size_struct.unpack_from(data, offset)
+                offset += size_struct.size
+        else:
+            return None
+        if kind == MAP_FRAME:
+            return [kind, {}, size, NO_KEY], offset
+        if kind == LIST_FRAME:
+            if size >= NUMERIC_LIST_SIZE and self._numeric_lists is not None:
+                # Collect the items, to be built into an array once complete if they are all numeric
+                return [NUMERIC_LIST_FRAME, [], size, NO_KEY], offset
+            return [kind, [], size, NO_KEY], offset
+        if offset >= len(data):
+            return None
+        return [kind, [], size, SINGLE_BYTES[data[offset]]], offset + 1
+
+    def fill_bytes_frame(self, data, offset, values):
+        """ Collect as much of the large bytes value held open by the
+        innermost frame as is available in `data` from `offset`,
+        returning the offset immediately after that part.
+        """
+        frame = self.frames[-1]
+        end = min(offset + frame[2], len(data))
+        if end > offset:
+            frame[1].append(stable_slice(data, offset, end))
+            frame[2] -= end - offset
+        if frame[2] == 0:
+            self.complete(self.close_frame(self.frames.pop()), values)
+        return end
+
+    def complete(self, value, values):
+        """ Add a decoded value to the innermost open collection, closing
+        each that is then complete, or to `values` if none is open.
+        """
+        frames = self.frames
+        while frames:
+            if not add_to_frame(frames[-1], value):
+                return
+            value = self.close_frame(frames.pop())
+        values.append(value)
+
+    def close_frame(self, frame):
+        kind, items, remaining, signature = frame
+        if kind == BYTES_FRAME:
+            return BytesView(items)
+        if kind == NUMERIC_LIST_FRAME:
+            if signature is None:
+                return items
+            # Items of a single numeric encoding, so build them as decode_numeric_items would have
+            is_float = signature == 0xC1
+            raw = struct_pack(">%d%s" % (len(items), "d" if is_float else "q"), *items)
+            return self.build_numeric_list(is_float, 8, raw)
+        if remaining < 0 and self._max_collection_size is not None:
+            self.check_collection_size(len(items))
+        if kind != STRUCT_FRAME:
+            return items
+        try:
+            hydration_function = self.hydration_functions[signature]
+        except KeyError:
+            return Structure(signature, items)
+        else:
+            return hydration_function(*items)
+
+    def decode_items(self, data, offset, size):
+        decoders = self.decoders
+        items = []
+        append = items.append
+        for _ in range(size):
+            marker = data[offset]
+            value, offset = decoders[marker](self, data, offset + 1, marker)
+            if value is END_OF_STREAM:
+                raise ValueError("Unexpected END_OF_STREAM marker")
+            append(value)
+        return items, offset
+
+    def decode_pairs(self, data, offset, size):
+        decoders = self.decoders
+        pairs = {}
+        for _ in range(size):
+            marker = data[offset]
+            key, offset = decoders[marker](self, data, offset + 1, marker)
+            marker = data[offset]
+            value, offset = decoders[marker](self, data, offset + 1, marker)
+            if key is END_OF_STREAM or value is END_OF_STREAM:
+                raise ValueError("Unexpected END_OF_STREAM marker")
+            pairs[key] = value
+        return pairs, offset
+
+    def decode_numeric_items(self, data, offset, size):
+        if size >= NUMERIC_LIST_SIZE:
+            marker = data[offset]
+            width = NUMERIC_WIDTHS.get(marker)
+            if width is not None:
+                step = width + 1
+                end = offset + step * size
+                if end <= len(data):
+                    items = bytes(data[offset:end])
+                    if width == 0:
+                        if not items.translate(None, TINY_INT_MARKERS):
+                            return self.build_numeric_list(False, 1, items), end
+                    elif items[::step] == SINGLE_BYTES[marker] * size:
+                        raw = bytearray(width * size)
+                        for i in range(width):
+                            raw[i::width] = items[i + 1::step]
+                        return self.build_numeric_list(marker == 0xC1, width, raw), end
+        return self.decode_items(data, offset, size)
+
+    def decode_fields(self, data, offset, size):
+        signature = SINGLE_BYTES[data[offset]]
+        fields, offset = self.decode_items(data, offset + 1, size)
+        try:
+            hydration_function = self.hydration_functions[signature]
+        except KeyError:
+            return Structure(signature, fields), offset
+        else:
+            return hydration_function(*fields), offset
 
-        collection_stack = []
-        push_collection = collection_stack.append
-        pop_collection = collection_stack.pop
+    def decode_reserved(self, data, offset, marker):
+        raise ValueError("Unknown PackStream marker 0x%02X" % marker)
 
-        stream_read = self.stream.read
-        while True:
-            marker_byte = stream_read(1)
+    def decode_tiny_int(self, data, offset, marker):
+        return marker, offset
 
-            if not marker_byte:
-                break
+    def decode_negative_tiny_int(self, data, offset, marker):
+        return marker - 0x100, offset
 
-            is_collection = False
+    def decode_null(self, data, offset, marker):
+        return None, offset
 
-            try:
-                value = UNPACKED_MARKERS[marker_byte]  # NULL, TRUE, FALSE and TINY_INT
+    def decode_true(self, data, offset, marker):
+        return True, offset
 
-            except KeyError:
-                marker = UNPACKED_UINT_8[marker_byte]
-                marker_high = marker & 0xF0
-
-                # Float
-                if marker_byte == FLOAT_64:
-                    value = struct_unpack(DOUBLE_STRUCT, stream_read(8))[0]
-
-                # Integer
-                elif marker_byte == INT_8:
-                    value = UNPACKED_INT_8[stream_read(1)]
-                elif marker_byte == INT_16:
-                    value = UNPACKED_INT_16[stream_read(2)]
-                elif marker_byte == INT_32:
-                    value = struct_unpack(INT_32_STRUCT, stream_read(4))[0]
-                elif marker_byte == INT_64:
-                    value = struct_unpack(INT_64_STRUCT, stream_read(8))[0]
-
-                # Bytes
-                elif marker_byte == BYTES_8:
-                    byte_size = UNPACKED_UINT_8[stream_read(1)]
-                    value = stream_read(byte_size)
-                elif marker_byte == BYTES_16:
-                    byte_size = UNPACKED_UINT_16[stream_read(2)]
-                    value = stream_read(byte_size)
-                elif marker_byte == BYTES_32:
-                    byte_size = struct_unpack(UINT_32_STRUCT, stream_read(4))[0]
-                    value = stream_read(byte_size)
-
-                # String
-                elif marker_high == 0x80:
-                    value = stream_read(marker & 0x0F).decode(ENCODING)
-                elif marker_byte == STRING_8:
-                    byte_size = UNPACKED_UINT_8[stream_read(1)]
-                    value = stream_read(byte_size).decode(ENCODING)
-                elif marker_byte == STRING_16:
-                    byte_size = UNPACKED_UINT_16[stream_read(2)]
-                    value = stream_read(byte_size).decode(ENCODING)
-                elif marker_byte == STRING_32:
-                    byte_size = struct_unpack(UINT_32_STRUCT, stream_read(4))[0]
-                    value = stream_read(byte_size).decode(ENCODING)
-
-                # List
-                elif marker_high == 0x90:
-                    value = List(marker & 0x0F)
-                    is_collection = True
-                elif marker_byte == LIST_8:
-                    size = UNPACKED_UINT_8[stream_read(1)]
-                    value = List(size)
-                    is_collection = True
-                elif marker_byte == LIST_16:
-                    size = UNPACKED_UINT_16[stream_read(2)]
-                    value = List(size)
-                    is_collection = True
-                elif marker_byte == LIST_32:
-                    size = struct_unpack(UINT_32_STRUCT, stream_read(4))[0]
-                    value = List(size)
-                    is_collection = True
-                elif marker_byte == LIST_STREAM:
-                    size = INFINITY
-                    value = List(size)
-                    is_collection = True
-
-                # Map
-                elif marker_high == 0xA0:
-                    value = Map(marker & 0x0F)
-                    is_collection = True
-                elif marker_byte == MAP_8:
-                    size = UNPACKED_UINT_8[stream_read(1)]
-                    value = Map(size)
-                    is_collection = True
-                elif marker_byte == MAP_16:
-                    size = UNPACKED_UINT_16[stream_read(2)]
-                    value = Map(size)
-                    is_collection = True
-                elif marker_byte == MAP_32:
-                    size = struct_unpack(UINT_32_STRUCT, stream_read(4))[0]
-                    value = Map(size)
-                    is_collection = True
-                elif marker_byte == MAP_STREAM:
-                    size = INFINITY
-                    value = Map(size)
-                    is_collection = True
-
-                # Structure
-                elif marker_high == 0xB0:
-                    signature = stream_read(1)
-                    value = Structure(marker & 0x0F, signature)
-                    is_collection = True
-                elif marker_byte == STRUCT_8:
-                    size, signature = stream_read(2)
-                    value = Structure(UNPACKED_UINT_8[size], signature)
-                    is_collection = True
-                elif marker_byte == STRUCT_16:
-                    data = stream_read(3)
-                    value = Structure(UNPACKED_UINT_16[data[0:2]], data[2])
-                    is_collection = True
-
-                elif marker_byte == END_OF_STREAM:
-                    value = END_OF_STREAM
-
-            appended = False
-            while not appended:
-                if current_size >= current_capacity:
-                    current_collection = pop_collection()
-                    current_capacity = current_collection.capacity
-                    current_size = len(current_collection)
-                    push_item = current_collection.append
-                else:
-                    if push_item(value) is not NotImplemented:
-                        current_size += 1
-                    if is_collection:
-                        push_collection(current_collection)
-                        current_collection = value
-                        current_capacity = current_collection.capacity
-                        current_size = len(current_collection)
-                        push_item = current_collection.append
-                    appended = True
-
-        if collection_stack:
-            return iter(collection_stack[0])
+    def decode_false(self, data, offset, marker):
+        return False, offset
+
+    def decode_float_64(self, data, offset, marker):
+        return unpack_double(data, offset)[0], offset + 8
+
+    def decode_int_8(self, data, offset, marker):
+        return unpack_int_8(data, offset)[0], offset + 1
+
+    def decode_int_16(self, data, offset, marker):
+        return unpack_int_16(data, offset)[0], offset + 2
+
+    def decode_int_32(self, data, offset, marker):
+        return unpack_int_32(data, offset)[0], offset + 4
+
+    def decode_int_64(self, data, offset, marker):
+        return unpack_int_64(data, offset)[0], offset + 8
+
+    def decode_bytes_8(self, data, offset, marker):
+        end = offset + 1 + data[offset]
+        return bytes(data[offset + 1:end]), end
+
+    def decode_bytes_16(self, data, offset, marker):
+        end = offset + 2 + unpack_uint_16(data, offset)[0]
+        return bytes(data[offset + 2:end]), end
+
+    def decode_bytes_32(self, data, offset, marker):
+        end = offset + 4 + unpack_uint_32(data, offset)[0]
+        return bytes(data[offset + 4:end]), end
+
+    def decode_lazy_bytes(self, data, offset, marker):
+        size_struct = SIZE_STRUCTS[marker]
+        size, = size_struct.unpack_from(data, offset)
+        if size < self._lazy_bytes_size:
+            return Unpacker.decoders[marker](self, data, offset, marker)
+        offset += size_struct.size
+        end = offset + size
+        if end > len(data):
+            raise IndexError("Bytes value extends beyond the data")
+        return BytesView([stable_slice(data, offset, end)]), end
+
+    def decode_tiny_string(self, data, offset, marker):
+        end = offset + (marker & 0x0F)
+        return UNICODE(data[offset:end], ENCODING), end
+
+    def decode_string_8(self, data, offset, marker):
+        end = offset + 1 + data[offset]
+        return UNICODE(data[offset + 1:end], ENCODING), end
+
+    def decode_string_16(self, data, offset, marker):
+        end = offset + 2 + unpack_uint_16(data, offset)[0]
+        return UNICODE(data[offset + 2:end], ENCODING), end
+
+    def decode_string_32(self, data, offset, marker):
+        end = offset + 4 + unpack_uint_32(data, offset)[0]
+        return UNICODE(data[offset + 4:end], ENCODING), end
+
+    def decode_cached_tiny_string(self, data, offset, marker):
+        end = offset + (marker & 0x0F)
+        return self._string_cache.decode(data[offset:end]), end
+
+    def decode_cached_string_8(self, data, offset, marker):
+        end = offset + 1 + data[offset]
+        return self._string_cache.decode(data[offset + 1:end]), end
+
+    def decode_cached_string_16(self, data, offset, marker):
+        end = offset + 2 + unpack_uint_16(data, offset)[0]
+        return self._string_cache.decode(data[offset + 2:end]), end
+
+    def decode_cached_string_32(self, data, offset, marker):
+        end = offset + 4 + unpack_uint_32(data, offset)[0]
+        return self._string_cache.decode(data[offset + 4:end]), end
+
+    def decode_tiny_list(self, data, offset, marker):
+        return self.decode_items(data, offset, marker & 0x0F)
+
+    def decode_list_8(self, data, offset, marker):
+        return self.decode_items(data, offset + 1, data[offset])
+
+    def decode_list_16(self, data, offset, marker):
+        return self.decode_items(data, offset + 2, unpack_uint_16(data, offset)[0])
+
+    def decode_list_32(self, data, offset, marker):
+        return self.decode_items(data, offset + 4, unpack_uint_32(data, offset)[0])
+
+    def decode_numeric_list_8(self, data, offset, marker):
+        return self.decode_numeric_items(data, offset + 1, data[offset])
+
+    def decode_numeric_list_16(self, data, offset, marker):
+        return self.decode_numeric_items(data, offset + 2, unpack_uint_16(data, offset)[0])
+
+    def decode_numeric_list_32(self, data, offset, marker):
+        return self.decode_numeric_items(data, offset + 4, unpack_uint_32(data, offset)[0])
+
+    def decode_list_stream(self, data, offset, marker):
+        decoders = self.decoders
+        items = []
+        marker = data[offset]
+        while marker != 0xDF:
+            value, offset = decoders[marker](self, data, offset + 1, marker)
+            items.append(value)
+            marker = data[offset]
+        return items, offset + 1
+
+    def decode_tiny_map(self, data, offset, marker):
+        return self.decode_pairs(data, offset, marker & 0x0F)
+
+    def decode_map_8(self, data, offset, marker):
+        return self.decode_pairs(data, offset + 1, data[offset])
+
+    def decode_map_16(self, data, offset, marker):
+        return self.decode_pairs(data, offset + 2, unpack_uint_16(data, offset)[0])
+
+    def decode_map_32(self, data, offset, marker):
+        return self.decode_pairs(data, offset + 4, unpack_uint_32(data, offset)[0])
+
+    def decode_map_stream(self, data, offset, marker):
+        decoders = self.decoders
+        pairs = {}
+        marker = data[offset]
+        while marker != 0xDF:
+            key, offset = decoders[marker](self, data, offset + 1, marker)
+            marker = data[offset]
+            pairs[key], offset = decoders[marker](self, data, offset + 1, marker)
+            marker = data[offset]
+        return pairs, offset + 1
+
+    def decode_tiny_struct(self, data, offset, marker):
+        return self.decode_fields(data, offset, marker & 0x0F)
+
+    def decode_struct_8(self, data, offset, marker):
+        return self.decode_fields(data, offset + 1, data[offset])
+
+    def decode_struct_16(self, data, offset, marker):
+        return self.decode_fields(data, offset + 2, unpack_uint_16(data, offset)[0])
+
+    def decode_end_of_stream(self, data, offset, marker):
+        return END_OF_STREAM, offset
+
+    def decode_limited_value(self, data, offset, marker):
+        size = header_size(data, offset, marker)
+        if size > self._max_value_size:
+            raise SizeLimitError("PackStream value of %d bytes exceeds the limit of %d bytes" %
+                                 (size, self._max_value_size))
+        return self.unlimited_decoders[marker](self, data, offset, marker)
+
+    def decode_limited_collection(self, data, offset, marker):
+        self.check_collection_size(header_size(data, offset, marker))
+        return self.unlimited_decoders[marker](self, data, offset, marker)
+
+    def decode_limited_stream(self, data, offset, marker):
+        value, offset = self.unlimited_decoders[marker](self, data, offset, marker)
+        self.check_collection_size(len(value))
+        return value, offset
+
+    def check_collection_size(self, size):
+        if size > self._max_collection_size:
+            raise SizeLimitError("PackStream collection of %d items exceeds the limit of %d items" %
+                                 (size, self._max_collection_size))
+
+    # One decoder per marker byte; any marker not listed is reserved
+    decoders = [decode_reserved] * PLUS_2_TO_THE_8
+    decoders[0x00:0x80] = [decode_tiny_int] * 0x80
+    decoders[0x80:0x90] = [decode_tiny_string] * 0x10
+    decoders[0x90:0xA0] = [decode_tiny_list] * 0x10
+    decoders[0xA0:0xB0] = [decode_tiny_map] * 0x10
+    decoders[0xB0:0xC0] = [decode_tiny_struct] * 0x10
+    decoders[0xC0] = decode_null
+    decoders[0xC1] = decode_float_64
+    decoders[0xC2] = decode_false
+    decoders[0xC3] = decode_true
+    decoders[0xC8] = decode_int_8
+    decoders[0xC9] = decode_int_16
+    decoders[0xCA] = decode_int_32
+    decoders[0xCB] = decode_int_64
+    decoders[0xCC] = decode_bytes_8
+    decoders[0xCD] = decode_bytes_16
+    decoders[0xCE] = decode_bytes_32
+    decoders[0xD0] = decode_string_8
+    decoders[0xD1] = decode_string_16
+    decoders[0xD2] = decode_string_32
+    decoders[0xD4] = decode_list_8
+    decoders[0xD5] = decode_list_16
+    decoders[0xD6] = decode_list_32
+    decoders[0xD7] = decode_list_stream
+    decoders[0xD8] = decode_map_8
+    decoders[0xD9] = decode_map_16
+    decoders[0xDA] = decode_map_32
+    decoders[0xDB] = decode_map_stream
+    decoders[0xDC] = decode_struct_8
+    decoders[0xDD] = decode_struct_16
+    decoders[0xDF] = decode_end_of_stream
+    decoders[0xF0:0x100] = [decode_negative_tiny_int] * 0x10
+
+    # Used in place of the above by instances with optional settings enabled
+    numeric_list_decoders = [decode_numeric_list_8, decode_numeric_list_16, decode_numeric_list_32]
+    cached_string_decoders = [decode_cached_string_8, decode_cached_string_16, decode_cached_string_32]
+
+
+def numeric_array(is_float, width, raw):
+    """ Build an :class:`array.array` from big-endian data holding either
+    8 byte floats or signed integers of the given width.
+    """
+    values = array("d" if is_float else ARRAY_TYPECODES[width], bytes(raw))
+    if width > 1 and sys.byteorder == "little":
+        values.byteswap()
+    if is_float or width == 8:
+        return values
+    else:
+        return array(ARRAY_INT_64, values)
+
+
+def numeric_ndarray(is_float, width, raw):
+    """ Build a NumPy array from big-endian data holding either 8 byte
+    floats or signed integers of the given width.
+    """
+    import numpy
+    if is_float:
+        return numpy.frombuffer(raw, ">f8").astype(numpy.float64)
+    else:
+        return numpy.frombuffer(raw, ">i%d" % width).astype(numpy.int64)
+
+
+#: Bulk decoders for each supported value of `Unpacker.numeric_lists`.
+NUMERIC_LIST_BUILDERS = {
+    "array": numeric_array,
+    "numpy": numeric_ndarray,
+}
+
+
+class BytesView(RawIOBase):
+    """ A read-only, file-like view of a large bytes value, held as the
+    segments of data from which it was decoded rather than as a single
+    copy. Segments are referred to directly wherever they cannot change.
+    """
+
+    def __init__(self, segments):
+        RawIOBase.__init__(self)
+        self.segments = segments
+        self.starts = []
+        size = 0
+        for segment in segments:
+            self.starts.append(size)
+            size += len(segment)
+        self.size = size
+        self.position = 0
+
+    def __len__(self):
+        return self.size
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=0):
+        if whence == 0:
+            position = offset
+        elif whence == 1:
+            position = self.position + offset
+        elif whence == 2:
+            position = self.size + offset
         else:
-            return iter(current_collection)
+            raise ValueError("Invalid whence (%r)" % (whence,))
+        if position < 0:
+            raise ValueError("Negative seek position %d" % position)
+        self.position = position
+        return position
+
+    def readinto(self, b):
+        position, size = self.position, len(b)
+        count = 0
+        index = bisect_right(self.starts, position) - 1
+        while count < size and position < self.size:
+            segment = self.segments[index]
+            start = position - self.starts[index]
+            n = min(len(segment) - start, size - count)
+            b[count:count + n] = segment[start:start + n]
+            count += n
+            position += n
+            index += 1
+        self.position = position
+        return count
+
+    def getvalue(self):
+        """ Return the entire value as ``bytes``.
+        """
+        return b"".join(bytes(segment) for segment in self.segments)
+
+
+def stable_slice(data, start, end):
+    """ Return `data[start:end]` without copying if `data` is a view of
+    read-only memory, or as a copy otherwise.
+    """
+    if isinstance(data, memoryview) and data.readonly:
+        return data[start:end]
+    return bytes(data[start:end])
+
+
+#: Size formats for the markers of sized values whose size is not held
+#: within the marker itself.
+SIZE_STRUCTS = {
+    0xCC: Struct(UINT_8_STRUCT),
+    0xCD: Struct(UINT_16_STRUCT),
+    0xCE: Struct(UINT_32_STRUCT),
+    0xD0: Struct(UINT_8_STRUCT),
+    0xD1: Struct(UINT_16_STRUCT),
+    0xD2: Struct(UINT_32_STRUCT),
+    0xD4: Struct(UINT_8_STRUCT),
+    0xD5: Struct(UINT_16_STRUCT),
+    0xD6: Struct(UINT_32_STRUCT),
+    0xD8: Struct(UINT_8_STRUCT),
+    0xD9: Struct(UINT_16_STRUCT),
+    0xDA: Struct(UINT_32_STRUCT),
+    0xDC: Struct(UINT_8_STRUCT),
+    0xDD: Struct(UINT_16_STRUCT),
+}
+
+#: Markers of string and bytes values, and of sized collections.
+VALUE_MARKERS = list(range(0x80, 0x90)) + [0xCC, 0xCD, 0xCE, 0xD0, 0xD1, 0xD2]
+COLLECTION_MARKERS = list(range(0x90, 0xC0)) + [0xD4, 0xD5, 0xD6, 0xD8, 0xD9, 0xDA, 0xDC, 0xDD]
+
+
+def header_size(data, offset, marker):
+    """ Return the size of the sized value with the given marker, whose
+    size information (if not within the marker) begins at `offset`.
+    """
+    if marker < 0xC0:
+        return marker & 0x0F
+    return SIZE_STRUCTS[marker].unpack_from(data, offset)[0]
+
+
+LIST_FRAME = 0
+MAP_FRAME = 1
+STRUCT_FRAME = 2
+BYTES_FRAME = 3
+NUMERIC_LIST_FRAME = 4
+
+FRAME_KINDS = {0x9: LIST_FRAME, 0xA: MAP_FRAME, 0xB: STRUCT_FRAME}
+
+#: Collection markers with separate size information, mapped to the kind
+#: of frame they open and the size format, or None for streams.
+COLLECTION_HEADERS = {
+    0xD4: (LIST_FRAME, SIZE_STRUCTS[0xD4]),
+    0xD5: (LIST_FRAME, SIZE_STRUCTS[0xD5]),
+    0xD6: (LIST_FRAME, SIZE_STRUCTS[0xD6]),
+    0xD7: (LIST_FRAME, None),
+    0xD8: (MAP_FRAME, SIZE_STRUCTS[0xD8]),
+    0xD9: (MAP_FRAME, SIZE_STRUCTS[0xD9]),
+    0xDA: (MAP_FRAME, SIZE_STRUCTS[0xDA]),
+    0xDB: (MAP_FRAME, None),
+    0xDC: (STRUCT_FRAME, SIZE_STRUCTS[0xDC]),
+    0xDD: (STRUCT_FRAME, SIZE_STRUCTS[0xDD]),
+}
+
+#: Placeholder for the key of a map frame while awaiting the next key.
+NO_KEY = object()
+
+
+def add_to_frame(frame, value):
+    """ Add a value to a frame of the form [kind, items, remaining, key
+    or signature], returning True if this completes the collection.
+    Streams, with a negative count remaining, are only completed by an
+    END_OF_STREAM marker.
+    """
+    if frame[0] == MAP_FRAME:
+        key = frame[3]
+        if key is NO_KEY:
+            frame[3] = value
+            return False
+        frame[1][key] = value
+        frame[3] = NO_KEY
+    else:
+        frame[1].append(value)
+    frame[2] -= 1
+    return frame[2] == 0
+
+
+def check_numeric_item(frame, marker):
+    """ Record in a numeric list frame, of the form [kind, items,
+    remaining, marker], whether the item with the given marker is of the
+    same numeric encoding as those before it. The marker of the frame is
+    NO_KEY before the first item, and None once any item differs.
+    """
+    first = frame[3]
+    if first is NO_KEY:
+        frame[3] = marker if marker in NUMERIC_WIDTHS else None
+    elif first is not None and marker != first and (NUMERIC_WIDTHS[first] or NUMERIC_WIDTHS.get(marker) != 0):
+        frame[3] = None
 
 
 def unpack(stream):
@@ -797,4 +1886,4 @@ def unpack(stream):
 
 
 def unpackb(b):
-    return unpack(BytesIO(b))
+    return iter(Unpacker().unpack_from(b))
@@ -29,21 +29,26 @@ from __future__ import division
 
 from collections import deque
 import re
+from weakref import ref
 
-from .bolt import connect, Response, RUN, PULL_ALL
+from .bolt import connect, Response
 from .compat import integer, string, urlparse
 from .constants import DEFAULT_PORT, ENCRYPTION_DEFAULT, TRUST_DEFAULT, TRUST_SIGNED_CERTIFICATES, ENCRYPTION_ON, \
     ENCRYPTION_NON_LOCAL
 from .exceptions import CypherError, ProtocolError, ResultError
 from .ssl_compat import SSL_AVAILABLE, SSLContext, PROTOCOL_SSLv23, OP_NO_SSLv2, CERT_REQUIRED
 from .summary import ResultSummary
-from .types import hydrated
 
 
 DEFAULT_MAX_POOL_SIZE = 50
 
 localhost = re.compile(r"^(localhost|127(\.\d+){3})$", re.IGNORECASE)
 
+#: Parameter values that hold text as byte strings, and so are decoded
+#: before sending. This is only the Python 2 ``str`` type; in Python 3,
+#: ``bytes`` values are sent as they are, as PackStream bytes.
+TEXT_BYTES = () if bytes is not str else str
+
 
 class AuthToken(object):
     """ Container for auth information
@@ -88,6 +93,10 @@ class Driver(object):
           An authentication token for the server, for example
           ``basic_auth("neo4j", "password")``.
 
+        `connection_timeout`
+          The maximum time in seconds to wait for a connection to be
+          established (default ``None``, to wait indefinitely).
+
         `der_encoded_server_certificate`
           The server certificate in DER format, if required.
 
@@ -97,10 +106,84 @@ class Driver(object):
           depending on whether SSL is available or not. If it is,
           :attr:`.ENCRYPTION_NON_LOCAL` is the default.
 
+        `handshake_timeout`
+          The maximum time in seconds to wait for the TLS and Bolt
+          handshakes to complete once connected (default ``None``, to
+          wait indefinitely).
+
+        `keep_alive`
+          Whether TCP keep-alive probes are sent on idle connections
+          (default ``None``, for the platform default, unless any of the
+          settings below are given).
+
+        `keep_alive_count`, `keep_alive_idle`, `keep_alive_interval`
+          The number of unanswered keep-alive probes after which a
+          connection is dropped, the idle time in seconds before the first
+          is sent and the time in seconds between them, where supported by
+          the platform. Any of these enables `keep_alive`.
+
+        `lazy_bytes_size`
+          Received byte arrays of at least this many bytes are returned
+          as read-only, file-like :class:`.BytesView` objects referring to
+          the data as it was received, instead of being copied into
+          ``bytes`` (default ``None``, for no such values).
+
+        `list_streams`
+          Whether parameter values of unknown length, such as generators,
+          are sent as PackStream list streams (default ``True``). If
+          ``False``, their items are encoded in advance in order to count
+          them.
+
+        `max_collection_size`
+          The maximum number of items in any received list, map or
+          structure (default ``None``, for no limit).
+
+        `max_message_size`
+          The maximum size in bytes of any received message (default
+          ``None``, for no limit).
+
         `max_pool_size`
           The maximum number of sessions to keep idle in the session
           pool.
 
+        `max_read_size`
+          The maximum size in bytes of each read from a socket (default
+          262144). See `read_size`.
+
+        `max_value_size`
+          The maximum size in bytes of any received string or byte array
+          (default ``None``, for no limit).
+
+        `packed_string_cache_size`
+          The maximum number of recently sent statements and map keys to
+          hold in packed form on each connection (default 256), when the
+          C accelerator is not available. Set to 0 to disable.
+
+        `read_size`
+          The initial size in bytes of each read from a socket (default
+          8192). The read size doubles, up to `max_read_size`, whenever a
+          read fills it, so that large results are streamed with fewer
+          reads.
+
+        `read_timeout`
+          The maximum time in seconds to wait for the server to send or
+          accept any data once connected (default ``None``, to wait
+          indefinitely).
+
+        `receive_buffer_size`, `send_buffer_size`
+          The sizes of the socket receive and send buffers
+          (``SO_RCVBUF`` and ``SO_SNDBUF``), in bytes (default ``None``,
+          for the platform default).
+
+        `string_cache_size`
+          The maximum number of short strings, such as property keys and
+          labels, to share between received records on each connection
+          (default 1024). Set to 0 to disable.
+
+        `tcp_nodelay`
+          Whether to send small messages immediately rather than
+          coalescing them (``TCP_NODELAY``, default ``True``).
+
         `trust`
           Trust level: one of :attr:`.TRUST_ON_FIRST_USE` (default) or
           :attr:`.TRUST_SIGNED_CERTIFICATES`.
@@ -108,6 +191,16 @@ class Driver(object):
         `user_agent`
           A custom user agent string, if required.
 
+        A received message that exceeds any of the `max_collection_size`,
+        `max_message_size` or `max_value_size` limits raises a
+        :class:`.SizeLimitError` and closes the connection on which it
+        was received.
+
+        Exceeding any of the `connection_timeout`, `handshake_timeout` or
+        `read_timeout` limits raises a :class:`.ServiceTimeout`. A
+        connection on which a read or send times out is closed and is
+        not returned to the session pool.
+
     """
 
     def __init__(self, address, **config):
@@ -193,7 +286,7 @@ class StatementResult(object):
     #: Dictionary of parameters passed with the statement.
     parameters = None
 
-    def __init__(self, connection, run_response, pull_all_response):
+    def __init__(self, connection, numeric_lists=None):
         super(StatementResult, self).__init__()
 
         # The Connection instance behind this result.
@@ -215,40 +308,25 @@ class StatementResult(object):
         # from the network (but not necessarily yielded).
         self._consumed = False
 
-        def on_header(metadata):
-            # Called on receipt of the result header.
-            self._keys = metadata["fields"]
-
-        def on_record(values):
-            # Called on receipt of each result record.
-            self._buffer.append(values)
-
-        def on_footer(metadata):
-            # Called on receipt of the result footer.
-            self._summary = ResultSummary(self.statement, self.parameters, **metadata)
-            self._consumed = True
+        # Flag to indicate whether the server ignored the statement, as
+        # an earlier statement failed.
+        self._ignored = False
 
-        def on_failure(metadata):
-            # Called on execution failure.
-            self._consumed = True
-            raise CypherError(metadata)
-
-        run_response.on_success = on_header
-        run_response.on_failure = on_failure
-
-        pull_all_response.on_record = on_record
-        pull_all_response.on_success = on_footer
-        pull_all_response.on_failure = on_failure
+        # Handlers for the responses to the RUN and PULL_ALL messages.
+        self.run_response = RunResponse(self)
+        self.pull_all_response = PullAllResponse(self, numeric_lists)
 
     def __iter__(self):
         while self._buffer:
             values = self._buffer.popleft()
-            yield Record(self.keys(), tuple(map(hydrated, values)))
+            yield Record(self.keys(), values)
         while not self._consumed:
             self.connection.fetch()
             while self._buffer:
                 values = self._buffer.popleft()
-                yield Record(self.keys(), tuple(map(hydrated, values)))
+                yield Record(self.keys(), values)
+        if self._ignored:
+            raise ResultError("This statement was not run, because an earlier statement failed.")
 
     def keys(self):
         """ Return the keys for the records.
@@ -256,6 +334,8 @@ class StatementResult(object):
         # Fetch messages until we have the header or a failure
         while self._keys is None and not self._consumed:
             self.connection.fetch()
+        if self._ignored:
+            raise ResultError("This statement was not run, because an earlier statement failed.")
         return tuple(self._keys)
 
     def buffer(self):
@@ -269,8 +349,14 @@ class StatementResult(object):
         summary.
         """
         if self.connection and not self.connection.closed:
-            list(self)
+            # Skip the remaining records instead of decoding them
+            self._buffer.clear()
+            self.pull_all_response.discard_records = True
+            while not self._consumed:
+                self.connection.fetch()
             self.connection = None
+            if self._ignored:
+                raise ResultError("This statement was not run, because an earlier statement failed.")
         return self._summary
 
     def single(self):
@@ -291,15 +377,78 @@ class StatementResult(object):
         """
         if self._buffer:
             values = self._buffer[0]
-            return Record(self.keys(), tuple(map(hydrated, values)))
+            return Record(self.keys(), values)
         while not self._buffer and not self._consumed:
             self.connection.fetch()
             if self._buffer:
                 values = self._buffer[0]
-                return Record(self.keys(), tuple(map(hydrated, values)))
+                return Record(self.keys(), values)
         raise ResultError("End of stream")
 
 
+class RunResponse(Response):
+    """ Handler for the response to the RUN message of a
+    :class:`.StatementResult`, which carries the result header.
+
+    The result is only weakly referenced, so that a result no longer
+    held by the caller can be recognised and its records skipped.
+    """
+
+    def __init__(self, result, numeric_lists=None):
+        super(RunResponse, self).__init__(result.connection, numeric_lists)
+        self.result = ref(result)
+
+    def on_success(self, metadata):
+        result = self.result()
+        if result is not None:
+            result._keys = tuple(metadata["fields"])
+
+    def on_failure(self, metadata):
+        result = self.result()
+        if result is not None:
+            result._consumed = True
+        raise CypherError(metadata)
+
+    def on_ignored(self, metadata=None):
+        # Called when the statement was not run, as an earlier one failed
+        result = self.result()
+        if result is not None:
+            result._consumed = True
+            result._ignored = True
+
+
+class PullAllResponse(RunResponse):
+    """ Handler for the response to the PULL_ALL (or DISCARD_ALL) message
+    of a :class:`.StatementResult`, which carries the records and the
+    result footer.
+    """
+
+    def __init__(self, result, numeric_lists=None):
+        super(PullAllResponse, self).__init__(result, numeric_lists)
+        self.result = ref(result, self.on_release)
+
+    def on_release(self, _):
+        # Nobody can read the records of a result that has been released
+        self.discard_records = True
+
+    def on_records(self, records):
+        if not self.discard_records:
+            self.result()._buffer.extend(records)
+
+    def on_success(self, metadata):
+        result = self.result()
+        if result is not None:
+            result._summary = ResultSummary(result.statement, result.parameters, **metadata)
+            result._consumed = True
+
+    def on_ignored(self, metadata=None):
+        # Only the response to RUN tells whether the statement itself was
+        # run, as PULL_ALL is also ignored after its own RUN has failed
+        result = self.result()
+        if result is not None:
+            result._consumed = True
+
+
 class Session(object):
     """ Logical session carried out over an established TCP connection.
     Sessions should generally be constructed using the :meth:`.Driver.session`
@@ -324,23 +473,53 @@ class Session(object):
         """
         return self.connection.healthy
 
-    def run(self, statement, parameters=None):
+    def run(self, statement, parameters=None, numeric_lists=None, discard=False):
         """ Run a parameterised Cypher statement.
 
         :param statement: Cypher statement to execute
         :param parameters: dictionary of parameters
+        :param numeric_lists: ``"array"`` or ``"numpy"`` to receive long
+                              numeric lists as :class:`array.array` or
+                              NumPy arrays (see :class:`.Unpacker`)
+        :param discard: if true, have the server discard the records
+                        rather than send them, leaving only the summary
         :return: Cypher result
         :rtype: :class:`.StatementResult`
         """
         if self.transaction:
             raise ProtocolError("Statements cannot be run directly on a session with an open transaction;"
                                 " either run from within the transaction or use a different session.")
-        return run(self.connection, statement, parameters)
+        return run(self.connection, statement, parameters, numeric_lists, discard)
+
+    def pipeline(self):
+        """ Create a new :class:`.Pipeline`, to send a batch of
+        statements to the server together.
+
+        :return: new :class:`.Pipeline` instance.
+        """
+        if self.transaction:
+            raise ProtocolError("Statements cannot be run directly on a session with an open transaction;"
+                                " either run from within the transaction or use a different session.")
+        return Pipeline(self.connection)
+
+    def run_many(self, statements, numeric_lists=None):
+        """ Run several parameterised Cypher statements, sending them all
+        to the server together.
+
+        :param statements: iterable of (statement, parameters) pairs
+        :param numeric_lists: ``"array"`` or ``"numpy"`` to receive long
+                              numeric lists as :class:`array.array` or
+                              NumPy arrays (see :class:`.Unpacker`)
+        :return: list of Cypher results, in the order of the statements
+        """
+        with self.pipeline() as pipeline:
+            return [pipeline.run(statement, parameters, numeric_lists) for statement, parameters in statements]
 
     def close(self):
         """ Recycle this session through the driver it came from.
         """
         if self.connection and not self.connection.closed:
+            # Records of results no longer held by the caller are skipped, not decoded
             self.connection.fetch_all()
         if self.transaction:
             self.transaction.close()
@@ -362,6 +541,54 @@ class Session(object):
         return self.transaction
 
 
+class Pipeline(object):
+    """ Batch of statements queued to be sent to the server together, in
+    a single write, rather than one at a time. The batch is sent when the
+    pipeline is closed, or as soon as any result is read::
+
+        with session.pipeline() as pipeline:
+            results = [pipeline.run("MATCH (a:Person {id: {id}}) RETURN a", {"id": id})
+                       for id in ids]
+
+    If a statement fails, the server ignores all that follow it, and a
+    :class:`.ResultError` is raised when reading their results.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def run(self, statement, parameters=None, numeric_lists=None, discard=False):
+        """ Queue a parameterised Cypher statement.
+
+        :param statement: Cypher statement to execute
+        :param parameters: dictionary of parameters
+        :param numeric_lists: ``"array"`` or ``"numpy"`` to receive long
+                              numeric lists as :class:`array.array` or
+                              NumPy arrays (see :class:`.Unpacker`)
+        :param discard: if true, have the server discard the records
+                        rather than send them, leaving only the summary
+        :return: Cypher result
+        :rtype: :class:`.StatementResult`
+        """
+        assert not self.closed
+        return queue(self.connection, statement, parameters, numeric_lists, discard)
+
+    def close(self):
+        """ Send all statements queued.
+        """
+        if not self.closed:
+            self.closed = True
+            if not self.connection.closed:
+                self.connection.send()
+
+
 class Transaction(object):
     """ Container for multiple Cypher queries to be executed within
     a single context. Transactions can be used within a :py:const:`with`
@@ -396,15 +623,20 @@ class Transaction(object):
             self.success = False
         self.close()
 
-    def run(self, statement, parameters=None):
+    def run(self, statement, parameters=None, numeric_lists=None, discard=False):
         """ Run a Cypher statement within the context of this transaction.
 
         :param statement: Cypher statement
         :param parameters: dictionary of parameters
+        :param numeric_lists: ``"array"`` or ``"numpy"`` to receive long
+                              numeric lists as :class:`array.array` or
+                              NumPy arrays (see :class:`.Unpacker`)
+        :param discard: if true, have the server discard the records
+                        rather than send them, leaving only the summary
         :return: result object
         """
         assert not self.closed
-        return run(self.connection, statement, parameters)
+        return run(self.connection, statement, parameters, numeric_lists, discard)
 
     def commit(self):
         """ Mark this transaction as successful and close in order to
@@ -440,6 +672,8 @@ class Record(object):
     ``record["field"]``).
     """
 
+    __slots__ = ("_keys", "_values")
+
     def __init__(self, keys, values):
         self._keys = tuple(keys)
         self._values = tuple(values)
@@ -520,37 +754,55 @@ def basic_auth(user, password):
     return AuthToken("basic", user, password)
 
 
-def run(connection, statement, parameters=None):
+def run(connection, statement, parameters=None, numeric_lists=None, discard=False):
     """ Run a Cypher statement on a given connection.
 
     :param connection: connection to carry the request and response
     :param statement: Cypher statement
     :param parameters: optional dictionary of parameters
+    :param numeric_lists: optional bulk decoding of numeric lists
+    :param discard: if true, have the server discard the records
+    :return: statement result
+    """
+    result = queue(connection, statement, parameters, numeric_lists, discard)
+    connection.send()
+    return result
+
+
+def queue(connection, statement, parameters=None, numeric_lists=None, discard=False):
+    """ Queue a Cypher statement to be run on a given connection, when
+    the connection next sends.
+
+    :param connection: connection to carry the request and response
+    :param statement: Cypher statement
+    :param parameters: optional dictionary of parameters
+    :param numeric_lists: optional bulk decoding of numeric lists
+    :param discard: if true, have the server discard the records
     :return: statement result
     """
     # Ensure the statement is a Unicode value
     if isinstance(statement, bytes):
         statement = statement.decode("UTF-8")
 
-    params = {}
-    for key, value in (parameters or {}).items():
-        if isinstance(key, bytes):
-            key = key.decode("UTF-8")
-        if isinstance(value, bytes):
-            params[key] = value.decode("UTF-8")
-        else:
-            params[key] = value
-    parameters = params
+    if not parameters:
+        parameters = {}
+    elif any(isinstance(key, bytes) or isinstance(value, TEXT_BYTES) for key, value in parameters.items()):
+        # Copy the parameters only if there are byte strings to decode
+        params = {}
+        for key, value in parameters.items():
+            if isinstance(key, bytes):
+                key = key.decode("UTF-8")
+            if isinstance(value, TEXT_BYTES):
+                params[key] = value.decode("UTF-8")
+            else:
+                params[key] = value
+        parameters = params
 
-    run_response = Response(connection)
-    pull_all_response = Response(connection)
-    result = StatementResult(connection, run_response, pull_all_response)
+    result = StatementResult(connection, numeric_lists)
     result.statement = statement
     result.parameters = parameters
 
-    connection.append(RUN, (statement, parameters), response=run_response)
-    connection.append(PULL_ALL, response=pull_all_response)
-    connection.send()
+    connection.append_run(statement, parameters, result.run_response, result.pull_all_response, discard)
 
     return result
 
@@ -19,10 +19,11 @@
 # limitations under the License.
 
 try:
-    from ssl import SSLContext, PROTOCOL_SSLv23, OP_NO_SSLv2, CERT_REQUIRED, HAS_SNI, SSLError
+    from ssl import SSLContext, PROTOCOL_SSLv23, OP_NO_SSLv2, CERT_REQUIRED, HAS_SNI, SSLError, SSLSocket
 except ImportError:
     SSL_AVAILABLE = False
     SSLContext = None
+    SSLSocket = None
     PROTOCOL_SSLv23 = None
     OP_NO_SSLv2 = None
     CERT_REQUIRED = None
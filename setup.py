@@ -20,13 +20,39 @@
 
 import os
 try:
-    from setuptools import setup
+    from setuptools import setup, Extension
+    from setuptools.command.build_ext import build_ext
 except ImportError:
-    from distutils.core import setup
+    from distutils.core import setup, Extension
+    from distutils.command.build_ext import build_ext
+from distutils.errors import CCompilerError, DistutilsExecError, DistutilsPlatformError
 
 from neo4j.meta import version
 
 
+class optional_build_ext(build_ext):
+    """ Build the C accelerator if possible, carrying on without it if
+    not. This is done here rather than by marking the extension as
+    optional, which Python 2 does not support.
+    """
+
+    def run(self):
+        try:
+            build_ext.run(self)
+        except DistutilsPlatformError as error:
+            self.skip(error)
+
+    def build_extension(self, ext):
+        try:
+            build_ext.build_extension(self, ext)
+        except (CCompilerError, DistutilsExecError, DistutilsPlatformError, ValueError) as error:
+            self.skip(error)
+
+    def skip(self, error):
+        self.warn("The C accelerator could not be built, so the pure Python "
+                  "PackStream implementation will be used instead (%s)" % error)
+
+
 # Used for reading the README into long_description below.
 def read(fname):
     return open(os.path.join(os.path.dirname(__file__), fname)).read()
@@ -51,4 +77,8 @@ setup(name="neo4j-driver",
           "Programming Language :: Python :: 3.3",
           "Programming Language :: Python :: 3.4",
       ],
-      packages=["neo4j", "neo4j.v1"])
+      packages=["neo4j", "neo4j.v1"],
+      # The C accelerator is optional; if it cannot be built, the pure
+      # Python PackStream implementation is used instead
+      ext_modules=[Extension("neo4j.v1._packstream", ["neo4j/v1/_packstream.c"])],
+      cmdclass={"build_ext": optional_build_ext})
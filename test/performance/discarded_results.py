@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+# Copyright (c) 2002-2016 "Neo Technology,"
+# Network Engine for Objects in Lund AB [http://neotechnology.com]
+#
+# This file is part of Neo4j.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmark for the time taken to get past a result whose records are
+not wanted, in milliseconds per result, from a stub server that has
+already sent the whole result over a local socket pair. Reading every
+record is compared with `StatementResult.consume` and with releasing
+the result before the connection is drained, as `Session.close` does.
+
+Usage:   python -m test.performance.discarded_results
+"""
+
+from __future__ import print_function
+
+from socket import socketpair, SOL_SOCKET, SO_RCVBUF, SO_SNDBUF
+from time import time
+
+from neo4j.v1.bolt import Connection
+from neo4j.v1.session import run
+
+from test.util import chunked
+
+
+#: Number of records in each result.
+RECORDS = 20000
+
+#: Number of results skipped each way.
+RUNS = 15
+
+ROW = [1, u"Alice", [u"a", u"b", u"c"], {u"since": 2016, u"weight": 0.5}]
+
+
+def read_all(connection):
+    list(run(connection, u"MATCH (a) RETURN a"))
+
+
+def consume(connection):
+    result = run(connection, u"MATCH (a) RETURN a")
+    result.keys()
+    result.consume()
+
+
+def release(connection):
+    run(connection, u"MATCH (a) RETURN a")
+    connection.fetch_all()
+
+
+def milliseconds(skip):
+    """ Return the time taken to get past one result.
+    """
+    client, server = socketpair()
+    # Hold the whole result in the socket buffers, as if received before it is read
+    server.setsockopt(SOL_SOCKET, SO_SNDBUF, 1 << 24)
+    client.setsockopt(SOL_SOCKET, SO_RCVBUF, 1 << 24)
+    server.sendall(chunked(*([(b"\x70", ({},)), (b"\x70", ({u"fields": [u"a"]},))] +
+                             [(b"\x71", (ROW,))] * RECORDS + [(b"\x70", ({},))])))
+    connection = Connection(client)
+    t0 = time()
+    skip(connection)
+    t = time() - t0
+    assert not connection.responses
+    connection.close()
+    server.close()
+    return t * 1e3
+
+
+def main():
+    print("%-8s  %8s" % ("skip", "ms"))
+    for name, skip in [("read", read_all), ("consume", consume), ("release", release)]:
+        # Report the median, as timings vary between runs
+        times = sorted(milliseconds(skip) for _ in range(RUNS))
+        print("%-8s  %8.1f" % (name, times[RUNS // 2]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+# Copyright (c) 2002-2016 "Neo Technology,"
+# Network Engine for Objects in Lund AB [http://neotechnology.com]
+#
+# This file is part of Neo4j.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmark for the cost of wire and message logging, in messages per
+second sent and received by a `Connection` over a local socket pair.
+Logging disabled (the default) is compared with DEBUG logging to a
+handler that discards everything, which builds the same hex dumps and
+message descriptions that were previously built whether or not logging
+was enabled.
+
+Usage:   python -m test.performance.logging_overhead
+"""
+
+from __future__ import print_function
+
+import logging
+from socket import socketpair
+from threading import Thread
+from time import time
+
+from neo4j.v1.bolt import Connection, Response, PULL_ALL, RUN
+
+from test.util import chunked
+
+
+#: Number of messages sent, and of records received, per run.
+MESSAGES = 5000
+
+PARAMETERS = {u"name": u"Alice", u"tags": [u"a", u"b", u"c"], u"scores": list(range(50))}
+ROW = [1, u"Alice", [u"a", u"b", u"c"], {u"since": 2016, u"weight": 0.5}]
+
+
+def drain(sock):
+    while sock.recv(1048576):
+        pass
+
+
+def connection(data):
+    """ Return a connection to a server end that acknowledges INIT, then
+    sends the data given and discards everything received.
+    """
+    client, server = socketpair()
+    for target, args in [(server.sendall, (chunked((b"\x70", ({},))) + data,)), (drain, (server,))]:
+        thread = Thread(target=target, args=args)
+        thread.daemon = True
+        thread.start()
+    return Connection(client)
+
+
+def send_rate():
+    cx = connection(b"")
+    t0 = time()
+    for _ in range(MESSAGES):
+        cx.append(RUN, (u"MATCH (a:Person {name: $name}) RETURN a", PARAMETERS))
+        cx.append(PULL_ALL)
+        cx.channel.send()
+    t = time() - t0
+    cx.close()
+    return 2 * MESSAGES / t
+
+
+def receive_rate():
+    cx = connection(chunked(*([(b"\x71", (ROW,))] * MESSAGES + [(b"\x70", ({},))])))
+    cx.responses.append(Response(cx))
+    t0 = time()
+    cx.fetch_all()
+    t = time() - t0
+    cx.close()
+    return (MESSAGES + 1) / t
+
+
+def main():
+    logger = logging.getLogger("neo4j.bolt")
+    logger.propagate = False
+    logger.addHandler(logging.NullHandler())
+    print("%-8s  %10s  %10s" % ("logging", "sent/s", "received/s"))
+    for name, level in [("disabled", logging.WARNING), ("DEBUG", logging.DEBUG)]:
+        logger.setLevel(level)
+        print("%-8s  %10.0f  %10.0f" % (name, max(send_rate() for _ in range(3)),
+                                        max(receive_rate() for _ in range(3))))
+
+
+if __name__ == "__main__":
+    main()
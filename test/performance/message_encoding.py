@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+# Copyright (c) 2002-2016 "Neo Technology,"
+# Network Engine for Objects in Lund AB [http://neotechnology.com]
+#
+# This file is part of Neo4j.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmark for the throughput of encoding and sending RUN messages with
+large parameter maps, in MB/s of chunked output, for both the pure Python
+encoder and the C accelerator (if built). The output buffer of
+`ChunkChannel` is compared with a channel that holds each write in a list
+and sends the pieces by scatter-gather output. Messages are sent through
+a local socket pair, drained by a separate thread.
+
+Usage:   python -m test.performance.message_encoding
+"""
+
+from __future__ import print_function
+
+from socket import socketpair
+from struct import pack as struct_pack
+from threading import Thread
+from timeit import repeat
+
+from neo4j.v1 import packstream
+from neo4j.v1.bolt import ChunkChannel, send_segments
+from neo4j.v1.packstream import Packer
+
+
+SAMPLES = [
+    ("ints", {u"p%d" % i: i for i in range(5000)}),
+    ("strings", {u"p%d" % i: u"value %d" % i for i in range(5000)}),
+    ("rows", {u"rows": [{u"id": i, u"name": u"Alice", u"tags": [u"a", u"b"]} for i in range(2000)]}),
+]
+
+
+class CountingSocket(object):
+    """ Socket wrapper that counts the bytes sent.
+    """
+
+    def __init__(self, sock):
+        self.socket = sock
+        self.size = 0
+
+    def sendall(self, data):
+        self.socket.sendall(data)
+        self.size += len(data)
+
+    def sendmsg(self, buffers):
+        sent = self.socket.sendmsg(buffers)
+        self.size += sent
+        return sent
+
+
+class ListChunkChannel(object):
+    """ Chunk writer that holds each write in a list until sent.
+    """
+
+    max_chunk_size = 65535
+
+    def __init__(self, sock):
+        self.socket = sock
+        self.output_buffer = []
+        self.output_size = 0
+        self.output_segments = []
+
+    def write(self, b):
+        size = len(b)
+        future_size = self.output_size + size
+        if future_size < self.max_chunk_size:
+            self.output_buffer.append(b)
+            self.output_size = future_size
+            return
+        view = memoryview(b)
+        while view:
+            end = self.max_chunk_size - self.output_size
+            if len(view) < end:
+                self.output_buffer.append(view)
+                self.output_size += len(view)
+                break
+            self.output_buffer.append(view[:end])
+            self.output_size = self.max_chunk_size
+            view = view[end:]
+            self.flush()
+            self.send()
+
+    def flush(self, end_of_message=False):
+        if self.output_buffer:
+            self.output_segments.append(struct_pack(">H", self.output_size))
+            self.output_segments.extend(self.output_buffer)
+            del self.output_buffer[:]
+            self.output_size = 0
+        if end_of_message:
+            self.output_segments.append(b"\x00\x00")
+
+    def send(self):
+        send_segments(self.socket.sendmsg, self.output_segments)
+        del self.output_segments[:]
+
+
+def drain(sock):
+    while sock.recv(1048576):
+        pass
+
+
+def throughput(channel_class, parameters):
+    """ Return the best observed throughput, in MB/s of chunked output.
+    """
+    client, server = socketpair()
+    thread = Thread(target=drain, args=(server,))
+    thread.daemon = True
+    thread.start()
+    sock = CountingSocket(client)
+    channel = channel_class(sock)
+    packer = Packer(channel)
+
+    def run():
+        packer.pack_struct_header(2, b"\x10")
+        packer.pack(u"UNWIND $rows AS row RETURN row")
+        packer.pack(parameters)
+        channel.flush(end_of_message=True)
+        channel.send()
+
+    run()
+    size = sock.size
+    best = min(repeat(run, number=10, repeat=5))
+    client.close()
+    thread.join()
+    server.close()
+    return size * 10 / best / 1e6
+
+
+def main():
+    accelerator = packstream._packstream
+    print("%-8s  %-6s  %10s  %11s" % ("params", "coder", "list MB/s", "buffer MB/s"))
+    for name, parameters in SAMPLES:
+        for coder in ["python", "c"]:
+            if coder == "c" and not accelerator:
+                continue
+            packstream._packstream = accelerator if coder == "c" else None
+            print("%-8s  %-6s  %10.1f  %11.1f" % (name, coder, throughput(ListChunkChannel, parameters),
+                                                  throughput(ChunkChannel, parameters)))
+    packstream._packstream = accelerator
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+# Copyright (c) 2002-2016 "Neo Technology,"
+# Network Engine for Objects in Lund AB [http://neotechnology.com]
+#
+# This file is part of Neo4j.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Micro-benchmark for PackStream decoding, reporting the cost per value of
+each type for both the pure Python decoder and the C accelerator (if built).
+
+Usage:   python -m test.performance.packstream_decoding
+"""
+
+from __future__ import print_function
+
+from timeit import repeat
+
+from neo4j.v1 import packstream
+from neo4j.v1.packstream import Unpacker, packb
+
+
+COUNT = 1000
+
+SAMPLES = [
+    ("null", None),
+    ("tiny int", 42),
+    ("int 64", 2 ** 40),
+    ("float", 3.14159),
+    ("tiny string", u"hello"),
+    ("string 8", u"hello, world, this is a string"),
+    ("bytes 8", bytearray(b"hello")),
+    ("tiny list", [1, 2, 3]),
+    ("tiny map", {u"name": u"Alice"}),
+    ("tiny struct", (b"N", (1, [u"Person"], {}))),
+]
+
+
+def cost_per_value(data):
+    """ Return the best observed decoding time per value, in nanoseconds.
+    """
+    unpack_from = Unpacker().unpack_from
+    best = min(repeat(lambda: unpack_from(data), number=20, repeat=5))
+    return best / 20 / COUNT * 1e9
+
+
+def main():
+    accelerator = packstream._packstream
+    print("%-12s  %12s  %12s" % ("type", "python ns", "c ns"))
+    for name, value in SAMPLES:
+        data = packb([value] * COUNT)
+        packstream._packstream = None
+        python_cost = cost_per_value(data)
+        if accelerator:
+            packstream._packstream = accelerator
+            c_cost = "%12.0f" % cost_per_value(data)
+        else:
+            c_cost = "%12s" % "n/a"
+        print("%-12s  %12.0f  %s" % (name, python_cost, c_cost))
+    packstream._packstream = accelerator
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+# Copyright (c) 2002-2016 "Neo Technology,"
+# Network Engine for Objects in Lund AB [http://neotechnology.com]
+#
+# This file is part of Neo4j.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmark for the rate at which records are fetched and iterated from a
+`StatementResult`, in records per second, from a stub server that has
+already sent the whole result over a local socket pair. Fetching every
+message already received in one call is compared with fetching a single
+message per call.
+
+Usage:   python -m test.performance.record_fetching
+"""
+
+from __future__ import print_function
+
+from socket import socketpair, SOL_SOCKET, SO_RCVBUF, SO_SNDBUF
+from time import time
+
+from neo4j.v1.bolt import Connection
+from neo4j.v1.session import run
+
+from test.util import chunked
+
+
+#: Number of records in each result.
+RECORDS = 20000
+
+#: Number of results fetched each way, for each sample.
+RUNS = 15
+
+SAMPLES = [
+    ("ints", [1]),
+    ("rows", [1, u"Alice", [u"a", u"b", u"c"], {u"since": 2016, u"weight": 0.5}]),
+]
+
+
+def records_per_second(row, batched):
+    """ Return the rate at which the records of one result are fetched
+    and iterated.
+    """
+    client, server = socketpair()
+    # Hold the whole result in the socket buffers, as if received before it is read
+    server.setsockopt(SOL_SOCKET, SO_SNDBUF, 1 << 24)
+    client.setsockopt(SOL_SOCKET, SO_RCVBUF, 1 << 24)
+    server.sendall(chunked(*([(b"\x70", ({},)), (b"\x70", ({u"fields": [u"x"]},))] +
+                             [(b"\x71", (row,))] * RECORDS + [(b"\x70", ({},))])))
+    connection = Connection(client)
+    if not batched:
+        connection.channel.buffered_message = lambda: None
+        connection.channel.message_buffered = lambda: False
+    t0 = time()
+    count = sum(1 for _ in run(connection, u"UNWIND range(1, $n) AS x RETURN x", {u"n": RECORDS}))
+    t = time() - t0
+    assert count == RECORDS
+    connection.close()
+    server.close()
+    return RECORDS / t
+
+
+def main():
+    print("%-6s  %12s  %12s" % ("rows", "single rec/s", "batch rec/s"))
+    for name, row in SAMPLES:
+        # Alternate between the two, to even out any drift in machine load, and report the medians
+        single, batch = [], []
+        for _ in range(RUNS):
+            single.append(records_per_second(row, False))
+            batch.append(records_per_second(row, True))
+        print("%-6s  %12.0f  %12.0f" % (name, sorted(single)[RUNS // 2], sorted(batch)[RUNS // 2]))
+
+
+if __name__ == "__main__":
+    main()
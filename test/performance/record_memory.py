@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+# Copyright (c) 2002-2016 "Neo Technology,"
+# Network Engine for Objects in Lund AB [http://neotechnology.com]
+#
+# This file is part of Neo4j.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmark for the memory held by each record of a result, once decoded
+from RECORD messages and wrapped as it would be by a `StatementResult`,
+for both the pure Python decoder and the C accelerator (if built).
+Requires Python 3.4 or later, for `tracemalloc`.
+
+Usage:   python -m test.performance.record_memory
+"""
+
+from __future__ import print_function
+
+import tracemalloc
+
+from neo4j.v1 import packstream
+from neo4j.v1.packstream import Unpacker, StringCache, packb
+from neo4j.v1.session import Record
+from neo4j.v1.types import hydration_functions
+
+
+COUNT = 10000
+
+KEYS = (u"a", u"b", u"c")
+
+SAMPLES = [
+    ("scalars", [1, 3.14159, u"hello"]),
+    ("collections", [[1, 2, 3], {u"name": u"Alice", u"age": 33}, []]),
+    ("nodes", [(b"N", (i, [u"Person"], {u"name": u"Alice"})) for i in range(3)]),
+    ("structures", [(b"X", (i, u"unknown")) for i in range(3)]),
+]
+
+
+def bytes_per_record(data):
+    """ Return the memory allocated per record while decoding `data`.
+    """
+    unpacker = Unpacker(hydration_functions=hydration_functions, string_cache=StringCache())
+    tracemalloc.start()
+    records = [Record(KEYS, fields[0]) for _, fields in unpacker.unpack_from(data)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del records
+    return size / COUNT
+
+
+def main():
+    accelerator = packstream._packstream
+    print("%-12s  %12s  %12s" % ("record", "python bytes", "c bytes"))
+    for name, values in SAMPLES:
+        data = packb(*[(b"q", (values,))] * COUNT)
+        packstream._packstream = None
+        python_size = bytes_per_record(data)
+        if accelerator:
+            packstream._packstream = accelerator
+            c_size = "%12.0f" % bytes_per_record(data)
+        else:
+            c_size = "%12s" % "n/a"
+        print("%-12s  %12.0f  %s" % (name, python_size, c_size))
+    packstream._packstream = accelerator
+
+
+if __name__ == "__main__":
+    main()
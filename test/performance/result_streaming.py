@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+# Copyright (c) 2002-2016 "Neo Technology,"
+# Network Engine for Objects in Lund AB [http://neotechnology.com]
+#
+# This file is part of Neo4j.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmark for the throughput of receiving result streams made up of full
+64 KB chunks, in MB/s of chunked input, both for reading the chunks alone
+and for decoding them into records as they arrive. The receive buffer of
+`ChunkChannel` is compared with a channel that appends each `recv` to a
+byte string and slices the chunks from it. Chunks are sent through a
+local socket pair by a separate thread.
+
+Usage:   python -m test.performance.result_streaming
+"""
+
+from __future__ import print_function
+
+from select import select
+from socket import socketpair
+from struct import pack as struct_pack, unpack_from as struct_unpack_from
+from threading import Thread
+from time import time
+
+from neo4j.v1.bolt import ChunkChannel
+from neo4j.v1.packstream import Unpacker, packb
+
+
+#: Number of records in each stream, each filling four full chunks.
+RECORDS = 200
+
+
+def result_stream():
+    """ Return a chunked stream of RECORD messages, each split into full
+    64 KB chunks.
+    """
+    max_chunk_size = ChunkChannel.max_chunk_size
+    message = packb((b"\x71", ([u"X" * (max_chunk_size - 8)] * 4,)))
+    data = []
+    for i in range(0, len(message), max_chunk_size):
+        chunk = message[i:i + max_chunk_size]
+        data.append(struct_pack(">H", len(chunk)) + chunk)
+    data.append(b"\x00\x00")
+    return b"".join(data) * RECORDS
+
+
+class CopyingChunkChannel(ChunkChannel):
+    """ Chunk reader that appends each `recv` to a byte string and slices
+    the chunks from it.
+    """
+
+    def __init__(self, sock):
+        super(CopyingChunkChannel, self).__init__(sock)
+        self._recv_buffer = b""
+
+    def _recv(self, size):
+        remaining = size - len(self._recv_buffer)
+        while remaining > 0:
+            b = self.socket.recv(8192)
+            remaining -= len(b)
+            self._recv_buffer += b
+            if remaining > 0:
+                ready_to_read, _, _ = select((self.socket,), (), (), 0)
+                while not ready_to_read:
+                    ready_to_read, _, _ = select((self.socket,), (), (), 0)
+        data, self._recv_buffer = self._recv_buffer[:size], self._recv_buffer[size:]
+        return data
+
+    def chunk_reader(self):
+        chunk_size = -1
+        while chunk_size != 0:
+            chunk_header = self._recv(2)
+            chunk_size, = struct_unpack_from(">H", chunk_header)
+            if chunk_size > 0:
+                yield self._recv(chunk_size)
+
+
+def throughput(channel_class, decode, data, repeat=5):
+    """ Return the best observed throughput, in MB/s of chunked input.
+    """
+    best = None
+    for _ in range(repeat):
+        client, server = socketpair()
+        thread = Thread(target=server.sendall, args=(data,))
+        thread.daemon = True
+        channel = channel_class(client)
+        unpacker = Unpacker()
+        t0 = time()
+        thread.start()
+        for _ in range(RECORDS):
+            for chunk in channel.chunk_reader():
+                if decode:
+                    unpacker.feed(chunk)
+            if decode:
+                unpacker.end()
+        t = time() - t0
+        thread.join()
+        client.close()
+        server.close()
+        if best is None or t < best:
+            best = t
+    return len(data) / best / 1e6
+
+
+def main():
+    data = result_stream()
+    print("%-8s  %11s  %11s" % ("stage", "copy MB/s", "buffer MB/s"))
+    for stage, decode in [("read", False), ("decode", True)]:
+        print("%-8s  %11.1f  %11.1f" % (stage, throughput(CopyingChunkChannel, decode, data),
+                                        throughput(ChunkChannel, decode, data)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+# Copyright (c) 2002-2016 "Neo Technology,"
+# Network Engine for Objects in Lund AB [http://neotechnology.com]
+#
+# This file is part of Neo4j.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmark for the client overhead of running tiny queries, in
+microseconds per call of `Session.run` followed by reading its single
+record. The responses of a stub server are held in the buffers of a
+local socket pair before timing begins, so that only the work of the
+client is measured.
+
+Usage:   python -m test.performance.tiny_queries
+"""
+
+from __future__ import print_function
+
+from socket import socketpair, SOL_SOCKET, SO_RCVBUF, SO_SNDBUF
+from time import time
+
+from neo4j.v1.bolt import Connection
+from neo4j.v1.session import Session
+
+from test.util import chunked
+
+
+#: Number of queries run each time.
+QUERIES = 10000
+
+#: Number of times the queries are run, for each sample.
+RUNS = 15
+
+SAMPLES = [
+    ("no params", u"RETURN 1", None),
+    ("params", u"MATCH (a:Person {id: $id}) RETURN a.name", {u"id": 1234}),
+]
+
+
+def microseconds_per_query(statement, parameters):
+    client, server = socketpair()
+    # Hold every request and response in the socket buffers
+    for sock in (client, server):
+        sock.setsockopt(SOL_SOCKET, SO_SNDBUF, 1 << 24)
+        sock.setsockopt(SOL_SOCKET, SO_RCVBUF, 1 << 24)
+    response = chunked((b"\x70", ({u"fields": [u"x"]},)), (b"\x71", ([1],)), (b"\x70", ({},)))
+    server.sendall(chunked((b"\x70", ({},))) + response * QUERIES)
+    session = Session(None, Connection(client))
+    t0 = time()
+    for _ in range(QUERIES):
+        session.run(statement, parameters).single()
+    t = time() - t0
+    client.close()
+    server.close()
+    return t / QUERIES * 1e6
+
+
+def main():
+    print("%-10s  %8s" % ("query", "us/call"))
+    for name, statement, parameters in SAMPLES:
+        # Report the median, as timings vary between runs
+        times = sorted(microseconds_per_query(statement, parameters) for _ in range(RUNS))
+        print("%-10s  %8.1f" % (name, times[RUNS // 2]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,655 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+# Copyright (c) 2002-2016 "Neo Technology,"
+# Network Engine for Objects in Lund AB [http://neotechnology.com]
+#
+# This file is part of Neo4j.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from array import array
+from io import StringIO
+import logging
+from os import times
+import socket as socket_module
+from socket import (socket, socketpair, timeout as SocketTimeout, AF_INET, IPPROTO_TCP, SOL_SOCKET, SO_KEEPALIVE,
+                    SO_RCVBUF, SO_SNDBUF, SOCK_STREAM, TCP_NODELAY)
+from threading import Thread
+from time import sleep
+from unittest import TestCase, skipIf, skipUnless
+
+from neo4j.util import Watcher
+from neo4j.v1 import bolt, packstream
+from neo4j.v1.bolt import ChunkChannel, Connection, Response, connect
+from neo4j.v1.exceptions import CypherError, ProtocolError, ResultError, ServiceTimeout, SizeLimitError
+from neo4j.v1.packstream import BytesView, Packer, packb
+from neo4j.v1.session import queue, run
+
+from test.util import chunked
+
+
+class RecordingSocket(object):
+    """ Socket stand-in that records everything sent.
+    """
+
+    def __init__(self):
+        self.sent = []
+
+    def sendall(self, data):
+        self.sent.append(bytes(data))
+
+
+class ScatterGatherSocket(RecordingSocket):
+    """ Socket stand-in that records every segment passed to `sendmsg`,
+    sending no more than `limit` bytes per call.
+    """
+
+    def __init__(self, limit=None):
+        super(ScatterGatherSocket, self).__init__()
+        self.limit = limit
+        self.segments = []
+
+    def sendmsg(self, buffers):
+        data = b"".join(buffers)[:self.limit]
+        self.segments.extend(buffers)
+        self.sent.append(data)
+        return len(data)
+
+
+def scripted_socket(test_case, data):
+    """ Return a socket connected to a server end that sends the data
+    given.
+    """
+    client, server = socketpair()
+    test_case.addCleanup(server.close)
+    test_case.addCleanup(client.close)
+    thread = Thread(target=server.sendall, args=(data,))
+    thread.daemon = True
+    thread.start()
+    return client
+
+
+def delayed_socket(test_case, data, delay):
+    """ Return a socket connected to a server end that sends the first
+    byte of the data given, then waits for `delay` seconds before sending
+    the rest.
+    """
+    client, server = socketpair()
+    test_case.addCleanup(server.close)
+    test_case.addCleanup(client.close)
+
+    def respond():
+        server.sendall(data[:1])
+        sleep(delay)
+        server.sendall(data[1:])
+
+    thread = Thread(target=respond)
+    thread.daemon = True
+    thread.start()
+    return client
+
+
+def cpu_time():
+    """ Return the CPU time used by this process so far, in seconds.
+    """
+    user, system = times()[:2]
+    return user + system
+
+
+def scripted_connection(test_case, *messages, **config):
+    """ Return a connection to a server end that acknowledges INIT and
+    then sends the messages given.
+    """
+    return Connection(scripted_socket(test_case, chunked((b"\x70", ({},)), *messages)), **config)
+
+
+def buffered_connection(test_case, data, **config):
+    """ Return a connection to a server end that has already sent an
+    acknowledgement of INIT followed by the data given.
+    """
+    client, server = socketpair()
+    test_case.addCleanup(server.close)
+    test_case.addCleanup(client.close)
+    server.sendall(chunked((b"\x70", ({},))) + data)
+    return Connection(client, **config), server
+
+
+class RecordingResponse(Response):
+
+    def __init__(self, connection):
+        super(RecordingResponse, self).__init__(connection)
+        self.records = []
+
+    def on_record(self, values):
+        self.records.append(values)
+
+
+class ChunkChannelTestCase(TestCase):
+
+    def test_small_message_is_held_until_sent(self):
+        sock = RecordingSocket()
+        channel = ChunkChannel(sock)
+        channel.write(b"\x01\x02\x03")
+        channel.flush(end_of_message=True)
+        assert sock.sent == []
+        channel.send()
+        assert sock.sent == [b"\x00\x03\x01\x02\x03\x00\x00"]
+
+    def test_full_chunks_are_sent_immediately(self):
+        sock = RecordingSocket()
+        channel = ChunkChannel(sock)
+        channel.write(b"X" * 150000)
+        assert len(sock.sent) == 2
+        for data in sock.sent:
+            assert data == b"\xFF\xFF" + b"X" * 65535
+        channel.flush(end_of_message=True)
+        channel.send()
+        assert sock.sent[2] == b"\x49\xF2" + b"X" * 18930 + b"\x00\x00"
+
+    def test_streamed_parameter_is_sent_as_it_is_packed(self):
+        sock = RecordingSocket()
+        channel = ChunkChannel(sock)
+        packer = Packer(channel)
+        sent_while_packing = []
+
+        def rows():
+            for i in range(20000):
+                sent_while_packing.append(len(sock.sent))
+                yield u"row %d" % i
+
+        packer.pack(rows())
+        assert sent_while_packing[0] == 0
+        assert sent_while_packing[-1] > 0
+
+    def test_large_bytes_are_sent_without_copying(self):
+        sock = ScatterGatherSocket()
+        channel = ChunkChannel(sock)
+        data = bytes(bytearray(range(256))) * 1000
+        Packer(channel).pack({u"data": data})
+        channel.flush(end_of_message=True)
+        channel.send()
+        assert b"".join(sock.sent) == chunked({u"data": data})
+        views = [segment for segment in sock.segments if isinstance(segment, memoryview) and segment.obj is data]
+        assert sum(map(len, views)) == len(data)
+
+    def test_memoryview_is_sent_as_bytes(self):
+        sock = ScatterGatherSocket()
+        channel = ChunkChannel(sock)
+        Packer(channel).pack(memoryview(array("i", range(10000))))
+        channel.flush(end_of_message=True)
+        channel.send()
+        assert b"".join(sock.sent) == chunked(array("i", range(10000)).tobytes())
+
+    def test_output_buffer_is_reused(self):
+        sock = RecordingSocket()
+        channel = ChunkChannel(sock)
+        output = channel.output
+        for i in range(3):
+            channel.write(b"\x01\x02\x03")
+            channel.flush(end_of_message=True)
+            channel.send()
+        assert sock.sent == [b"\x00\x03\x01\x02\x03\x00\x00"] * 3
+        assert channel.output is output
+
+    def test_output_buffer_grows(self):
+        sock = RecordingSocket()
+        channel = ChunkChannel(sock)
+        for i in range(5000):
+            channel.write(b"\x01\x02\x03")
+        channel.flush(end_of_message=True)
+        channel.send()
+        assert sock.sent == [b"\x3A\x98" + b"\x01\x02\x03" * 5000 + b"\x00\x00"]
+
+    def test_partial_sends_are_resumed(self):
+        sock = ScatterGatherSocket(limit=1000)
+        channel = ChunkChannel(sock)
+        data = bytes(bytearray(range(256))) * 1000
+        Packer(channel).pack([data, u"A" * 100, data])
+        channel.flush(end_of_message=True)
+        channel.send()
+        assert b"".join(sock.sent) == chunked([data, u"A" * 100, data])
+
+    def test_chunks_are_read_into_reused_buffer(self):
+        messages = [u"A" * size for size in (10, 100000, 20, 70000, 65533, 30)] * 3
+        channel = ChunkChannel(scripted_socket(self, chunked(*messages)), read_size=131072, max_read_size=131072)
+        received = channel.input
+        for message in messages:
+            data = b"".join(bytes(chunk) for chunk in channel.chunk_reader())
+            assert data == packb(message)
+        assert channel.input is received
+        assert channel.input_start == channel.input_end
+
+    def test_read_size_grows_while_large_messages_stream(self):
+        messages = [u"A" * 100000] * 5
+        channel = ChunkChannel(scripted_socket(self, chunked(*messages)), read_size=1024, max_read_size=65536)
+        for message in messages:
+            data = b"".join(bytes(chunk) for chunk in channel.chunk_reader())
+            assert data == packb(message)
+        assert len(channel.input) == 65536
+
+    def test_read_size_is_kept_for_small_messages(self):
+        messages = [u"A" * 10] * 20
+        channel = ChunkChannel(scripted_socket(self, chunked(*messages)), read_size=1024, max_read_size=65536)
+        for message in messages:
+            data = b"".join(bytes(chunk) for chunk in channel.chunk_reader())
+            assert data == packb(message)
+        assert len(channel.input) == 1024
+
+    def test_closed_connection_is_detected_when_reading(self):
+        client, server = socketpair()
+        self.addCleanup(client.close)
+        server.sendall(b"\x00\x03\x01")
+        server.close()
+        channel = ChunkChannel(client)
+        with self.assertRaises(ProtocolError):
+            list(channel.chunk_reader())
+
+    def test_waiting_for_data_uses_no_cpu(self):
+        channel = ChunkChannel(delayed_socket(self, chunked(u"done"), delay=0.5))
+        cpu_time_before = cpu_time()
+        data = b"".join(bytes(chunk) for chunk in channel.chunk_reader())
+        assert data == packb(u"done")
+        assert cpu_time() - cpu_time_before < 0.1
+
+
+class ConnectionTestCase(TestCase):
+
+    def test_message_spanning_several_chunks(self):
+        values = [u"A" * 100000, list(range(30000)), {u"B": b"\x00" * 70000}]
+        connection = scripted_connection(self, (b"\x71", (values,)), (b"\x70", ({},)))
+        response = RecordingResponse(connection)
+        connection.responses.append(response)
+        connection.fetch_all()
+        assert response.records == [values]
+        assert not connection.unpacker.buffer
+
+    def test_all_messages_received_are_fetched_together(self):
+        records = [(b"\x71", ([i, u"Alice"],)) for i in range(100)]
+        connection, _ = buffered_connection(self, chunked((b"\x70", ({},)), *(records + [(b"\x70", ({},))])))
+        header = RecordingResponse(connection)
+        body = RecordingResponse(connection)
+        connection.responses.extend([header, body])
+        connection.fetch()
+        assert header.complete
+        assert body.complete
+        assert body.records == [[i, u"Alice"] for i in range(100)]
+
+    def test_consecutive_records_are_handled_together(self):
+        records = [(b"\x71", ([i],)) for i in range(100)]
+        connection, _ = buffered_connection(self, chunked(*(records + [(b"\x70", ({u"done": True},))])))
+        response = Response(connection)
+        batches = []
+        summaries = []
+        response.on_records = batches.append
+        response.on_success = summaries.append
+        connection.responses.append(response)
+        connection.fetch()
+        assert batches == [[[i] for i in range(100)]]
+        assert summaries == [{u"done": True}]
+
+    def test_handlers_are_indexed_by_signature(self):
+        response = Response(None)
+        assert response.handlers[b"\x71"] == response.on_records
+        assert response.handlers[b"\x70"] == response.on_success
+        assert response.handlers[b"\x7E"] == response.on_ignored
+        assert response.handlers[b"\x7F"] == response.on_failure
+
+    def test_fetch_stops_at_a_partly_received_message(self):
+        data = chunked((b"\x70", ({},)), (b"\x71", ([u"A" * 100],)), (b"\x70", ({},)))
+        header_size = len(chunked((b"\x70", ({},))))
+        connection, server = buffered_connection(self, data[:header_size + 50])
+        header = RecordingResponse(connection)
+        body = RecordingResponse(connection)
+        connection.responses.extend([header, body])
+        connection.fetch()
+        assert header.complete
+        assert body.records == []
+        server.sendall(data[header_size + 50:])
+        connection.fetch()
+        assert body.records == [[u"A" * 100]]
+        assert body.complete
+
+    def test_run_and_pull_all_are_appended_together(self):
+        connection, server = buffered_connection(self, b"")
+        init = chunked((b"\x01", (connection.user_agent, {})))
+        connection.append_run(u"RETURN $x", {u"x": 1}, Response(connection), Response(connection))
+        connection.send()
+        expected = init + chunked((b"\x10", (u"RETURN $x", {u"x": 1})), (b"\x3F", ()))
+        received = b""
+        while len(received) < len(expected):
+            received += server.recv(65536)
+        assert received == expected
+        assert len(connection.responses) == 2
+
+    def test_statements_and_keys_are_cached_in_packed_form_without_the_accelerator(self):
+        self.addCleanup(setattr, packstream, "_packstream", packstream._packstream)
+        packstream._packstream = None
+        connection, server = buffered_connection(self, b"")
+        init = chunked((b"\x01", (connection.user_agent, {})))
+        for value in [u"A", u"B"]:
+            connection.append_run(u"RETURN $x", {u"x": value}, Response(connection), Response(connection))
+        connection.send()
+        expected = init + chunked((b"\x10", (u"RETURN $x", {u"x": u"A"})), (b"\x3F", ()),
+                                  (b"\x10", (u"RETURN $x", {u"x": u"B"})), (b"\x3F", ()))
+        received = b""
+        while len(received) < len(expected):
+            received += server.recv(65536)
+        assert received == expected
+        cache = connection.packer.string_cache
+        assert set(cache.packed_strings) == {u"RETURN $x", u"x"}
+        assert cache.hits == 2
+
+    @skipUnless(packstream._packstream, "C accelerator not built")
+    def test_no_packed_strings_are_cached_with_the_accelerator(self):
+        connection, _ = buffered_connection(self, b"")
+        assert connection.packer.string_cache is None
+
+    def test_run_and_discard_all_are_appended_together(self):
+        connection, server = buffered_connection(self, b"")
+        init = chunked((b"\x01", (connection.user_agent, {})))
+        connection.append_run(u"CREATE (a)", {}, Response(connection), Response(connection), discard=True)
+        connection.send()
+        expected = init + chunked((b"\x10", (u"CREATE (a)", {})), (b"\x2F", ()))
+        received = b""
+        while len(received) < len(expected):
+            received += server.recv(65536)
+        assert received == expected
+
+    @skipIf(bytes is str, "Byte strings are text in Python 2")
+    def test_bytes_parameters_are_sent_as_bytes(self):
+        connection, server = buffered_connection(self, b"")
+        init = chunked((b"\x01", (connection.user_agent, {})))
+        image = b"\x89PNG\xff\x00"
+        large = bytes(bytearray(range(256))) * 80
+        run(connection, u"CREATE (a {image: $image, data: $data})", {u"image": image, u"data": large})
+        expected = init + chunked((b"\x10", (u"CREATE (a {image: $image, data: $data})",
+                                             {u"image": image, u"data": large})), (b"\x3F", ()))
+        received = b""
+        while len(received) < len(expected):
+            received += server.recv(65536)
+        assert received == expected
+        assert b"\xCC\x06" + image in received
+        assert b"\xCD\x50\x00" + large[:100] in received
+
+    def test_discarded_records_are_not_decoded(self):
+        # Neither record could be decoded, as 0xC7 is not a valid marker
+        single_chunk = b"\x00\x03\xB1\x71\xC7\x00\x00"
+        several_chunks = b"\x00\x02\xB1\x71\x00\x01\xC7\x00\x00"
+        data = single_chunk + several_chunks + chunked((b"\x70", ({u"done": True},)))
+        connection, _ = buffered_connection(self, data)
+        response = RecordingResponse(connection)
+        response.discard_records = True
+        summaries = []
+        response.on_success = summaries.append
+        connection.responses.append(response)
+        connection.fetch_all()
+        assert response.records == []
+        assert summaries == [{u"done": True}]
+        assert not connection.defunct
+
+    def test_records_of_released_results_are_not_decoded(self):
+        records = b"\x00\x03\xB1\x71\xC7\x00\x00" * 3
+        data = chunked((b"\x70", ({u"fields": [u"x"]},))) + records + chunked((b"\x70", ({},)))
+        connection, _ = buffered_connection(self, data)
+        run(connection, u"UNWIND range(1, 3) AS x RETURN x")
+        connection.fetch_all()
+        assert not connection.responses
+        assert not connection.defunct
+
+    def test_consumed_result_skips_remaining_records(self):
+        connection, server = buffered_connection(self, chunked((b"\x70", ({u"fields": [u"x"]},))))
+        result = run(connection, u"UNWIND range(1, 3) AS x RETURN x")
+        assert result.keys() == (u"x",)
+        server.sendall(b"\x00\x03\xB1\x71\xC7\x00\x00" * 3 + chunked((b"\x70", ({},))))
+        summary = result.consume()
+        assert summary.statement == u"UNWIND range(1, 3) AS x RETURN x"
+        assert list(result) == []
+        assert not connection.defunct
+
+    def test_only_statements_after_a_failure_are_reported_as_not_run(self):
+        failure = {u"code": u"Neo.ClientError.Statement.SyntaxError", u"message": u"Invalid input"}
+        data = (chunked((b"\x7F", (failure,))) + chunked((b"\x7E", ())) * 3 +
+                chunked((b"\x70", ({},))))
+        connection, _ = buffered_connection(self, data)
+        failed = queue(connection, u"X")
+        ignored = run(connection, u"RETURN 1")
+        with self.assertRaises(CypherError):
+            failed.consume()
+        assert failed.consume() is None
+        assert list(failed) == []
+        with self.assertRaises(ResultError):
+            ignored.consume()
+        assert not connection.defunct
+
+    def test_queued_messages_are_sent_before_fetching(self):
+        connection, server = buffered_connection(self, chunked((b"\x70", ({},))))
+        response = RecordingResponse(connection)
+        connection.append(b"\x0F", response=response)
+        connection.fetch()
+        assert response.complete
+        init = chunked((b"\x01", (connection.user_agent, {})))
+        expected = init + chunked((b"\x0F", ()))
+        received = b""
+        while len(received) < len(expected):
+            received += server.recv(65536)
+        assert received == expected
+
+    def test_send_timeout_partway_through_a_message_leaves_connection_defunct(self):
+        connection, _ = buffered_connection(self, b"")
+        connection.channel.socket.settimeout(0.2)
+        with self.assertRaises(ServiceTimeout):
+            run(connection, u"RETURN $x", {u"x": u"A" * 5000000})
+        assert connection.defunct
+        assert connection.closed
+        assert not connection.healthy
+
+    def test_failure_partway_through_a_streamed_parameter_leaves_connection_defunct(self):
+        connection, _ = buffered_connection(self, b"")
+
+        def rows():
+            for i in range(20000):
+                yield u"row %d" % i
+            raise RuntimeError("No more rows")
+
+        with self.assertRaises(RuntimeError):
+            run(connection, u"UNWIND $rows AS row RETURN row", {u"rows": rows()})
+        assert connection.defunct
+        assert connection.closed
+
+    def test_failure_before_anything_is_sent_discards_the_message(self):
+        connection, server = buffered_connection(self, b"")
+        init = chunked((b"\x01", (connection.user_agent, {})))
+        with self.assertRaises(ValueError):
+            connection.append_run(u"RETURN $x", {u"x": [1, object()]}, Response(connection), Response(connection))
+        assert connection.healthy
+        assert not connection.responses
+        connection.append_run(u"RETURN $x", {u"x": 1}, Response(connection), Response(connection))
+        connection.send()
+        expected = init + chunked((b"\x10", (u"RETURN $x", {u"x": 1})), (b"\x3F", ()))
+        received = b""
+        while len(received) < len(expected):
+            received += server.recv(65536)
+        assert received == expected
+
+    def test_corrupt_message_leaves_connection_defunct(self):
+        # 0xC7 is not a valid marker, and the message continues in a second chunk
+        corrupt = b"\x00\x03\xB1\x71\xC7\x00\x02\x91\x01\x00\x00"
+        connection, _ = buffered_connection(self, corrupt + chunked((b"\x70", ({},))))
+        connection.responses.append(RecordingResponse(connection))
+        with self.assertRaises(ValueError):
+            connection.fetch()
+        assert connection.defunct
+        assert connection.closed
+        with self.assertRaises(ProtocolError):
+            connection.fetch()
+
+    def test_large_message_is_rejected(self):
+        connection = scripted_connection(self, (b"\x71", ([u"A" * 100000],)), max_message_size=70000)
+        connection.responses.append(RecordingResponse(connection))
+        with self.assertRaises(SizeLimitError):
+            connection.fetch()
+        assert connection.defunct
+        assert connection.closed
+
+    def test_large_value_is_rejected(self):
+        connection = scripted_connection(self, (b"\x71", ([u"A" * 1001],)), max_value_size=1000)
+        connection.responses.append(RecordingResponse(connection))
+        with self.assertRaises(SizeLimitError):
+            connection.fetch()
+        assert connection.defunct
+
+    def test_large_bytes_are_received_as_views(self):
+        data = bytes(bytearray(range(256))) * 1000
+        connection = scripted_connection(self, (b"\x71", ([data, b"small"],)), (b"\x70", ({},)),
+                                         lazy_bytes_size=1000)
+        response = RecordingResponse(connection)
+        connection.responses.append(response)
+        connection.fetch_all()
+        [[view, small]] = response.records
+        assert isinstance(view, BytesView)
+        assert view.read() == data
+        assert small == b"small"
+
+
+class ConnectTestCase(TestCase):
+
+    def stub_server(self, delay=0):
+        """ Start a server that accepts one connection and, after waiting
+        for `delay` seconds, agrees to version 1 and acknowledges INIT,
+        returning its address.
+        """
+        listener = socket()
+        self.addCleanup(listener.close)
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(1)
+
+        def serve():
+            server, _ = listener.accept()
+            self.addCleanup(server.close)
+            server.recv(20)
+            sleep(delay)
+            server.sendall(b"\x00\x00\x00\x01" + chunked((b"\x70", ({},))))
+
+        thread = Thread(target=serve)
+        thread.daemon = True
+        thread.start()
+        return listener.getsockname()
+
+    def test_waiting_for_handshake_uses_no_cpu(self):
+        address = self.stub_server(delay=0.5)
+        cpu_time_before = cpu_time()
+        connection = connect(address)
+        self.addCleanup(connection.close)
+        assert cpu_time() - cpu_time_before < 0.1
+        assert connection.healthy
+
+    def test_handshake_timeout(self):
+        with self.assertRaises(ServiceTimeout):
+            connect(self.stub_server(delay=1), handshake_timeout=0.2)
+
+    def test_address_that_times_out_is_skipped(self):
+        address = self.stub_server()
+        unreachable = ("192.0.2.1", address[1])
+
+        class TimingOutSocket(socket):
+
+            def connect(self, address):
+                if address == unreachable:
+                    raise SocketTimeout("timed out")
+                super(TimingOutSocket, self).connect(address)
+
+        def getaddrinfo(host, port, family, socket_type):
+            return [(AF_INET, SOCK_STREAM, 0, "", unreachable), (AF_INET, SOCK_STREAM, 0, "", address)]
+
+        self.addCleanup(setattr, bolt, "getaddrinfo", bolt.getaddrinfo)
+        self.addCleanup(setattr, bolt, "socket", bolt.socket)
+        bolt.getaddrinfo = getaddrinfo
+        bolt.socket = TimingOutSocket
+        connection = connect(("localhost", address[1]), connection_timeout=0.2)
+        self.addCleanup(connection.close)
+        assert connection.healthy
+        bolt.getaddrinfo = lambda *args: getaddrinfo(*args)[:1]
+        with self.assertRaises(ServiceTimeout):
+            connect(("localhost", address[1]), connection_timeout=0.2)
+
+    def test_read_timeout_leaves_connection_defunct(self):
+        connection = connect(self.stub_server(), read_timeout=0.2)
+        self.addCleanup(connection.close)
+        connection.append(b"\x10", (u"RETURN 1", {}), response=RecordingResponse(connection))
+        connection.append(b"\x3F", (), response=RecordingResponse(connection))
+        connection.send()
+        with self.assertRaises(ServiceTimeout):
+            connection.fetch()
+        assert connection.defunct
+        assert connection.closed
+        assert not connection.healthy
+
+    def test_default_socket_options(self):
+        connection = connect(self.stub_server())
+        self.addCleanup(connection.close)
+        sock = connection.channel.socket
+        assert sock.getsockopt(IPPROTO_TCP, TCP_NODELAY)
+
+    def test_configured_socket_options(self):
+        connection = connect(self.stub_server(), tcp_nodelay=False, keep_alive_idle=30,
+                             receive_buffer_size=32768, send_buffer_size=32768, read_size=4096)
+        self.addCleanup(connection.close)
+        sock = connection.channel.socket
+        assert not sock.getsockopt(IPPROTO_TCP, TCP_NODELAY)
+        assert sock.getsockopt(SOL_SOCKET, SO_KEEPALIVE)
+        assert sock.getsockopt(SOL_SOCKET, SO_RCVBUF) >= 32768
+        assert sock.getsockopt(SOL_SOCKET, SO_SNDBUF) >= 32768
+        if hasattr(socket_module, "TCP_KEEPIDLE"):
+            assert sock.getsockopt(IPPROTO_TCP, socket_module.TCP_KEEPIDLE) == 30
+        assert len(connection.channel.input) == 4096
+
+
+class LoggingTestCase(TestCase):
+
+    def set_log_level(self, level):
+        logger = logging.getLogger("neo4j.bolt")
+        self.addCleanup(logger.setLevel, logger.level)
+        logger.setLevel(level)
+
+    def test_nothing_is_formatted_when_logging_is_disabled(self):
+        formatted = []
+
+        def hex2(x):
+            formatted.append(x)
+            return "%02X" % x
+
+        self.addCleanup(setattr, bolt, "hex2", bolt.hex2)
+        bolt.hex2 = hex2
+        self.set_log_level(logging.WARNING)
+        connection = scripted_connection(self, (b"\x71", ([1, 2, 3],)), (b"\x70", ({},)))
+        response = RecordingResponse(connection)
+        connection.responses.append(response)
+        connection.fetch_all()
+        assert response.records == [[1, 2, 3]]
+        assert formatted == []
+
+    def test_messages_and_data_are_logged_when_enabled(self):
+        out = StringIO()
+        watcher = Watcher("neo4j.bolt")
+        self.addCleanup(watcher.stop)
+        self.set_log_level(logging.DEBUG)
+        watcher.watch(logging.DEBUG, out)
+        connection = scripted_connection(self, (b"\x71", ([1, 2, 3],)), (b"\x70", ({},)))
+        connection.responses.append(RecordingResponse(connection))
+        connection.fetch_all()
+        log = out.getvalue()
+        assert u"C: INIT " in log
+        assert u"S: RECORD [1, 2, 3]" in log
+        assert u"00:06:B1:71:93:01:02:03:00:00" in log
@@ -21,10 +21,28 @@
 
 import struct
 from collections import OrderedDict
+from datetime import date
+from decimal import Decimal
+from uuid import UUID
 from io import BytesIO
 from math import pi
-from unittest import TestCase
-from neo4j.v1.packstream import Packer, Unpacker, packb
+from fractions import Fraction
+from numbers import Number
+from unittest import TestCase, skipIf, skipUnless
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from neo4j.v1 import packstream
+from neo4j.v1.exceptions import SizeLimitError
+from neo4j.v1.packstream import Mapping
+from neo4j.v1.packstream import Packer, Unpacker, Structure, BytesView, PackedStringCache, StringCache, packb, \
+    unpackb, register_encoder, unregister_encoder, ARRAY_INT_64
+
+from test.util import PurePython
 
 
 def assert_packable(value, packed_value):
@@ -270,3 +288,549 @@ class PackStreamTestCase(TestCase):
 
     def test_tiny_struct(self):
         assert_packable((b"Z", (u"A", 1)), b"\xB2Z\x81A\x01")
+
+    def test_unpack_from_memoryview_with_offset(self):
+        data = memoryview(b"\x00\x00\x93\x01\x02\x03\x81A")
+        assert Unpacker().unpack_from(data, 2) == [[1, 2, 3], u"A"]
+
+    def test_reserved_markers_are_rejected(self):
+        for marker in [0xC4, 0xC5, 0xC6, 0xC7, 0xCF, 0xD3, 0xDE] + list(range(0xE0, 0xF0)):
+            with self.assertRaises(ValueError) as context:
+                list(unpackb(bytes(bytearray([marker]))))
+            assert str(context.exception) == "Unknown PackStream marker 0x%02X" % marker
+
+    def test_truncated_data_is_rejected(self):
+        for data in [b"\xC1\x00", b"\xD0\x28AAA", b"\x93\x01", b"\xA1\x81A"]:
+            with self.assertRaises(ValueError):
+                list(unpackb(data))
+
+    def test_unexpected_end_of_stream_is_rejected(self):
+        with self.assertRaises(ValueError):
+            list(unpackb(b"\x92\x01\xDF"))
+
+    def test_unsupported_type_nested_in_supported_types(self):
+        value = {u"A": [1, OrderedDict([(u"B", 2)])]}
+        assert_packable(value, b"\xA1\x81A\x92\x01\xA1\x81B\x02")
+
+    def test_unsupported_type(self):
+        with self.assertRaises(ValueError):
+            packb(object())
+
+    def test_integer_out_of_range(self):
+        with self.assertRaises(OverflowError):
+            packb(2 ** 64)
+
+    def test_struct_unpacks_as_structure(self):
+        value = next(unpackb(b"\xB2Z\x81A\x01"))
+        assert isinstance(value, Structure)
+        assert value.signature == b"Z"
+        assert tuple(value) == (b"Z", (u"A", 1))
+        assert value.fields == (u"A", 1)
+        assert not hasattr(value, "__dict__")
+
+    def test_structure_can_be_repacked(self):
+        assert_packable(Structure(b"Z", [u"A", 1]), b"\xB2Z\x81A\x01")
+
+
+class EncoderRegistryTestCase(TestCase):
+
+    def tearDown(self):
+        for cls in (Decimal, date, UUID, Number, float, bool):
+            unregister_encoder(cls)
+
+    def test_set_packs_as_list(self):
+        assert packb({1}) == b"\x91\x01"
+        assert packb(frozenset([1])) == b"\x91\x01"
+
+    def test_mapping_packs_as_map(self):
+
+        class Single(Mapping):
+
+            def __getitem__(self, key):
+                return 1
+
+            def __iter__(self):
+                return iter([u"A"])
+
+            def __len__(self):
+                return 1
+
+        assert packb(Single()) == b"\xA1\x81A\x01"
+
+    def test_sequence_packs_as_list(self):
+        assert packb(range(3)) == b"\x93\x00\x01\x02"
+
+    def test_registered_types(self):
+        register_encoder(Decimal, str)
+        register_encoder(date, date.isoformat)
+        register_encoder(UUID, str)
+        value = [Decimal("1.5"), date(2016, 1, 1), UUID(int=0)]
+        assert packb(value) == packb([u"1.5", u"2016-01-01", u"00000000-0000-0000-0000-000000000000"])
+
+    def test_registered_type_applies_to_subclasses(self):
+
+        class Pence(Decimal):
+            pass
+
+        register_encoder(Decimal, float)
+        assert packb({u"price": Pence("1.5")}) == packb({u"price": 1.5})
+
+    def test_registered_abstract_type(self):
+        register_encoder(Number, lambda value: 0)
+        assert packb(Fraction(1, 2)) == packb(0)
+
+    def test_registered_built_in_types(self):
+        register_encoder(float, str)
+        register_encoder(bool, int)
+        assert packb(1.5) == packb(u"1.5")
+        assert packb(True) == b"\x01"
+        assert packb([1.5, {u"a": False}]) == packb([u"1.5", {u"a": 0}])
+        unregister_encoder(float)
+        unregister_encoder(bool)
+        assert packb(1.5) == b"\xC1" + struct.pack(">d", 1.5)
+        assert packb(True) == b"\xC3"
+
+    def test_registration_can_be_removed(self):
+        register_encoder(Decimal, str)
+        unregister_encoder(Decimal)
+        with self.assertRaises(ValueError):
+            packb(Decimal("1.5"))
+
+
+class ListStreamTestCase(TestCase):
+
+    def test_generator_packs_as_list_stream(self):
+        assert packb(x for x in [1, 2, 3]) == b"\xD7\x01\x02\x03\xDF"
+
+    def test_nested_generator_packs_as_list_stream(self):
+        rows = ({u"A": x} for x in [1, 2])
+        assert packb({u"rows": rows}) == b"\xA1\x84rows\xD7\xA1\x81A\x01\xA1\x81A\x02\xDF"
+
+    def test_list_stream_can_be_unpacked(self):
+        assert next(unpackb(packb(iter([1, 2, 3])))) == [1, 2, 3]
+
+    def test_generator_can_be_counted_instead(self):
+        stream = BytesIO()
+        Packer(stream, list_streams=False).pack([x for x in [1, 2]] + [iter([3])])
+        assert stream.getvalue() == b"\x93\x01\x02\x91\x03"
+        stream = BytesIO()
+        Packer(stream, list_streams=False).pack(iter([iter([1]), 2]))
+        assert stream.getvalue() == b"\x92\x91\x01\x02"
+
+
+class NumericListTestCase(TestCase):
+
+    def test_float_list(self):
+        assert_packable([1.1] * 20, b"\xD4\x14" + b"\xC1\x3F\xF1\x99\x99\x99\x99\x99\x9A" * 20)
+
+    def test_tiny_integer_list(self):
+        assert_packable(list(range(-16, 128)), b"\xD4\x90" + struct.pack(">144b", *range(-16, 128)))
+
+    def test_integer_list_uses_narrowest_encoding_of_each_item(self):
+        for values in [[1] * 19 + [1000], [-100] * 19 + [5], [1] * 19 + [2 ** 40]]:
+            per_item = b"\xD4\x14" + b"".join(packb(value) for value in values)
+            assert packb(values) == per_item
+            assert packb(array(ARRAY_INT_64, values)) == per_item
+            assert next(unpackb(per_item)) == values
+        assert packb([-100] * 20) == b"\xD4\x14" + b"\xC8\x9C" * 20
+        assert packb([1000] * 20) == b"\xD4\x14" + b"\xC9\x03\xE8" * 20
+
+    def test_integer_list_overflow(self):
+        with self.assertRaises(OverflowError):
+            packb([1] * 19 + [2 ** 63])
+
+    def test_mixed_list(self):
+        assert_packable([1, 1.0] * 10, b"\xD4\x14" + b"\x01\xC1\x3F\xF0\x00\x00\x00\x00\x00\x00" * 10)
+
+    def test_float_array(self):
+        assert packb(array("d", [1.1] * 20)) == packb([1.1] * 20)
+        assert next(unpackb(packb(array("f", [0.5, 0.25])))) == [0.5, 0.25]
+
+    def test_integer_array(self):
+        assert next(unpackb(packb(array(ARRAY_INT_64, range(-500, 500))))) == list(range(-500, 500))
+        assert packb(array("b")) == b"\x90"
+
+    @skipUnless(numpy, "NumPy not installed")
+    def test_numpy_arrays(self):
+        assert packb(numpy.array([1.1] * 20)) == packb([1.1] * 20)
+        assert next(unpackb(packb(numpy.arange(4, dtype="float32")))) == [0.0, 1.0, 2.0, 3.0]
+        assert next(unpackb(packb(numpy.arange(-40000, 40000, 7)))) == list(range(-40000, 40000, 7))
+        assert next(unpackb(packb(numpy.zeros((2, 2), dtype="int8")))) == [[0, 0], [0, 0]]
+        assert packb(numpy.array([1] * 19 + [1000])) == packb([1] * 19 + [1000])
+        with self.assertRaises(OverflowError):
+            packb(numpy.array([2 ** 64 - 1], dtype="uint64"))
+
+    @skipUnless(numpy, "NumPy not installed")
+    def test_numpy_scalars(self):
+        assert packb(numpy.int64(1000)) == b"\xC9\x03\xE8"
+        assert packb(numpy.float32(0.5)) == packb(0.5)
+        assert packb(numpy.float64(0.5)) == packb(0.5)
+        assert packb(numpy.bool_(True)) == b"\xC3"
+
+
+class NumericListDecodingTestCase(TestCase):
+
+    def test_float_list_as_array(self):
+        value = Unpacker(numeric_lists="array").unpack_from(packb([0.5] * 20))[0]
+        assert value == array("d", [0.5] * 20)
+
+    def test_integer_lists_as_arrays(self):
+        unpacker = Unpacker(numeric_lists="array")
+        for values in [list(range(-16, 128)), [1000] * 20, [-2 ** 40] * 20, [-100] * 19 + [-20]]:
+            value = unpacker.unpack_from(packb(array(ARRAY_INT_64, values)))[0]
+            assert isinstance(value, array)
+            assert value.tolist() == values
+
+    def test_other_lists_stay_lists(self):
+        unpacker = Unpacker(numeric_lists="array")
+        for values in [[0.5] * 15, [1.0, 1] * 10, [u"A"] * 20]:
+            assert unpacker.unpack_from(packb(values)) == [values]
+        mixed_encodings = b"\xD4\x14" + b"\x01\xC9\x03\xE8" * 10
+        assert unpacker.unpack_from(mixed_encodings) == [[1, 1000] * 10]
+
+    def test_nested_list(self):
+        value = Unpacker(numeric_lists="array").unpack_from(packb({u"v": [1.5] * 20}))[0]
+        assert value == {u"v": array("d", [1.5] * 20)}
+
+    def test_lists_fed_in_pieces(self):
+        mixed_encodings = b"\xD4\x14" + b"\x01\xC9\x03\xE8" * 10
+        data = (packb([0.5] * 2000, [1.5] * 2000, array(ARRAY_INT_64, range(-16, 128)), [1000] * 20, [1.0, 1] * 10) +
+                mixed_encodings)
+        expected = Unpacker(numeric_lists="array").unpack_from(data)
+        assert [type(value) for value in expected] == [array] * 4 + [list] * 2
+        for size in [1, 7, 1000, 16384]:
+            unpacker = Unpacker(numeric_lists="array")
+            values = []
+            for i in range(0, len(data), size):
+                values.extend(unpacker.feed(data[i:i + size]))
+            unpacker.end()
+            assert values == expected
+            assert [type(value) for value in values] == [type(value) for value in expected]
+
+    def test_truncated_list(self):
+        with self.assertRaises(ValueError):
+            Unpacker(numeric_lists="array").unpack_from(packb([0.5] * 20)[:-1])
+
+    def test_can_be_switched_off(self):
+        unpacker = Unpacker(numeric_lists="array")
+        unpacker.numeric_lists = None
+        assert unpacker.unpack_from(packb([0.5] * 20)) == [[0.5] * 20]
+
+    def test_unknown_numeric_list_type(self):
+        with self.assertRaises(ValueError):
+            Unpacker(numeric_lists="tuple")
+
+    @skipUnless(numpy, "NumPy not installed")
+    def test_lists_as_numpy_arrays(self):
+        unpacker = Unpacker(numeric_lists="numpy")
+        value = unpacker.unpack_from(packb([0.5] * 20))[0]
+        assert value.dtype == numpy.float64 and value.tolist() == [0.5] * 20
+        value = unpacker.unpack_from(packb(array(ARRAY_INT_64, range(1000, 2000))))[0]
+        assert value.dtype == numpy.int64 and value.tolist() == list(range(1000, 2000))
+
+
+class PackedStringCacheTestCase(TestCase):
+
+    def test_repeated_strings_are_cached(self):
+        cache = PackedStringCache()
+        stream = BytesIO()
+        packer = Packer(stream, string_cache=cache)
+        for value in [u"RETURN 1", u"\u00e5" * 20, u"RETURN 1", u"RETURN 1"]:
+            packer.pack_cached_string(value)
+        assert stream.getvalue() == (b"\x88RETURN 1\xD0\x28" + u"\u00e5".encode("UTF-8") * 20 +
+                                     b"\x88RETURN 1\x88RETURN 1")
+        assert (cache.hits, cache.misses) == (2, 2)
+
+    def test_least_recently_used_string_is_evicted(self):
+        cache = PackedStringCache(max_size=2)
+        packer = Packer(BytesIO(), string_cache=cache)
+        packer.pack_cached_string(u"A")
+        packer.pack_cached_string(u"B")
+        packer.pack_cached_string(u"A")
+        packer.pack_cached_string(u"C")
+        assert list(cache.packed_strings) == [u"A", u"C"]
+        assert cache.packed_strings[u"A"] == b"\x81A"
+        assert (cache.hits, cache.misses) == (1, 3)
+        assert cache.hit_rate == 0.25
+
+    def test_map_keys_are_cached_but_values_are_not(self):
+        cache = PackedStringCache()
+        packer = Packer(BytesIO(), string_cache=cache)
+        for i in range(3):
+            packer.pack_map({u"name": u"Person %d" % i, u"email": u"person%d@example.com" % i})
+        assert packer.stream.getvalue() == packb(*[{u"name": u"Person %d" % i, u"email": u"person%d@example.com" % i}
+                                                   for i in range(3)])
+        assert set(cache.packed_strings) == {u"name", u"email"}
+        assert (cache.hits, cache.misses) == (4, 2)
+
+    def test_long_strings_are_not_cached(self):
+        cache = PackedStringCache(max_length=4)
+        packer = Packer(BytesIO(), string_cache=cache)
+        packer.pack_cached_string(u"ABCDE")
+        assert packer.stream.getvalue() == b"\x85ABCDE"
+        assert not cache.packed_strings
+
+    def test_cache_can_be_cleared(self):
+        cache = PackedStringCache()
+        Packer(BytesIO(), string_cache=cache).pack_cached_string(u"A")
+        cache.clear()
+        assert (len(cache.packed_strings), cache.hits, cache.misses) == (0, 0, 0)
+
+
+class StringCacheTestCase(TestCase):
+
+    def test_repeated_strings_are_shared(self):
+        cache = StringCache()
+        unpacker = Unpacker(string_cache=cache)
+        first, second = unpacker.unpack_from(packb({u"name": u"Alice"}, {u"name": u"Alice"}))
+        assert first == second == {u"name": u"Alice"}
+        assert list(first)[0] is list(second)[0]
+        assert first[u"name"] is second[u"name"]
+        assert (cache.hits, cache.misses) == (2, 2)
+        assert cache.hit_rate == 0.5
+
+    def test_long_strings_are_not_cached(self):
+        cache = StringCache(max_length=16)
+        values = [u"A" * 16, u"B" * 17, u"\u00e5" * 200, u"C" * 70000]
+        assert Unpacker(string_cache=cache).unpack_from(packb(*values)) == values
+        assert list(cache.strings.values()) == [u"A" * 16]
+        assert (cache.hits, cache.misses) == (0, 1)
+
+    def test_cache_is_bounded(self):
+        cache = StringCache(max_size=2)
+        Unpacker(string_cache=cache).unpack_from(packb(u"A", u"B", u"C"))
+        assert list(cache.strings.values()) == [u"C"]
+
+    def test_cache_can_be_cleared(self):
+        cache = StringCache()
+        Unpacker(string_cache=cache).unpack_from(packb(u"A", u"A"))
+        cache.clear()
+        assert (cache.strings, cache.hits, cache.misses) == ({}, 0, 0)
+
+    def test_truncated_string(self):
+        with self.assertRaises(ValueError):
+            Unpacker(string_cache=StringCache()).unpack_from(b"\x85ABC")
+
+
+class IncrementalUnpackingTestCase(TestCase):
+
+    def test_values_fed_in_pieces(self):
+        data = packb(u"A" * 300,
+                     {u"k%d" % i: [1.5, u"\u00e5" * 50, None, True, 2 ** 40] for i in range(20)},
+                     (b"Z", (1, [u"A"], {u"a": 1})),
+                     [[], {}, [[]]],
+                     bytearray(b"\x01" * 1000),
+                     iter([1, iter([2]), {u"a": iter([])}]))
+        expected = Unpacker().unpack_from(data)
+        for size in [1, 2, 3, 7, 64, 1000, len(data)]:
+            unpacker = Unpacker()
+            values = []
+            for i in range(0, len(data), size):
+                values.extend(unpacker.feed(data[i:i + size]))
+            unpacker.end()
+            assert values == expected
+
+    def test_values_are_returned_once_complete(self):
+        unpacker = Unpacker()
+        assert unpacker.feed(b"\x01\x92\x81") == [1]
+        assert unpacker.feed(b"A") == []
+        assert unpacker.feed(b"\x93\x01") == []
+        assert unpacker.feed(b"\x02\x03\xC0") == [[u"A", [1, 2, 3]], None]
+
+    def test_decoded_data_is_released(self):
+        unpacker = Unpacker()
+        data = packb([u"A" * 100] * 1000)
+        for i in range(0, len(data), 500):
+            unpacker.feed(data[i:i + 500])
+            assert len(unpacker.buffer) < 1000
+        unpacker.end()
+
+    def test_incomplete_strings_and_bytes_are_decoded_once_complete(self):
+        data = packb([u"å" * 5000, bytearray(10000)])
+        unpacker = Unpacker()
+        decode_one = unpacker.decode_one
+        decoded = []
+        unpacker.decode_one = lambda data, offset: decoded.append(data[offset]) or decode_one(data, offset)
+        values = []
+        for i in range(0, len(data), 100):
+            values.extend(unpacker.feed(data[i:i + 100]))
+        unpacker.end()
+        assert values == [[u"å" * 5000, b"\x00" * 10000]]
+        assert decoded.count(0xD1) == 1
+        assert decoded.count(0xCD) == 1
+
+    def test_structures_are_hydrated(self):
+        unpacker = Unpacker(hydration_functions={b"Z": lambda *fields: sum(fields)})
+        assert unpacker.feed(b"\xB3Z\x01\x02") == []
+        assert unpacker.feed(b"\x03") == [6]
+
+    def test_incomplete_value_is_rejected_at_end(self):
+        for data in [b"\x93\x01", b"\xD0\x28AAA", b"\xD7\x01", b"\xB1"]:
+            unpacker = Unpacker()
+            unpacker.feed(data)
+            with self.assertRaises(ValueError):
+                unpacker.end()
+            assert unpacker.feed(b"\x01") == [1]
+
+    def test_unexpected_end_of_stream_is_rejected(self):
+        for data in [b"\xDF", b"\x91\xDF", b"\xDB\x81A\xDF"]:
+            with self.assertRaises(ValueError):
+                Unpacker().feed(data)
+
+
+class SizeLimitTestCase(TestCase):
+
+    def test_values_within_limits(self):
+        unpacker = Unpacker(max_value_size=10, max_collection_size=3)
+        values = [u"A" * 10, bytearray(10), [1, [2, 3], 4], {u"a": 1, u"b": 2, u"c": 3}, (b"Z", (1, 2, 3))]
+        assert unpacker.unpack_from(packb(*values)) == [u"A" * 10, b"\x00" * 10, [1, [2, 3], 4],
+                                                        {u"a": 1, u"b": 2, u"c": 3}, Structure(b"Z", [1, 2, 3])]
+
+    def test_large_values_are_rejected(self):
+        unpacker = Unpacker(max_value_size=10)
+        for value in [u"A" * 11, u"A" * 300, bytearray(11), [[u"A" * 11]], {u"A" * 11: 1}]:
+            with self.assertRaises(SizeLimitError):
+                unpacker.unpack_from(packb(value))
+
+    def test_large_collections_are_rejected(self):
+        unpacker = Unpacker(max_collection_size=3)
+        for value in [[1, 2, 3, 4], list(range(300)), {u"k%d" % i: i for i in range(4)}, [[[1, 2, 3, 4]]],
+                      (b"Z", (1, 2, 3, 4)), iter([1, 2, 3, 4]), {u"a": iter([1, 2, 3, 4])}]:
+            with self.assertRaises(SizeLimitError):
+                unpacker.unpack_from(packb(value))
+
+    def test_map_stream_is_limited(self):
+        unpacker = Unpacker(max_collection_size=3)
+        assert unpacker.unpack_from(b"\xDB\x81a\x01\x81b\x02\x81c\x03\xDF") == [{u"a": 1, u"b": 2, u"c": 3}]
+        with self.assertRaises(SizeLimitError):
+            unpacker.unpack_from(b"\xDB\x81a\x01\x81b\x02\x81c\x03\x81d\x04\xDF")
+
+    def test_limits_are_checked_before_the_data_arrives(self):
+        unpacker = Unpacker(max_value_size=1000, max_collection_size=1000)
+        for header in [b"\xD2\x7F\xFF\xFF\xFF", b"\xCE\x7F\xFF\xFF\xFF", b"\xD6\x7F\xFF\xFF\xFF",
+                       b"\xDA\x7F\xFF\xFF\xFF"]:
+            with self.assertRaises(SizeLimitError):
+                unpacker.feed(header)
+            with self.assertRaises(SizeLimitError):
+                unpacker.unpack_from(header)
+
+    def test_limits_apply_to_string_cache(self):
+        unpacker = Unpacker(string_cache=StringCache(), max_value_size=2)
+        assert unpacker.unpack_from(packb(u"AB")) == [u"AB"]
+        with self.assertRaises(SizeLimitError):
+            unpacker.unpack_from(packb(u"ABC"))
+
+    def test_limits_can_be_removed(self):
+        unpacker = Unpacker(max_value_size=1)
+        unpacker.max_value_size = None
+        assert unpacker.unpack_from(packb(u"ABC")) == [u"ABC"]
+
+
+class LazyBytesTestCase(TestCase):
+
+    def test_large_bytes_are_returned_as_views(self):
+        unpacker = Unpacker(lazy_bytes_size=100)
+        small, large = unpacker.unpack_from(packb(bytearray(b"A" * 99), bytearray(b"B" * 100)))
+        assert small == b"A" * 99
+        assert isinstance(large, BytesView)
+        assert len(large) == 100
+        assert large.read() == b"B" * 100
+
+    @skipIf(bytes is str, "Python 2 decodes from a copy of the data")
+    def test_view_refers_to_data(self):
+        data = packb(bytearray(b"A" * 1000))
+        view, = Unpacker(lazy_bytes_size=100).unpack_from(data)
+        assert len(view.segments) == 1
+        assert view.segments[0].obj is data
+
+    def test_view_can_be_read_in_parts(self):
+        view = BytesView([b"abc", b"", b"defg", b"h"])
+        assert view.read(2) == b"ab"
+        assert view.read(4) == b"cdef"
+        assert view.tell() == 6
+        assert view.read() == b"gh"
+        assert view.read(1) == b""
+        view.seek(-3, 2)
+        assert view.read(2) == b"fg"
+        view.seek(0)
+        assert view.readline() == b"abcdefgh"
+        assert view.getvalue() == b"abcdefgh"
+
+    def test_fed_data_is_not_buffered(self):
+        unpacker = Unpacker(lazy_bytes_size=100)
+        data = packb([1, bytearray(b"A" * 100000), 2], bytearray(b"B" * 100000))
+        values = []
+        for i in range(0, len(data), 1000):
+            values.extend(unpacker.feed(data[i:i + 1000]))
+            assert len(unpacker.buffer) - unpacker.offset < 10
+        unpacker.end()
+        assert values[0][0] == 1 and values[0][2] == 2
+        assert values[0][1].read() == b"A" * 100000
+        assert values[1].read() == b"B" * 100000
+
+    def test_value_fed_in_pieces(self):
+        data = packb({u"a": bytearray(range(256)) * 10}, bytearray(b"xyz" * 50), 1)
+        for size in [1, 2, 3, 100, len(data)]:
+            unpacker = Unpacker(lazy_bytes_size=100)
+            values = []
+            for i in range(0, len(data), size):
+                values.extend(unpacker.feed(data[i:i + size]))
+            unpacker.end()
+            assert values[0][u"a"].read() == bytes(bytearray(range(256)) * 10)
+            assert values[1].read() == b"xyz" * 50
+            assert values[2] == 1
+
+    def test_incomplete_value_is_rejected_at_end(self):
+        unpacker = Unpacker(lazy_bytes_size=100)
+        unpacker.feed(packb(bytearray(1000))[:500])
+        with self.assertRaises(ValueError):
+            unpacker.end()
+
+
+class PurePythonPackStreamTestCase(PurePython, PackStreamTestCase):
+    pass
+
+
+class PurePythonEncoderRegistryTestCase(PurePython, EncoderRegistryTestCase):
+    pass
+
+
+class PurePythonListStreamTestCase(PurePython, ListStreamTestCase):
+    pass
+
+
+class PurePythonNumericListTestCase(PurePython, NumericListTestCase):
+    pass
+
+
+class PurePythonNumericListDecodingTestCase(PurePython, NumericListDecodingTestCase):
+    pass
+
+
+class PurePythonStringCacheTestCase(PurePython, StringCacheTestCase):
+    pass
+
+
+class PurePythonIncrementalUnpackingTestCase(PurePython, IncrementalUnpackingTestCase):
+    pass
+
+
+class PurePythonSizeLimitTestCase(PurePython, SizeLimitTestCase):
+    pass
+
+
+class PurePythonLazyBytesTestCase(PurePython, LazyBytesTestCase):
+    pass
+
+
+@skipUnless(packstream._packstream, "C accelerator not built")
+class AcceleratedPackStreamTestCase(TestCase):
+
+    def test_accelerator_encodes_built_in_types_only(self):
+        encode = packstream._packstream.encode
+        assert encode([1, u"A", {u"B": None}]) == b"\x93\x01\x81A\xA1\x81B\xC0"
+        assert encode([1, OrderedDict()]) is NotImplemented
+
+    def test_accelerator_rejects_truncated_data(self):
+        with self.assertRaises(ValueError):
+            packstream._packstream.decode(b"\xD0\x28AAA", packstream.Structure)
@@ -162,6 +162,22 @@ class RunTestCase(ServerTestCase):
         session.close()
         assert count == 1
 
+    def test_unicode_parameters_are_not_copied(self):
+        session = GraphDatabase.driver("bolt://localhost", auth=auth_token).session()
+        parameters = {u"x": u"abc"}
+        result = session.run(u"RETURN {x} AS n", parameters)
+        assert result.parameters is parameters
+        assert result.single()["n"] == u"abc"
+        session.close()
+
+    def test_byte_string_parameter_names_are_decoded(self):
+        session = GraphDatabase.driver("bolt://localhost", auth=auth_token).session()
+        parameters = {b"x": u"abc"}
+        result = session.run(u"RETURN {x} AS n", parameters)
+        assert result.parameters == {u"x": u"abc"}
+        assert result.single()["n"] == u"abc"
+        session.close()
+
     def test_fails_on_bad_syntax(self):
         session = GraphDatabase.driver("bolt://localhost", auth=auth_token).session()
         with self.assertRaises(CypherError):
@@ -252,6 +268,37 @@ class RunTestCase(ServerTestCase):
                 list(result.keys())
 
 
+class PipelineTestCase(ServerTestCase):
+
+    def test_can_run_many_statements(self):
+        with GraphDatabase.driver("bolt://localhost", auth=auth_token).session() as session:
+            results = session.run_many(("RETURN {x} AS n", {"x": x}) for x in range(10))
+            assert [result.single()["n"] for result in results] == list(range(10))
+
+    def test_statements_are_sent_together(self):
+        with GraphDatabase.driver("bolt://localhost", auth=auth_token).session() as session:
+            with patch.object(session.connection, "send", wraps=session.connection.send) as send:
+                with session.pipeline() as pipeline:
+                    results = [pipeline.run("RETURN {x} AS n", {"x": x}) for x in range(10)]
+                assert send.call_count == 1
+            assert [result.single()["n"] for result in results] == list(range(10))
+
+    def test_results_can_be_read_within_pipeline(self):
+        with GraphDatabase.driver("bolt://localhost", auth=auth_token).session() as session:
+            with session.pipeline() as pipeline:
+                result = pipeline.run("RETURN 1 AS n")
+                assert result.single()["n"] == 1
+
+    def test_statements_after_a_failure_are_not_run(self):
+        with GraphDatabase.driver("bolt://localhost", auth=auth_token).session() as session:
+            failed, ignored = session.run_many([("X", {}), ("RETURN 1", {})])
+            with self.assertRaises(CypherError):
+                failed.consume()
+            with self.assertRaises(ResultError):
+                ignored.consume()
+            assert session.run("RETURN 1").single()[0] == 1
+
+
 class SummaryTestCase(ServerTestCase):
 
     def test_can_obtain_summary_after_consuming_result(self):
@@ -263,6 +310,14 @@ class SummaryTestCase(ServerTestCase):
             assert summary.statement_type == "rw"
             assert summary.counters.nodes_created == 1
 
+    def test_can_obtain_summary_of_discarded_result(self):
+        with GraphDatabase.driver("bolt://localhost", auth=auth_token).session() as session:
+            result = session.run("UNWIND range(1, 3) AS n CREATE (a) RETURN a", discard=True)
+            assert list(result) == []
+            summary = result.consume()
+            assert summary.statement_type == "rw"
+            assert summary.counters.nodes_created == 3
+
     def test_no_plan_info(self):
         with GraphDatabase.driver("bolt://localhost", auth=auth_token).session() as session:
             result = session.run("CREATE (n) RETURN n")
@@ -424,6 +479,10 @@ class RecordTestCase(ServerTestCase):
         a_record = Record(["name", "empire"], ["Nigel", "The British Empire"])
         assert repr(a_record) == "<Record name='Nigel' empire='The British Empire'>"
 
+    def test_record_has_no_instance_dict(self):
+        a_record = Record(["name", "empire"], ["Nigel", "The British Empire"])
+        assert not hasattr(a_record, "__dict__")
+
 
 class TransactionTestCase(ServerTestCase):
 
@@ -585,6 +644,14 @@ class ResultConsumptionTestCase(ServerTestCase):
         session.close()
         assert [record[0] for record in result] == [1, 2, 3]
 
+    def test_can_consume_result_after_reading_some_records(self):
+        session = self.driver.session()
+        result = session.run("UNWIND range(1, 3) AS n RETURN n")
+        assert next(iter(result))[0] == 1
+        assert result.consume().counters.nodes_created == 0
+        assert list(result) == []
+        session.close()
+
     def test_single_with_exactly_one_record(self):
         session = self.driver.session()
         result = session.run("UNWIND range(1, 1) AS n RETURN n")
@@ -21,9 +21,11 @@
 
 from unittest import TestCase
 
-from neo4j.v1.packstream import Structure
+from neo4j.v1.packstream import Structure, Unpacker, packb
 
-from neo4j.v1.types import Node, Relationship, UnboundRelationship, Path, hydrated
+from neo4j.v1.types import Node, Relationship, UnboundRelationship, Path, hydrated, hydration_functions
+
+from test.util import PurePython
 
 
 class NodeTestCase(TestCase):
@@ -162,10 +164,7 @@ class PathTestCase(TestCase):
 class HydrationTestCase(TestCase):
 
     def test_can_hydrate_node_structure(self):
-        struct = Structure(3, b'N')
-        struct.append(123)
-        struct.append(["Person"])
-        struct.append({"name": "Alice"})
+        struct = Structure(b'N', [123, ["Person"], {"name": "Alice"}])
         alice = hydrated(struct)
         assert alice.id == 123
         assert alice.labels == {"Person"}
@@ -173,16 +172,12 @@ class HydrationTestCase(TestCase):
         assert alice.get("name") == "Alice"
 
     def test_hydrating_unknown_structure_returns_same(self):
-        struct = Structure(1, b'X')
-        struct.append("foo")
+        struct = Structure(b'X', ["foo"])
         mystery = hydrated(struct)
         assert mystery == struct
 
     def test_can_hydrate_in_list(self):
-        struct = Structure(3, b'N')
-        struct.append(123)
-        struct.append(["Person"])
-        struct.append({"name": "Alice"})
+        struct = Structure(b'N', [123, ["Person"], {"name": "Alice"}])
         alice_in_list = hydrated([struct])
         assert isinstance(alice_in_list, list)
         alice, = alice_in_list
@@ -192,10 +187,7 @@ class HydrationTestCase(TestCase):
         assert alice.get("name") == "Alice"
 
     def test_can_hydrate_in_dict(self):
-        struct = Structure(3, b'N')
-        struct.append(123)
-        struct.append(["Person"])
-        struct.append({"name": "Alice"})
+        struct = Structure(b'N', [123, ["Person"], {"name": "Alice"}])
         alice_in_dict = hydrated({"foo": struct})
         assert isinstance(alice_in_dict, dict)
         alice = alice_in_dict["foo"]
@@ -203,3 +195,35 @@ class HydrationTestCase(TestCase):
         assert alice.labels == {"Person"}
         assert set(alice.keys()) == {"name"}
         assert alice.get("name") == "Alice"
+
+
+class UnpackerHydrationTestCase(TestCase):
+
+    def unpack(self, value):
+        unpacker = Unpacker(hydration_functions=hydration_functions)
+        return unpacker.unpack_from(packb(value))[0]
+
+    def test_can_hydrate_node_while_unpacking(self):
+        alice = self.unpack((b"N", (123, [u"Person"], {u"name": u"Alice"})))
+        assert isinstance(alice, Node)
+        assert alice.id == 123
+        assert alice.labels == {u"Person"}
+        assert alice.get(u"name") == u"Alice"
+
+    def test_can_hydrate_path_while_unpacking(self):
+        path = self.unpack((b"P", ([(b"N", (1, [], {})), (b"N", (2, [], {}))],
+                                   [(b"r", (9, u"KNOWS", {}))],
+                                   [1, 1])))
+        assert isinstance(path, Path)
+        assert [node.id for node in path.nodes] == [1, 2]
+        knows, = path.relationships
+        assert (knows.id, knows.start, knows.end, knows.type) == (9, 1, 2, u"KNOWS")
+
+    def test_unknown_structure_is_not_hydrated(self):
+        mystery = self.unpack([(b"X", (u"foo",))])[0]
+        assert isinstance(mystery, Structure)
+        assert mystery.signature == b"X"
+
+
+class PurePythonUnpackerHydrationTestCase(PurePython, UnpackerHydrationTestCase):
+    pass
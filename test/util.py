@@ -23,12 +23,16 @@ import functools
 from os import getenv, remove, rename
 from os.path import isfile
 from socket import create_connection
+from struct import pack as struct_pack
 from subprocess import check_call, CalledProcessError
 from time import sleep
 from unittest import TestCase
 
 from neo4j.util import Watcher
+from neo4j.v1 import packstream
+from neo4j.v1.bolt import ChunkChannel
 from neo4j.v1.constants import KNOWN_HOSTS
+from neo4j.v1.packstream import packb
 
 KNOWN_HOSTS_BACKUP = KNOWN_HOSTS + ".backup"
 
@@ -52,6 +56,19 @@ def watch(f):
     return wrapper
 
 
+def chunked(*messages):
+    """ Pack and chunk messages as a server would send them.
+    """
+    data = []
+    for message in messages:
+        packed = packb(message)
+        for i in range(0, len(packed), ChunkChannel.max_chunk_size):
+            chunk = packed[i:i + ChunkChannel.max_chunk_size]
+            data.append(struct_pack(">H", len(chunk)) + chunk)
+        data.append(b"\x00\x00")
+    return b"".join(data)
+
+
 def restart_server(http_port=7474):
     try:
         check_call("%s/bin/neo4j restart" % getenv("NEO4J_HOME"), shell=True)
@@ -78,6 +95,20 @@ def restart_server(http_port=7474):
         return running
 
 
+class PurePython(object):
+    """ Mixin to disable the C accelerator for the duration of each test.
+    """
+
+    def setUp(self):
+        self.accelerator = packstream._packstream
+        packstream._packstream = None
+        super(PurePython, self).setUp()
+
+    def tearDown(self):
+        packstream._packstream = self.accelerator
+        super(PurePython, self).tearDown()
+
+
 class ServerTestCase(TestCase):
     """ Base class for test cases that use a remote server.
     """